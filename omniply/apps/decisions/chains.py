@@ -29,15 +29,68 @@ class SimpleCase(CacheGame, AbstractCase):
 		super().__init__(**kwargs)
 		self._chain = chain
 		self.data.update(cache)
+		self._known = set(cache) # cached gizmos which were not set manually
 
 
+	_IgnoreCase = IgnoreCase
 	def check(self, decision: AbstractDecision) -> CHOICE:
+		if self._chain is None: # not part of a chain, so the decision chooses itself
+			raise self._IgnoreCase()
 		return self._chain.confirm(self, decision)
 
 
+	def _cache_miss(self, ctx: Optional[AbstractGame], gizmo: str) -> Any:
+		val = super()._cache_miss(ctx, gizmo)
+		self._known.add(gizmo)
+		return val
+
+
+	def set_cache(self, gizmo: str, val: Any):
+		if gizmo in self.data: # overwriting a cached value is always manual
+			self._known.discard(gizmo)
+		return super().set_cache(gizmo, val)
+
+
+	def reusable(self, changed: Iterable[str]) -> dict[str, Any]:
+		'''
+		cached gizmos that do not depend on any of the `changed` gizmos (or any manually set gizmos) according to the
+		recorded trace, so they can be reused by a sibling case
+		'''
+		products = getattr(self, '_products', None)
+		if products is None:
+			return {}
+		todo = [*changed, *(gizmo for gizmo in self.data if gizmo not in self._known)]
+		stale = set(todo)
+		while len(todo):
+			for user in products.get(todo.pop(), ()):
+				if user not in stale:
+					stale.add(user)
+					todo.append(user)
+		return {gizmo: val for gizmo, val in self.data.items() if gizmo not in stale}
+
+
+	def inherit(self, other: 'SimpleCase', cache: dict[str, Any]) -> Self:
+		'''reuse cached gizmos of another case (see `reusable`) including their recorded dependencies'''
+		cache = {gizmo: val for gizmo, val in cache.items() if gizmo not in self.data}
+		self.data.update(cache)
+		self._known.update(cache)
+		products = getattr(self, '_products', None)
+		if products is not None:
+			for gizmo, users in getattr(other, '_products', {}).items():
+				users = users.intersection(cache)
+				if len(users):
+					products.setdefault(gizmo, set()).update(users)
+		return self
+
+
 
 class Chain(AbstractChain):
-	def __init__(self, source: AbstractDecidable, targets: Iterable[str], cache: dict[str, Any] = None, **kwargs):
+	def __init__(self, source: AbstractDecidable, targets: Iterable[str], cache: dict[str, Any] = None, *,
+				 checkpoint: str = None, checkpoint_every: int = 100, **kwargs):
+		'''
+		:param checkpoint: path where the state of the chain is saved (see `save`) every `checkpoint_every` cases
+		and once the chain is exhausted
+		'''
 		super().__init__(**kwargs)
 		self._source = source
 		self._targets = targets
@@ -47,6 +100,12 @@ class Chain(AbstractChain):
 		self._chain_stack = []
 		self._waiting_chains = {}
 		self._chain_cache = {}
+		self._positions = {} # number of choices taken from each waiting chain
+		self._sampled = {} # choices of waiting chains which cannot be reproduced (eg. random covers)
+		self._replay = None
+		self._num_cases = 0
+		self._checkpoint = checkpoint
+		self._checkpoint_every = checkpoint_every
 
 
 	@property
@@ -54,30 +113,113 @@ class Chain(AbstractChain):
 		return self._current
 
 
-	def _create_case(self, cache: dict[str, Any]) -> AbstractCase:
+	@property
+	def choices(self) -> dict[str, CHOICE]:
+		'''choices made by this chain for the current case (excluding any prior choices)'''
+		return dict(self._chain_cache)
+
+
+	def root(self) -> tuple[Optional[str], list[CHOICE]]:
+		'''
+		choice gizmo of the first decision of the current case and all its choices (starting with the current one),
+		which exhausts the chain
+		'''
+		if self._current is None:
+			next(self)
+		if not len(self._chain_stack):
+			return None, []
+		gizmo = self._chain_stack[0]
+		choices = [self._chain_cache[gizmo], *self._waiting_chains[gizmo]]
+		self._completed = True
+		return gizmo, choices
+
+
+	def state(self) -> dict[str, Any]:
+		'''
+		progress of the chain as plain data (the position of the current choice of each decision on the stack
+		rather than the live generators), which can be restored with `load_state`
+		'''
+		return {'targets': list(self._targets), 'cases': self._num_cases, 'completed': self._completed,
+				'stack': [[gizmo, self._positions[gizmo], self._sampled.get(gizmo)] for gizmo in self._chain_stack]}
+
+
+	def load_state(self, state: Mapping[str, Any]) -> Self:
+		'''
+		continue after the last case of a previous (identical) chain, which requires the decisions to be
+		deterministic apart from random covers, which are part of the state
+		'''
+		assert self._current is None, f'chain has already started'
+		assert list(state['targets']) == list(self._targets), f'checkpoint is for targets {state["targets"]}'
+		self._num_cases = state['cases']
+		self._completed = state['completed']
+		if self._num_cases > 0 and not self._completed:
+			self._replay = {gizmo: (position, sampled) for gizmo, position, sampled in state['stack']}
+		return self
+
+
+	def save(self, path: str) -> Self:
+		'''atomically write the state to a file'''
+		tmp = f'{path}.tmp'
+		with open(tmp, 'wb') as f:
+			pickle.dump(self.state(), f)
+		os.replace(tmp, path)
+		return self
+
+
+	@staticmethod
+	def load(path: str) -> dict[str, Any]:
+		'''state saved with `save`'''
+		with open(path, 'rb') as f:
+			return pickle.load(f)
+
+
+	_incremental = True # reuse all gizmos of the previous case that are not downstream of the changed decisions
+	def _create_case(self, cache: dict[str, Any], previous: AbstractCase = None,
+					 changed: Iterable[str] = ()) -> AbstractCase:
 		case = self._source.create_case(cache, chain=self)
+		if self._incremental and isinstance(previous, SimpleCase) and isinstance(case, SimpleCase):
+			case.inherit(previous, previous.reusable(changed))
 		for target in self._targets:
 			case.grab(target)
 		return case
 
 
 	def __next__(self):
+		if self._completed and self._current is None: # restored from a finished chain
+			raise StopIteration
 		if self._current is None:
 			# seed the initial case to populate the stack with any decisions that have to made
 			self._current = self._create_case(self._prior_cache)
-			return self._current
-
+			if self._replay is None:
+				self._num_cases += 1
+				return self._current
+			# the replayed case was already done before the checkpoint
+			if set(self._replay) != set(self._chain_stack):
+				raise ValueError(f'checkpoint does not match the decisions of this chain')
+			self._replay = None
+		elif self._checkpoint is not None and self._num_cases % self._checkpoint_every == 0:
+			self.save(self._checkpoint)
+
+		popped = []
 		for gizmo in reversed(self._chain_stack):
 			for choice in self._waiting_chains[gizmo]:
+				self._positions[gizmo] += 1
 				self._chain_cache[gizmo] = choice
-				self._current = self._create_case({**self._chain_cache, **self._prior_cache})
+				self._current = self._create_case({**self._chain_cache, **self._prior_cache},
+												  previous=self._current, changed=[gizmo, *popped])
+				self._num_cases += 1
 				return self._current
 			else:
 				self._chain_stack.pop()
 				self._waiting_chains.pop(gizmo)
 				self._chain_cache.pop(gizmo)
+				self._positions.pop(gizmo)
+				self._sampled.pop(gizmo, None)
+				popped.append(gizmo)
 
 		self._completed = True
+		if self._checkpoint is not None:
+			self.save(self._checkpoint)
 		raise StopIteration
 
 
@@ -97,9 +239,22 @@ class Chain(AbstractChain):
 		if gizmo in self._prior_cache: # decision has been made pre-chain
 			return self._prior_cache[gizmo]
 		self._chain_stack.append(gizmo)
-		self._waiting_chains[gizmo] = self._decision_sampling(decision, case)
+		position = 1
+		if self._replay is not None and gizmo in self._replay: # resuming from a checkpoint
+			position, sampled = self._replay[gizmo]
+			if sampled is None:
+				waiting = self._decision_sampling(decision, case)
+				for _ in range(position - 1):
+					next(waiting)
+			else:
+				self._sampled[gizmo] = sampled
+				waiting = iter(sampled[position - 1:])
+		else:
+			waiting = self._decision_sampling(decision, case)
+		self._waiting_chains[gizmo] = waiting
+		self._positions[gizmo] = position
 		# a decision should be guaranteed to have at least one choice
-		choice = next(self._waiting_chains[gizmo])
+		choice = next(waiting)
 		self._chain_cache[gizmo] = choice
 		return choice
 
@@ -116,40 +271,245 @@ class CarefulChain(Chain):
 		'''default sampling strategy'''
 		if (self._limit is not None and isinstance(decision, AbstractCountableDecision)
 				and decision.count(case) > self._limit):
-			yield from decision.cover(self._limit, case)
+			# random covers are kept so the chain can be resumed (see `state`)
+			sampled = list(decision.cover(self._limit, case))
+			self._sampled[decision.choice_gizmo] = sampled
+			yield from sampled
 		else:
 			yield from super()._decision_sampling(decision, case)
 
 
 
+def _iterate_subtree(job) -> Iterator[Any]:
+	'''evaluates the cases of a single subtree one at a time (see `DeciderBase.explore`)'''
+	decider, targets, prefix, settings, extract = job
+	chain = decider._create_chain(targets, {**decider._prior(), **prefix}, **settings)
+	for case in chain:
+		if extract is None:
+			yield {**prefix, **chain.choices, **{target: case.grab(target) for target in targets}}
+		else:
+			yield extract(case)
+
+
+
+def _explore_subtree(job) -> list[Any]:
+	'''evaluates all cases of a single subtree (see `DeciderBase.explore`), must be top-level to be picklable'''
+	return list(_iterate_subtree(job))
+
+
+
 class DeciderBase(CacheGame, AbstractDecidable):
 	_Case: type[SimpleCase] = None
 	_Chain = Chain
 	def consider(self, *targets: str) -> Chain:
-		cache = {gizmo: self[gizmo] for gizmo in self.cached()}
-		return self._Chain(self, targets, cache=cache)
+		return self._create_chain(targets, self._prior())
+
+
+	def resume(self, *targets: str, checkpoint: str, **settings: Any) -> Chain:
+		'''
+		like `consider`, except that the state of the chain is saved to `checkpoint` periodically, and if the
+		file already exists, the chain continues after the last case that was done before it was saved
+		'''
+		chain = self._create_chain(targets, self._prior(), checkpoint=checkpoint, **settings)
+		if os.path.exists(checkpoint):
+			chain.load_state(chain.load(checkpoint))
+		return chain
+
+
+	def _prior(self) -> dict[str, Any]:
+		return {gizmo: self[gizmo] for gizmo in self.cached()}
+
+
+	def _create_chain(self, targets: Iterable[str], cache: dict[str, Any], **settings: Any) -> Chain:
+		return self._Chain(self, targets, cache=cache, **settings)
 
 
 	def create_case(self, cache: dict[str, Any] = None, chain: AbstractChain = None) -> AbstractCase:
 		return self._Case(chain=chain, cache=cache)
 
 
+	def partition(self, *targets: str, depth: int = 1, **settings: Any) -> Iterator[dict[str, CHOICE]]:
+		'''
+		Splits the cases of `consider` into independent subtrees by fixing the choices of the first `depth`
+		decisions. The prefixes are yielded in the same order that `consider` would visit them.
+		'''
+		yield from self._partition(tuple(targets), {}, depth, settings)
+
+
+	def _partition(self, targets: tuple[str, ...], prefix: dict[str, CHOICE], depth: int,
+				   settings: dict[str, Any]) -> Iterator[dict[str, CHOICE]]:
+		if depth <= 0:
+			yield prefix
+			return
+		gizmo, choices = self._next_decision(targets, prefix, settings)
+		if gizmo is None: # no more decisions
+			yield prefix
+			return
+		for choice in choices:
+			yield from self._partition(targets, {**prefix, gizmo: choice}, depth - 1, settings)
+
+
+	def _next_decision(self, targets: tuple[str, ...], prefix: dict[str, CHOICE],
+					   settings: dict[str, Any]) -> tuple[Optional[str], list[CHOICE]]:
+		'''
+		choice gizmo and choices of the first decision that `consider` makes after the choices in `prefix`
+		(by default this evaluates the first case of the subtree, see `Chain.root`)
+		'''
+		return self._create_chain(targets, {**self._prior(), **prefix}, **settings).root()
+
+
+	def explore(self, *targets: str, executor: Any = None, depth: int = 1,
+				extract: Callable[[AbstractCase], Any] = None, **settings: Any) -> Iterator[Any]:
+		'''
+		Evaluates all cases of `consider` where each subtree (see `partition`) can be evaluated by a different
+		worker, while the results are streamed back in the same order as `consider`.
+
+		:param executor: eg. a `concurrent.futures.ProcessPoolExecutor` (in which case this decider and `extract`
+		must be picklable), otherwise the subtrees are evaluated sequentially and each result is yielded as soon as
+		its case is done. With an executor, the results of each subtree are yielded once it (and all earlier
+		subtrees) are done.
+		:param extract: maps each case to its result (defaults to the choices made and the values of the targets)
+		'''
+		jobs = ((self, targets, prefix, settings, extract)
+				for prefix in self.partition(*targets, depth=depth, **settings))
+		if executor is None:
+			for job in jobs:
+				yield from _iterate_subtree(job)
+		else:
+			for subtree in executor.map(_explore_subtree, jobs):
+				yield from subtree
+
+
+
 class CarefulDecider(DeciderBase):
 	_Chain = CarefulChain
 	def consider(self, *targets: str, limit: int = None) -> CarefulChain:
 		'''
 		limit refers to the maximum number of choices to consider for any given decision
 		'''
-		cache = {gizmo: self[gizmo] for gizmo in self.cached()}
-		return self._Chain(self, targets, cache=cache, limit=limit)
+		return self._create_chain(targets, self._prior(), limit=limit)
 
 
 
 class CertificateGaggle(CacheGame, GaggleBase):
+	'''
+	Indexes the decisions (by choice gizmo) once, rather than scanning the cache and gadgets for every
+	certificate. The index is rebuilt lazily whenever gadgets are added or removed.
+
+	The key of the current certificate is cached until the cache or the gadgets change, so repeatedly asking for it
+	while a chain is not making any new choices is constant time.
+	'''
+	_decision_index: Optional[dict[str, AbstractDecision]] = None
+	_choice_positions: Optional[dict[str, tuple[list[CHOICE], dict[CHOICE, int]]]] = None
+	_certificate_cache: Optional[tuple[int, Union[int, tuple]]] = None # number of cached gizmos and the key
+
+	def decisions(self) -> dict[str, AbstractDecision]:
+		'''all decisions by choice gizmo'''
+		if self._decision_index is None:
+			index = {}
+			for gadget in self._gadgets():
+				if isinstance(gadget, AbstractDecision):
+					index.setdefault(gadget.choice_gizmo, gadget)
+			self._decision_index = index
+			self._choice_positions = {}
+		return self._decision_index
+
+
+	def extend(self, gadgets: Iterable[AbstractGadget]) -> Self:
+		self._decision_index = None
+		self._certificate_cache = None
+		return super().extend(gadgets)
+
+
+	def exclude(self, *gadgets: AbstractGadget) -> Self:
+		self._decision_index = None
+		self._certificate_cache = None
+		return super().exclude(*gadgets)
+
+
+	def set_cache(self, gizmo: str, val: Any):
+		# any gizmo may change the choices of a context-dependent decision, not just the choice gizmos
+		self._certificate_cache = None
+		return super().set_cache(gizmo, val)
+
+
+	def __delitem__(self, key):
+		self._certificate_cache = None
+		super().__delitem__(key)
+
+
+	def clear_cache(self) -> Self:
+		self._certificate_cache = None
+		return super().clear_cache()
+
+
 	def certificate(self) -> dict[str, CHOICE]:
-		return {gizmo: self[gizmo] for gizmo in self.cached()
-				if any(gizmo == decision.choice_gizmo for decision in self._gadgets(gizmo)
-					   if isinstance(decision, AbstractDecision))}
+		return {gizmo: self[gizmo] for gizmo in self.decisions() if self.is_cached(gizmo)}
+
+
+	def _choice_digits(self, gizmo: str, decision: AbstractDecision
+					   ) -> Optional[tuple[int, Optional[list[CHOICE]], Optional[dict[CHOICE, int]]]]:
+		'''
+		number of choices of a decision, and (unless the choices are indices) all choices and their positions,
+		or None if the decision is not countable
+		'''
+		if isinstance(decision, AbstractIndexDecision):
+			return decision.count(self), None, None
+		if isinstance(decision, AbstractCountableDecision):
+			num = decision.count(self)
+		elif isinstance(decision, AbstractGadgetDecision):
+			num = sum(1 for _ in decision.choices())
+		else:
+			return None
+		self.decisions()
+		# the choices may depend on the context, so the positions are only reused if the choices are the same
+		options = list(decision.choices(self) if isinstance(decision, AbstractCountableDecision)
+					   else decision.choices())
+		known = self._choice_positions.get(gizmo)
+		if known is None or known[0] != options:
+			known = options, {choice: i for i, choice in enumerate(options)}
+			self._choice_positions[gizmo] = known
+		return num, *known
+
+
+	def certificate_key(self, certificate: Mapping[str, CHOICE] = None) -> Union[int, tuple]:
+		'''
+		compact hashable encoding of a certificate (defaults to the current one), eg. to deduplicate cases
+
+		If all decisions are countable (or gadget decisions), the key is a mixed-radix integer with one digit per
+		decision (0 if the decision was not made, otherwise one more than the position of the choice), which can be
+		decoded with `decode_certificate`. Otherwise the key is a tuple of all choices that were made.
+		'''
+		if certificate is None:
+			# gizmos cached directly (eg. when a case is created) don't go through `set_cache` but change the size
+			cached = self._certificate_cache
+			if cached is not None and cached[0] == len(self.data):
+				return cached[1]
+			key = self.certificate_key(self.certificate())
+			self._certificate_cache = len(self.data), key
+			return key
+		key = 0
+		for gizmo, decision in self.decisions().items():
+			digits = self._choice_digits(gizmo, decision)
+			if digits is None:
+				return tuple((gizmo, certificate[gizmo]) for gizmo in self.decisions() if gizmo in certificate)
+			num, _, positions = digits
+			digit = 0
+			if gizmo in certificate:
+				digit = 1 + (certificate[gizmo] if positions is None else positions[certificate[gizmo]])
+			key = key * (num + 1) + digit
+		return key
+
+
+	def decode_certificate(self, key: int) -> dict[str, CHOICE]:
+		'''inverse of `certificate_key` (for integer keys)'''
+		certificate = {}
+		for gizmo, decision in reversed(self.decisions().items()):
+			num, options, _ = self._choice_digits(gizmo, decision)
+			key, digit = divmod(key, num + 1)
+			if digit:
+				certificate[gizmo] = digit - 1 if options is None else options[digit - 1]
+		return dict(reversed(certificate.items()))
 
 
 
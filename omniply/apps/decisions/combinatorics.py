@@ -0,0 +1,178 @@
+from typing import Iterable, Union
+import math
+import numpy as np
+
+from ..sampling import RNG
+
+
+
+_INT64_MAX = np.iinfo(np.int64).max
+
+
+def _uniform(rng: Union[np.random.Generator, np.random.RandomState, None], shape: tuple[int, ...]) -> np.ndarray:
+	if rng is None:
+		rng = np.random.default_rng()
+	return rng.random(shape) if isinstance(rng, np.random.Generator) else rng.random_sample(shape)
+
+
+
+def _factoradic(index: int, N: int) -> list[int]:
+	'''digits of `index` in the factorial number system (most significant first)'''
+	assert 0 <= index < math.factorial(N), f'index={index} must be in [0, {N}!)'
+	digits = [0] * N
+	for i in range(1, N + 1):
+		index, digits[N - i] = divmod(index, i)
+	return digits
+
+
+
+def unrank_permutation(index: int, N: int) -> list[int]:
+	'''
+	the `index`-th permutation of N objects in lexicographic order
+
+	The Lehmer code is decoded with a Fenwick tree of the remaining elements, so this is O(N log N).
+	'''
+	tree = [0] * (N + 1) # Fenwick tree of which elements are still available
+	for i in range(1, N + 1):
+		tree[i] += 1
+		j = i + (i & -i)
+		if j <= N:
+			tree[j] += tree[i]
+	top = 1 << (N.bit_length() - 1) if N > 0 else 0
+
+	permutation = []
+	for digit in _factoradic(index, N):
+		# find the `digit`-th (0-based) remaining element by binary lifting
+		pos, step = 0, top
+		while step:
+			nxt = pos + step
+			if nxt <= N and tree[nxt] <= digit:
+				pos = nxt
+				digit -= tree[nxt]
+			step >>= 1
+		permutation.append(pos)
+		i = pos + 1
+		while i <= N:
+			tree[i] -= 1
+			i += i & -i
+	return permutation
+
+
+
+def rank_permutation(permutation: Iterable[int]) -> int:
+	'''inverse of `unrank_permutation`'''
+	permutation = list(permutation)
+	N = len(permutation)
+	tree = [0] * (N + 1)
+	index = 0
+	for j, element in enumerate(permutation):
+		# number of elements smaller than `element` that were already used
+		used, i = 0, element
+		while i > 0:
+			used += tree[i]
+			i -= i & -i
+		index = index * (N - j) + (element - used)
+		i = element + 1
+		while i <= N:
+			tree[i] += 1
+			i += i & -i
+	return index
+
+
+
+def unrank_permutations(indices: Iterable[int], N: int) -> np.ndarray:
+	'''vectorized `unrank_permutation` for many indices at once, returns an array of shape (len(indices), N)'''
+	indices = list(indices)
+	if math.factorial(N) - 1 > _INT64_MAX:
+		return np.array([unrank_permutation(index, N) for index in indices], dtype=np.int64).reshape(-1, N)
+
+	idx = np.asarray(indices, dtype=np.int64)
+	assert np.all((idx >= 0) & (idx < math.factorial(N))), f'indices must be in [0, {N}!)'
+	M = len(idx)
+	digits = np.empty((M, N), dtype=np.int64)
+	for i in range(1, N + 1):
+		idx, digits[:, N - i] = np.divmod(idx, i)
+
+	available = np.ones((M, N), dtype=bool)
+	rows = np.arange(M)
+	permutations = np.empty((M, N), dtype=np.int64)
+	for j in range(N):
+		pos = (np.cumsum(available, axis=1) > digits[:, j:j+1]).argmax(axis=1)
+		permutations[:, j] = pos
+		available[rows, pos] = False
+	return permutations
+
+
+
+def sample_permutations(N: int, M: int, rng: RNG = None) -> np.ndarray:
+	'''M uniformly random permutations of N objects, shape (M, N)'''
+	return np.argsort(_uniform(rng, (M, N)), axis=1)
+
+
+
+def unrank_combination(index: int, n: int, k: int) -> list[int]:
+	'''
+	the `index`-th combination (sorted) of `k` out of `n` objects in lexicographic order
+
+	Uses the combinatorial number system on the complement, where each element is found with a binary search,
+	so only O(k log n) binomial coefficients are computed.
+	'''
+	total = math.comb(n, k)
+	assert 0 <= index < total, f'index={index} must be in [0, {total})'
+	remaining = total - 1 - index
+	combination = []
+	upper = n
+	for i in range(k, 0, -1):
+		# largest c < upper with comb(c, i) <= remaining
+		lo, hi = i - 1, upper - 1
+		while lo < hi:
+			mid = (lo + hi + 1) // 2
+			if math.comb(mid, i) <= remaining:
+				lo = mid
+			else:
+				hi = mid - 1
+		remaining -= math.comb(lo, i)
+		combination.append(n - 1 - lo)
+		upper = lo
+	return combination
+
+
+
+def rank_combination(combination: Iterable[int], n: int) -> int:
+	'''inverse of `unrank_combination`'''
+	complement = sorted(n - 1 - element for element in combination)
+	k = len(complement)
+	return math.comb(n, k) - 1 - sum(math.comb(c, i) for i, c in enumerate(complement, 1))
+
+
+
+def unrank_combinations(indices: Iterable[int], n: int, k: int) -> np.ndarray:
+	'''vectorized `unrank_combination` for many indices at once, returns an array of shape (len(indices), k)'''
+	indices = list(indices)
+	if (math.comb(n, k) - 1 > _INT64_MAX # the indices themselves
+			or max((math.comb(n - 1, i) for i in range(1, k + 1) if n > 0), default=0) > _INT64_MAX):
+		return np.array([unrank_combination(index, n, k) for index in indices], dtype=np.int64).reshape(-1, k)
+
+	total = math.comb(n, k)
+	idx = np.asarray(indices, dtype=np.int64)
+	assert np.all((idx >= 0) & (idx < total)), f'indices must be in [0, {total})'
+	remaining = (total - 1) - idx
+	combinations = np.empty((len(idx), k), dtype=np.int64)
+	for j, i in enumerate(range(k, 0, -1)):
+		table = np.array([math.comb(c, i) for c in range(n)], dtype=np.int64) # nondecreasing in c
+		c = np.searchsorted(table, remaining, side='right') - 1
+		remaining = remaining - table[c]
+		combinations[:, j] = n - 1 - c
+	return combinations
+
+
+
+def sample_combinations(n: int, k: int, M: int, rng: RNG = None) -> np.ndarray:
+	'''M uniformly random (sorted) combinations of `k` out of `n` objects, shape (M, k)'''
+	if k == 0:
+		return np.empty((M, 0), dtype=np.int64)
+	keys = _uniform(rng, (M, n))
+	chosen = np.argpartition(keys, k - 1, axis=1)[:, :k] if k < n else np.tile(np.arange(n), (M, 1))
+	return np.sort(chosen, axis=1)
+
+
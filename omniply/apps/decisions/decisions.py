@@ -23,14 +23,47 @@ class DecisionBase(MultiGadgetBase, AbstractDecision):
 		return self._choice_gizmo
 
 
+	@staticmethod
+	def _provides(ctx: 'AbstractGame', gizmo: str) -> bool:
+		return isinstance(ctx, AbstractGaggle) and (ctx.gives(gizmo)
+													or (isinstance(ctx, CacheGame) and ctx.is_cached(gizmo)))
+
+
+	def _find_rng(self, ctx: 'AbstractGame') -> RNG:
+		'''
+		The random stream used to make this decision: the `rng` attribute of the context (if it has one), otherwise
+		a dedicated stream for this decision derived from the `seed_sequence` gizmo, otherwise the `rng` gizmo, and
+		finally the global `random` module.
+		'''
+		rng = getattr(ctx, 'rng', None)
+		if rng is not None:
+			return rng
+		if self._provides(ctx, 'seed_sequence'):
+			return RandomStreams.decision_rng(ctx.grab('seed_sequence'), self.choice_gizmo)
+		if self._provides(ctx, 'rng'):
+			return ctx.grab('rng')
+		return random
+
+
 	_NoOptionsError = NoOptionsError
-	def _choose(self, ctx: 'AbstractGame') -> str:
+	def _choose(self, ctx: 'AbstractGame', rng: RNG = None) -> str:
 		'''this method is called to determine the choice to be made.'''
-		rng = getattr(ctx, 'rng', random)
+		if rng is None:
+			rng = self._find_rng(ctx)
+		options = list(self.choices(ctx))
+		if len(options) == 0:
+			raise self._NoOptionsError(f'No options available for decision: {self}')
+		return options[random_index(len(options), rng)]
+
+
+	def _choose_many(self, ctx: 'AbstractGame', n: int, rng: RNG = None) -> list[CHOICE]:
+		'''draw `n` independent choices at once (vectorized for numpy rngs)'''
+		if rng is None:
+			rng = self._find_rng(ctx)
 		options = list(self.choices(ctx))
 		if len(options) == 0:
 			raise self._NoOptionsError(f'No options available for decision: {self}')
-		return rng.choice(options)
+		return [options[i] for i in random_indices(len(options), n, rng)]
 
 
 	def grab_from(self, ctx: 'AbstractGame', gizmo: str) -> Any:
@@ -45,17 +78,102 @@ class DecisionBase(MultiGadgetBase, AbstractDecision):
 		raise NotImplementedError
 
 
-# TODO: enable setting a weight to each of the choices!
-# class WeightedDecision(DecisionBase):
-# 	pass
-
-
+	def _commit_many(self, ctx: 'AbstractGame', choices: list[CHOICE], gizmo: str) -> Any:
+		'''results for many choices at once (eg. as an array), used for vectorized sampling'''
+		return [self._commit(ctx, choice, gizmo) for choice in choices]
 
 
 class CountableDecisionBase(DecisionBase, AbstractCountableDecision):
 	def cover(self, sampling: int, ctx: 'AbstractGame' = None, gizmo: str = None) -> Iterator[int]:
+		rng = self._find_rng(ctx)
 		for _ in range(sampling):
-			yield self._choose(ctx)
+			yield self._choose(ctx, rng=rng)
+
+
+
+class WeightedDecisionBase(CountableDecisionBase):
+	'''
+	Chooses each option with a probability proportional to its weight. The weights are either fixed or provided by
+	the `weights_gizmo`, either way as a mapping from choice to weight or a sequence in the order of `choices`.
+
+	The weights are compiled into an alias table (only once for fixed weights), so each choice is O(1), and `cover`
+	samples without replacement. Without any weights, all choices are equally likely.
+	'''
+	def __init__(self, *, weights: Mapping[CHOICE, float] | Iterable[float] = None, weights_gizmo: str = None,
+				 **kwargs):
+		assert weights is None or weights_gizmo is None, f'weights can either be fixed or come from a gizmo'
+		super().__init__(**kwargs)
+		self._weights = weights if weights is None or isinstance(weights, Mapping) else list(weights)
+		self._weights_gizmo = weights_gizmo
+		self._compiled = None
+
+
+	@property
+	def weighted(self) -> bool:
+		return self._weights is not None or self._weights_gizmo is not None
+
+
+	def set_weight(self, choice: CHOICE, weight: float) -> Self:
+		'''changes the fixed weight of a single choice (all other choices default to a weight of 1)'''
+		assert self._weights_gizmo is None, f'the weights of {self} come from {self._weights_gizmo!r}'
+		if isinstance(self._weights, Mapping):
+			weights = dict(self._weights)
+		else:
+			weights = dict(zip(self.choices(), self._weights or ()))
+		weights[choice] = weight
+		self._weights = weights
+		self._compiled = None
+		return self
+
+
+	def _compile(self, ctx: 'AbstractGame') -> tuple[list[CHOICE], AliasTable]:
+		'''
+		the options and the corresponding alias table, which are cached by the identity of the weights (and the
+		number of choices), so weights from the `weights_gizmo` should be replaced rather than modified in place
+		'''
+		raw = self._weights if self._weights_gizmo is None else ctx.grab(self._weights_gizmo)
+		if self._compiled is not None:
+			source, count, options, table = self._compiled
+			if source is raw and (self._weights_gizmo is None or count == self.count(ctx)):
+				return options, table
+		options = list(self.choices(ctx))
+		if isinstance(raw, Mapping):
+			weights = np.array([raw.get(option, 1.) for option in options], dtype=float)
+		else:
+			weights = np.asarray(raw, dtype=float)
+			assert len(weights) == len(options), f'expected {len(options)} weights, got {len(weights)}'
+		self._compiled = (raw, len(options), options, AliasTable(weights)) # keeps `raw` alive, so its id is unique
+		return options, self._compiled[3]
+
+
+	def _choose(self, ctx: 'AbstractGame', rng: RNG = None) -> CHOICE:
+		if not self.weighted:
+			return super()._choose(ctx, rng=rng)
+		if rng is None:
+			rng = self._find_rng(ctx)
+		options, table = self._compile(ctx)
+		return options[table.draw(rng)]
+
+
+	def _choose_many(self, ctx: 'AbstractGame', n: int, rng: RNG = None) -> list[CHOICE]:
+		if not self.weighted:
+			return super()._choose_many(ctx, n, rng=rng)
+		if rng is None:
+			rng = self._find_rng(ctx)
+		options, table = self._compile(ctx)
+		return [options[i] for i in table.sample(n, numpy_rng(rng))]
+
+
+	def cover(self, sampling: int, ctx: 'AbstractGame' = None, gizmo: str = None) -> Iterator[CHOICE]:
+		'''weighted sampling without replacement (so at most all choices with a nonzero weight)'''
+		if not self.weighted:
+			yield from super().cover(sampling, ctx, gizmo)
+			return
+		options, table = self._compile(ctx)
+		probs = table.probabilities
+		order = weighted_order(probs, min(sampling, int(np.count_nonzero(probs))), numpy_rng(self._find_rng(ctx)))
+		for i in order:
+			yield options[i]
 
 
 
@@ -63,12 +181,21 @@ class LargeDecision(CountableDecisionBase, AbstractIndexDecision):
 	'''
 	expects choices to always be integers from [0, self.count())
 	'''
-	def _choose(self, ctx: 'AbstractGame') -> int:
+	def _choose(self, ctx: 'AbstractGame', rng: RNG = None) -> int:
 		'''this method is called to determine the choice to be made.'''
-		rng = getattr(ctx, 'rng', random)
+		if rng is None:
+			rng = self._find_rng(ctx)
 		N = self.count(ctx)
 		assert N > 0, f'No options available for decision: {self}'
-		return rng.randint(0, N - 1)
+		return random_index(N, rng)
+
+
+	def _choose_many(self, ctx: 'AbstractGame', n: int, rng: RNG = None) -> list[int]:
+		if rng is None:
+			rng = self._find_rng(ctx)
+		N = self.count(ctx)
+		assert N > 0, f'No options available for decision: {self}'
+		return random_indices(N, n, rng)
 
 
 
@@ -179,11 +306,6 @@ class DynamicDecision(SelfSelectingDecision):
 # 		return len(elements) > 1
 
 
-# TODO for combinations:
-#   sampling: https://cs.stackexchange.com/questions/104930/efficient-n-choose-k-random-sampling
-#   generation: https://math.stackexchange.com/questions/1227409/indexing-all-combinations-without-making-list
-
-
 # class CommonPool(ToolKit):
 # 	def __init__(self, population: int, pool: Iterable[Any], **kwargs):
 # 		pool = tuple(pool)
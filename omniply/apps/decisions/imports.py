@@ -1,10 +1,13 @@
-from typing import Iterator, Any, Iterable, Mapping, Union, Callable
-import random, math
+from typing import Iterator, Any, Iterable, Mapping, Union, Callable, Optional, Self
+import random, math, os, pickle
+import numpy as np
 from omnibelt import filter_duplicates
 
 from ...core.abstract import AbstractGadget, AbstractGaggle, AbstractGame
 from ...core.genetics import AbstractGenetic, GeneticBase
 from ...core.gadgets import SingleGadgetBase
-from ...core.gaggles import MultiGadgetBase
+from ...core.gaggles import MultiGadgetBase, GaggleBase, SharedTopologyGaggle
+from ...core.games import CacheGame
 
 from ...core import Context
+from ..sampling import RandomStreams, RNG, random_index, random_indices, numpy_rng, AliasTable, weighted_order
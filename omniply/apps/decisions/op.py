@@ -1,10 +1,13 @@
 from typing import TypeVar
 from .imports import *
 
-from .abstract import AbstractDecision, AbstractGadgetDecision, CHOICE, AbstractCase
-from .decisions import LargeDecision, SimpleDecisionBase, DynamicDecision, CountableDecisionBase
+from .abstract import AbstractDecision, AbstractGadgetDecision, AbstractCountableDecision, CHOICE, AbstractCase
+from .decisions import (LargeDecision, SimpleDecisionBase, DynamicDecision, CountableDecisionBase,
+						WeightedDecisionBase)
 from .chains import (ConsiderableDecision, DeciderBase, NaiveConsiderationBase, CertificateGaggle,
 					 Chain, SimpleCase, CarefulDecider)
+from .combinatorics import (unrank_permutation, rank_permutation, unrank_permutations, sample_permutations,
+							unrank_combination, rank_combination, unrank_combinations, sample_combinations)
 
 Self = TypeVar('Self')
 
@@ -17,14 +20,216 @@ class _OldController(Context, CertificateGaggle, NaiveConsiderationBase):
 
 
 
-class Controller(Context, CarefulDecider, CertificateGaggle):
+class DecisionSpace:
+	'''summary of the cases that `consider` produces for some targets (see `Controller.analyze`)'''
+	def __init__(self, targets: Iterable[str], size: int, *, exact: bool = True,
+				 choices: dict[str, int] = None, unused: dict[str, AbstractDecision] = None):
+		'''
+		:param size: number of cases (or an upper bound, if not `exact`)
+		:param choices: number of choices that are considered for each decision (by choice gizmo) which affects
+		the targets
+		:param unused: decisions (by choice gizmo) which do not affect the targets and can be skipped
+		'''
+		self.targets = tuple(targets)
+		self.size = size
+		self.exact = exact
+		self.choices = choices or {}
+		self.unused = unused or {}
+
+
+	def __repr__(self):
+		return f'{self.__class__.__name__}({", ".join(self.targets)}: {"" if self.exact else "<="}{self.size})'
+
+
+	def __str__(self):
+		lines = [f'{"" if self.exact else "at most "}{self.size} case/s for {", ".join(self.targets)}']
+		lines.extend(f'  {gizmo}: {num} choice/s' for gizmo, num in self.choices.items())
+		if self.unused:
+			lines.append(f'  unused: {", ".join(self.unused)}')
+		return '\n'.join(lines)
+
+
+
+class Controller(SharedTopologyGaggle, Context, CarefulDecider, CertificateGaggle):
 	def create_case(self, cache: dict[str, Any] = None, chain: Chain = None) -> AbstractCase:
-		return super().create_case(cache, chain=chain).extend(list(self.vendors()))
+		case = super().create_case(cache, chain=chain)
+		if isinstance(case, Case):
+			return case.share_topology(self)
+		return case.extend(list(self.vendors()))
+
+
+	def _parents(self, gadget: AbstractGadget, gizmo: str) -> Iterator[str]:
+		if isinstance(gadget, AbstractGenetic):
+			for gene in gadget.genes(gizmo):
+				yield from gene.parents
+
+
+	def _walk_decisions(self, targets: Iterable[str], fixed: Mapping[str, CHOICE] = None
+						) -> tuple[dict[str, AbstractDecision], Optional[tuple[AbstractGadgetDecision, str]]]:
+		'''
+		walks the genes of the gadgets starting from the targets to find all decisions (by choice gizmo)
+
+		:param fixed: choices of gadget decisions for which (like for cached choices) only the consequence of
+		that choice is followed. If provided, the walk stops at the first gadget decision whose choice is unknown
+		(which is returned along with the gizmo it was reached for), otherwise the consequences of all choices are
+		followed
+		'''
+		decisions = {}
+		branch = None
+		todo = list(reversed(targets))
+		seen = set()
+		while len(todo):
+			gizmo = todo.pop()
+			if gizmo in seen or self.is_cached(gizmo) or not self.gives(gizmo):
+				continue
+			seen.add(gizmo)
+			gadget = next(self._gadgets(gizmo))
+			if isinstance(gadget, AbstractDecision):
+				known = self.is_cached(gadget.choice_gizmo)
+				if not known:
+					decisions.setdefault(gadget.choice_gizmo, gadget)
+				if isinstance(gadget, AbstractGadgetDecision):
+					if known or (fixed is not None and gadget.choice_gizmo in fixed):
+						choices = [self[gadget.choice_gizmo] if known else fixed[gadget.choice_gizmo]]
+					elif fixed is None:
+						choices = list(gadget.choices())
+					else:
+						if branch is None:
+							branch = gadget, gizmo
+						choices = []
+					for choice in choices:
+						todo.extend(reversed(list(self._parents(gadget.consequence(choice), gizmo))))
+			todo.extend(reversed(list(self._parents(gadget, gizmo))))
+		return decisions, branch
+
+
+	def _next_decision(self, targets: tuple[str, ...], prefix: dict[str, CHOICE],
+					   settings: dict[str, Any]) -> tuple[Optional[str], list[CHOICE]]:
+		'''
+		finds the first decision by walking the genes (see `_walk_decisions`) instead of evaluating any targets, so
+		the prefixes of `partition` are cheap to enumerate
+		'''
+		prior = {**self._prior(), **prefix}
+		decisions, _ = self._walk_decisions(targets, prefix)
+		for gizmo, decision in decisions.items():
+			if gizmo not in prefix:
+				chain = self._create_chain(targets, prior, **settings)
+				return gizmo, list(chain._decision_sampling(decision, self.create_case(prior)))
+		return None, []
+
+
+	def reachable_decisions(self, *targets: str) -> dict[str, AbstractDecision]:
+		'''
+		all decisions (by choice gizmo) that may have to be made to produce the targets according to the genes of
+		the gadgets (including decisions that are only reachable for some choices of other decisions)
+		'''
+		return self._walk_decisions(targets)[0]
+
+
+	def _space_size(self, targets: tuple[str, ...], fixed: dict[str, CHOICE], limit: Optional[int],
+					counts: dict[str, int]) -> tuple[int, bool]:
+		decisions, branch = self._walk_decisions(targets, fixed)
+		if branch is not None:
+			# every branch is walked again from the targets with the choice fixed
+			decision, gizmo = branch
+			options = list(decision.choices()) if gizmo == decision.choice_gizmo else [
+				choice for choice in decision.choices() if gizmo in decision.consequence(choice).gizmos()]
+			counts[decision.choice_gizmo] = max(counts.get(decision.choice_gizmo, 0), len(options))
+			size, exact = 0, True
+			for choice in options:
+				num, num_exact = self._space_size(targets, {**fixed, decision.choice_gizmo: choice}, limit, counts)
+				size += num
+				exact = exact and num_exact
+			return size, exact
+
+		size, exact = 1, True
+		for gizmo, decision in decisions.items():
+			if gizmo not in fixed:
+				num, num_exact = self._decision_size(decision, limit)
+				counts[gizmo] = max(counts.get(gizmo, 0), num)
+				size *= num
+				exact = exact and num_exact
+		return size, exact
+
+
+	def _decision_size(self, decision: AbstractDecision, limit: Optional[int]) -> tuple[int, bool]:
+		'''number of choices that `consider` visits for a decision (and whether that number is exact)'''
+		if isinstance(decision, AbstractCountableDecision):
+			num = decision.count(self)
+			if limit is not None and num > limit:
+				# weighted covers skip choices with zero weight
+				return limit, not (isinstance(decision, WeightedDecisionBase) and decision.weighted)
+			return num, True
+		return sum(1 for _ in decision.choices(self)), True
+
+
+	def analyze(self, *targets: str, limit: int = None) -> 'DecisionSpace':
+		'''
+		statically computes how many cases `consider` will produce for the targets (without creating any cases)
+		by following the genes of the gadgets and the consequences of gadget decisions
+
+		:param limit: same as for `consider`
+		'''
+		counts = {}
+		size, exact = self._space_size(tuple(targets), {}, limit, counts)
+		decisions = self.reachable_decisions(*targets)
+		unused = {}
+		for gadget in self._gadgets():
+			if (isinstance(gadget, AbstractDecision) and gadget.choice_gizmo not in decisions
+					and not self.is_cached(gadget.choice_gizmo)):
+				unused.setdefault(gadget.choice_gizmo, gadget)
+		return DecisionSpace(targets, size, exact=exact,
+							 choices={gizmo: counts.get(gizmo, 0) for gizmo in decisions}, unused=unused)
+
+
+	def _sampling_rng(self, decision: AbstractDecision, rng: RNG = None) -> RNG:
+		return numpy_rng(decision._find_rng(self) if rng is None else rng)
+
+
+	def sample(self, *targets: str, n: int, rng: RNG = None, vectorized: bool = False) -> dict[str, Any]:
+		'''
+		Draws `n` joint assignments of all reachable decisions at once and evaluates the targets for each of them
+		(eg. for Monte Carlo estimates over the decision space).
+
+		:param rng: used for all decisions (defaults to the stream that each decision would use to choose)
+		:param vectorized: if True, the targets are computed in a single pass where each decision produces all `n`
+		results at once (eg. as an array), so all tools must accept batches. Falls back to evaluating each sample
+		separately if any reachable decision selects between gadgets.
+		:return: the choices of the reachable decisions and the values of the targets (each with `n` entries)
+		'''
+		prior = {gizmo: self[gizmo] for gizmo in self.cached()}
+		decisions = self.reachable_decisions(*targets)
+		choices = {gizmo: decision._choose_many(self, n, self._sampling_rng(decision, rng))
+				   for gizmo, decision in decisions.items()}
+
+		if vectorized and not any(isinstance(decision, AbstractGadgetDecision) for decision in decisions.values()):
+			cache = dict(choices)
+			for gizmo, decision in decisions.items():
+				for output in decision.gizmos():
+					if output != gizmo:
+						cache[output] = decision._commit_many(self, choices[gizmo], output)
+			case = self.create_case({**cache, **prior})
+			return {**choices, **{target: case.grab(target) for target in targets}}
+
+		results = {target: [] for target in targets}
+		for i in range(n):
+			case = self.create_case({**{gizmo: values[i] for gizmo, values in choices.items()}, **prior})
+			for target in targets:
+				results[target].append(case.grab(target))
+		return {**choices, **results}
 
 
 
 class Case(SimpleCase, Controller):
-	pass
+	def share_topology(self, source: GaggleBase) -> Self:
+		'''use the gadgets of `source` without copying them until either is modified (copy-on-write)'''
+		if len(self._gadgets_list) or not isinstance(source, SharedTopologyGaggle):
+			return self.extend(list(source.vendors()))
+		super().share_topology(source)
+		if isinstance(source, CertificateGaggle):
+			self._decision_index = source.decisions()
+			self._choice_positions = source._choice_positions
+		return self
 Controller._Case = Case
 
 
@@ -34,8 +239,12 @@ class GadgetDecision(ConsiderableDecision, DynamicDecision):
 
 
 
-class SimpleDecision(ConsiderableDecision, CountableDecisionBase, SimpleDecisionBase):
+class SimpleDecision(ConsiderableDecision, WeightedDecisionBase, SimpleDecisionBase):
 	def __init__(self, gizmo: str, choices: Iterable[Any] | Mapping[str, Any] = None, **kwargs):
+		'''
+		:param weights: optional (relative) weight of each choice (see `WeightedDecisionBase`)
+		:param weights_gizmo: gizmo which provides the weights
+		'''
 		if choices is None:
 			choices = {}
 		if not isinstance(choices, Mapping):
@@ -52,11 +261,18 @@ class SimpleDecision(ConsiderableDecision, CountableDecisionBase, SimpleDecision
 		yield from self._choices.keys()
 
 
-	def add_choice(self: Self, option: Any, choice: CHOICE = None) -> Self:
+	def count(self, ctx: 'AbstractGame' = None, gizmo: str = None) -> int:
+		return len(self._choices)
+
+
+	def add_choice(self: Self, option: Any, choice: CHOICE = None, *, weight: float = None) -> Self:
 		if choice is None:
 			choice = len(self._choices)
 		assert choice not in self._choices, f'Choice {choice!r} already exists, specify unique choice name.'
 		self._choices[choice] = option
+		if weight is not None or (self._weights is not None and not isinstance(self._weights, Mapping)):
+			self.set_weight(choice, 1. if weight is None else weight)
+		self._compiled = None
 		return self
 
 
@@ -65,10 +281,19 @@ class SimpleDecision(ConsiderableDecision, CountableDecisionBase, SimpleDecision
 		return self._choices[choice]
 
 
+	def _commit_many(self, ctx: 'AbstractGame', choices: list[CHOICE], gizmo: str) -> Any:
+		values = [self._choices[choice] for choice in choices]
+		if all(isinstance(value, (int, float, bool)) for value in self._choices.values()):
+			return np.asarray(values)
+		return values
+
+
 
 class Permutation(ConsiderableDecision, LargeDecision, SimpleDecisionBase):
 	'''
 	Returns a random permutation of N objects as a tuple of indices.
+
+	Choices are the ranks of the permutations in lexicographic order.
 	'''
 	def __init__(self, N: int, **kwargs):
 		super().__init__(**kwargs)
@@ -77,49 +302,44 @@ class Permutation(ConsiderableDecision, LargeDecision, SimpleDecisionBase):
 
 	def count(self, ctx: 'AbstractGame' = None, gizmo: str = None) -> int:
 		'''how many choices are available'''
-		return (self.N + 1) * self.N // 2
+		return math.factorial(self.N)
 
 
 	@staticmethod
 	def _choice_to_permutation(index: int, N: int) -> list[int]:
-		"""
-		Convert an integer to a permutation of N objects in pure Python.
+		'''Convert a rank to the corresponding permutation of N objects (in O(N log N)).'''
+		return unrank_permutation(index, N)
 
-		(by ChatGPT4)
 
-		Parameters:
-		- index: The given integer representing the specific ordering.
-		- N: The number of distinct objects.
+	def rank(self, permutation: Iterable[int]) -> int:
+		'''the choice corresponding to the given permutation'''
+		return rank_permutation(permutation)
 
-		Returns:
-		- A list containing the indices for each element to arrange the objects into the specified ordering.
-		"""
-		# Compute factoradic representation
-		factoradic = []
-		for i in range(1, N + 1):
-			index, remainder = divmod(index, i)
-			factoradic.append(remainder)
 
-		# Reverse it for direct use
-		factoradic.reverse()
+	def unrank(self, choices: Iterable[int]) -> np.ndarray:
+		'''permutations of many choices at once as an array of shape (len(choices), N)'''
+		return unrank_permutations(choices, self.N)
 
-		# Generate permutation
-		elements = list(range(N))  # Elements to permute
-		permutation = []
-		for f in factoradic:
-			permutation.append(elements.pop(f))
 
-		return permutation
+	def sample(self, n: int, rng: RNG = None) -> np.ndarray:
+		'''`n` uniformly random permutations (without going through the choices) of shape (n, N)'''
+		return sample_permutations(self.N, n, rng)
 
 
 	def _commit(self, ctx: 'AbstractGame', choice: CHOICE, gizmo: str) -> tuple[Any, ...]:
 		return tuple(self._choice_to_permutation(choice, self.N))
 
 
+	def _commit_many(self, ctx: 'AbstractGame', choices: list[CHOICE], gizmo: str) -> np.ndarray:
+		return self.unrank(choices)
+
+
 
 class Combination(ConsiderableDecision, LargeDecision, SimpleDecisionBase):
 	'''
 	Returns a random combination of K objects from N objects as a tuple of indices.
+
+	Choices are the ranks of the (sorted) combinations in lexicographic order.
 	'''
 	def __init__(self, N: int, K: int, **kwargs):
 		super().__init__(**kwargs)
@@ -134,27 +354,30 @@ class Combination(ConsiderableDecision, LargeDecision, SimpleDecisionBase):
 
 	@staticmethod
 	def _choice_to_combination(index: int, n: int, k: int) -> list[int]:
-		"""
-		returns the i-th combination of k numbers chosen from 0,1,2,...,n-1
-
-		adapted from https://math.stackexchange.com/questions/1227409/indexing-all-combinations-without-making-list
-		"""
-		mx = math.comb(n, k)
-		assert 0 <= index <= mx, f"index={index} must be in [0, {mx}]"
-		c = []
-		r = index
-		j = 0
-		for s in range(1, k + 1):
-			cs = j + 1
-			while r - math.comb(n - cs, k - s) > 0:
-				r -= math.comb(n - cs, k - s)
-				cs += 1
-			c.append(cs - 1)
-			j = cs
-		return c
+		'''returns the `index`-th combination of k numbers chosen from 0,1,2,...,n-1'''
+		return unrank_combination(index, n, k)
+
+
+	def rank(self, combination: Iterable[int]) -> int:
+		'''the choice corresponding to the given combination'''
+		return rank_combination(combination, self.N)
+
+
+	def unrank(self, choices: Iterable[int]) -> np.ndarray:
+		'''combinations of many choices at once as an array of shape (len(choices), K)'''
+		return unrank_combinations(choices, self.N, self.K)
+
+
+	def sample(self, n: int, rng: RNG = None) -> np.ndarray:
+		'''`n` uniformly random combinations (without going through the choices) of shape (n, K)'''
+		return sample_combinations(self.N, self.K, n, rng)
 
 
 	def _commit(self, ctx: 'AbstractGame', choice: CHOICE, gizmo: str) -> tuple[Any, ...]:
 		return tuple(self._choice_to_combination(choice, self.N, self.K))
 
 
+	def _commit_many(self, ctx: 'AbstractGame', choices: list[CHOICE], gizmo: str) -> np.ndarray:
+		return self.unrank(choices)
+
+
@@ -5,6 +5,7 @@ from ... import AbstractGame
 from ...core import ToolKit, Context, tool
 from .op import GadgetDecision, SimpleDecision, Combination, Controller
 from ..simple import DictGadget
+from ..sampling import RandomStreams
 
 
 def test_decisions():
@@ -252,6 +253,208 @@ def test_large_decision():
 
 
 
+def test_seeded_decisions():
+
+	def picks(seed):
+		ctx = Controller(RandomStreams(seed), SimpleDecision('A', list(range(100))), SimpleDecision('B', list(range(100))),
+						 Combination(20, 10, gizmo='combo', choice_gizmo='choice'))
+		return ctx['A'], ctx['B'], ctx['combo']
+
+	assert picks(5) == picks(5)
+	assert picks(5) != picks(6)
+
+	gen = Combination(20, 10, gizmo='combo', choice_gizmo='choice')
+	ctx = Controller(RandomStreams(3))
+	assert list(gen.cover(5, ctx)) == list(gen.cover(5, Controller(RandomStreams(3))))
+	assert len(set(gen.cover(5, ctx))) == 5
+
+
+
+
+def test_incremental_chain():
+	calls = []
+
+	@tool('prefix')
+	def prefix(A):
+		calls.append(A)
+		return f'{A}!'
+
+	@tool('full')
+	def full(prefix, B):
+		return f'{prefix}{B}'
+
+	ctx = Controller(SimpleDecision('A', [1, 2]), SimpleDecision('B', [4, 5, 6]), prefix, full)
+
+	cases = list(ctx.consider('full'))
+	assert [case['full'] for case in cases] == ['1!4', '1!5', '1!6', '2!4', '2!5', '2!6']
+	assert calls == [1, 2] # sibling cases reuse everything upstream of the changed decision
+	assert all(case._gadgets_table is ctx._gadgets_table for case in cases)
+
+	cases[0]['A'] = 3 # manual changes are neither reused nor leak into the controller
+	assert cases[0]['full'] == '3!4'
+	cases[0].include(SimpleDecision('C', [7]))
+	assert cases[0]['C'] == 7 and not ctx.gives('C')
+
+	case = next(iter(ctx.consider('full')))
+	ctx.include(SimpleDecision('D', [7])) # neither do changes to the controller leak into existing cases
+	assert ctx.gives('D') and not case.gives('D')
+	assert case['full'] == '1!4' and ctx._gadgets_table is not case._gadgets_table
+
+
+
+def test_unranking():
+	import itertools
+	import numpy as np
+	from .op import Permutation
+
+	perm = Permutation(5, gizmo='order')
+	assert perm.count() == 120
+	everything = list(itertools.permutations(range(5)))
+	assert [tuple(perm._choice_to_permutation(i, 5)) for i in range(120)] == everything
+	assert all(perm.rank(p) == i for i, p in enumerate(everything))
+	assert np.array_equal(perm.unrank(range(120)), np.array(everything))
+
+	combo = Combination(7, 3, gizmo='combo')
+	everything = list(itertools.combinations(range(7), 3))
+	assert [tuple(combo._choice_to_combination(i, 7, 3)) for i in range(35)] == everything
+	assert all(combo.rank(c) == i for i, c in enumerate(everything))
+	assert np.array_equal(combo.unrank(range(35)), np.array(everything))
+
+	big = Combination(200, 100, gizmo='big')
+	index = big.count() // 3
+	assert big.rank(big._choice_to_combination(index, 200, 100)) == index
+	assert np.array_equal(big.unrank([index, 0])[1], np.arange(100))
+	choice = big._choose(None, rng=np.random.default_rng(0)) # larger than int64
+	assert 0 <= choice < big.count()
+
+	edge = Combination(67, 33, gizmo='edge') # binomials fit into int64 but the largest indices do not
+	last = edge.count() - 1
+	assert np.array_equal(edge.unrank([0, last]), [list(range(33)), list(range(34, 67))])
+
+	from .combinatorics import unrank_combinations
+	assert unrank_combinations([0], 0, 0).shape == (1, 0) # the empty combination
+	assert unrank_combinations([0, 0], 3, 0).shape == (2, 0)
+
+	rng = np.random.default_rng(1)
+	samples = Combination(10, 4, gizmo='c').sample(1000, rng)
+	assert samples.shape == (1000, 4) and np.all(np.diff(samples, axis=1) > 0)
+	assert np.all(np.sort(Permutation(6, gizmo='p').sample(50, rng), axis=1) == np.arange(6))
+
+
+
+def test_monte_carlo():
+	import numpy as np
+	from .op import Permutation
+
+	@tool('total')
+	def total(A, B):
+		return A + B
+
+	@tool('first')
+	def first(order):
+		return np.asarray(order)[..., 0]
+
+	ctx = Controller(SimpleDecision('A', [1, 2, 3]), SimpleDecision('B', [10, 20]), Permutation(4, gizmo='order'),
+					 total, first)
+	assert set(ctx.reachable_decisions('total')) == {'A_choice', 'B_choice'}
+
+	per_case = ctx.sample('total', 'first', n=200, rng=np.random.default_rng(0))
+	batched = ctx.sample('total', 'first', n=200, rng=np.random.default_rng(0), vectorized=True)
+	assert per_case['A_choice'] == batched['A_choice'] and per_case['order_choice'] == batched['order_choice']
+	assert list(batched['total']) == per_case['total']
+	assert list(batched['first']) == per_case['first']
+	assert set(per_case['total']) == {11, 12, 13, 21, 22, 23}
+
+	ctx['B'] = 0 # cached gizmos are respected
+	assert set(ctx.sample('total', n=20, vectorized=True)['total']) <= {1, 2, 3}
+
+	@tool('C')
+	def from_a(A):
+		return A
+
+	@tool('C')
+	def from_b(B):
+		return -B
+
+	ctx = Controller(GadgetDecision([from_a, from_b], choice_gizmo='branch'),
+					 SimpleDecision('A', [1, 2, 3]), SimpleDecision('B', [4, 5]))
+	assert set(ctx.reachable_decisions('C')) == {'branch', 'A_choice', 'B_choice'}
+	out = ctx.sample('C', n=100, rng=np.random.default_rng(1), vectorized=True) # falls back to each case
+	assert set(out['C']) == {1, 2, 3, -4, -5}
+
+
+
+def test_parallel_exploration():
+	from concurrent.futures import ThreadPoolExecutor
+
+	@tool('C')
+	def from_a(A):
+		return A + 100
+
+	@tool('C')
+	def from_b(B):
+		return -B
+
+	calls = []
+
+	@tool('D')
+	def final(C):
+		calls.append(C)
+		return C
+
+	ctx = Controller(GadgetDecision([from_a, from_b], choice_gizmo='my_choice'),
+					 SimpleDecision('A', [1, 2, 3]), SimpleDecision('B', [4, 5]), final)
+	serial = [case['C'] for case in ctx.consider('C')]
+
+	assert len(list(ctx.partition('D', depth=3))) == 5 and calls == [] # no targets are evaluated
+	stream = ctx.explore('D')
+	assert next(stream)['D'] == 101 and calls == [101] # results are streamed case by case
+
+	assert list(ctx.partition('C')) == [{'my_choice': 0}, {'my_choice': 1}]
+	assert list(ctx.partition('C', depth=2)) == [{'my_choice': 0, 'A_choice': 0}, {'my_choice': 0, 'A_choice': 1},
+												 {'my_choice': 0, 'A_choice': 2}, {'my_choice': 1, 'B_choice': 0},
+												 {'my_choice': 1, 'B_choice': 1}]
+	for depth in [0, 1, 2, 3]:
+		with ThreadPoolExecutor(3) as executor:
+			results = list(ctx.explore('C', executor=executor, depth=depth))
+		assert [result['C'] for result in results] == serial
+	assert results[-1] == {'my_choice': 1, 'B_choice': 1, 'C': -5}
+	assert list(ctx.explore('C', extract=lambda case: case['C'] * 2)) == [2 * c for c in serial]
+
+
+
+def test_weighted_decision():
+	import numpy as np
+	from collections import Counter
+
+	decision = SimpleDecision('A', {'x': 1, 'y': 2, 'z': 3}, weights={'x': 0., 'y': 1., 'z': 3.})
+	ctx = Controller(decision)
+	rng = np.random.default_rng(0)
+	counts = Counter(decision._choose(ctx, rng) for _ in range(4000))
+	assert 'x' not in counts and 0.7 < counts['z'] / 4000 < 0.8
+	counts = Counter(decision._choose_many(ctx, 4000, rng))
+	assert 'x' not in counts and 0.7 < counts['z'] / 4000 < 0.8
+	table = decision._compile(ctx)[1]
+	assert decision._compile(ctx)[1] is table # compiled once
+
+	assert sorted(decision.cover(5, ctx)) == ['y', 'z'] # without replacement
+	decision.add_choice(4, 'w', weight=10.)
+	assert decision._compile(ctx)[1] is not table
+	assert 'w' in set(decision.cover(3, ctx))
+
+	ctx = Controller(SimpleDecision('B', [10, 20, 30], weights_gizmo='prefs'))
+	ctx['prefs'] = [0, 0, 1]
+	assert ctx['B'] == 30
+	assert set(ctx.sample('B', n=50)['B']) == {30}
+	decision = next(ctx.vendors('B'))
+	table = decision._compile(ctx)[1]
+	assert decision._compile(ctx)[1] is table # cached by the identity of the weights
+	ctx['prefs'] = [1, 0, 0]
+	assert decision._compile(ctx)[1] is not table and decision._compile(ctx)[1].probabilities[0] == 1
+	ctx = Controller(SimpleDecision('B', [10, 20, 30], weights_gizmo='prefs'), DictGadget({'prefs': {0: 0, 1: 5, 2: 0}}))
+	assert [case['B'] for case in ctx.consider('B', limit=2)] == [20]
+
+
 
 # test nested consideration - case.consider()
 
@@ -276,3 +479,135 @@ def test_large_decision():
 
 
 
+
+
+
+def test_analyze():
+	@tool('C')
+	def from_a(A, D):
+		return A + D
+
+	@tool('C')
+	def from_b(B):
+		return -B
+
+	@tool('total')
+	def total(C, E):
+		return C + E
+
+	ctx = Controller(GadgetDecision([from_a, from_b], choice_gizmo='branch'),
+					 SimpleDecision('A', [1, 2, 3]), SimpleDecision('B', [4, 5]), SimpleDecision('D', [0, 10]),
+					 SimpleDecision('E', [0, 100]), SimpleDecision('unrelated', 'xyz'), total)
+
+	space = ctx.analyze('total')
+	assert space.exact and space.size == len(list(ctx.consider('total'))) == (3 * 2 + 2) * 2
+	assert space.choices == {'branch': 2, 'A_choice': 3, 'D_choice': 2, 'B_choice': 2, 'E_choice': 2}
+	assert list(space.unused) == ['unrelated_choice']
+	assert ctx.analyze('unrelated').size == 3
+
+	space = ctx.analyze('total', limit=2)
+	assert space.size == len(list(ctx.consider('total', limit=2))) == (2 * 2 + 2) * 2
+
+	ctx['branch'] = 1 # fixed choices are not branched on
+	space = ctx.analyze('total')
+	assert space.size == len(list(ctx.consider('total'))) == 4
+	assert set(space.choices) == {'B_choice', 'E_choice'}
+	assert 'A_choice' in space.unused
+
+
+
+def test_certificate_key():
+	from .op import Permutation
+
+	@tool('C')
+	def from_a(A):
+		return A
+
+	@tool('C')
+	def from_b(B):
+		return -B
+
+	ctx = Controller(GadgetDecision([from_a, from_b], choice_gizmo='branch'),
+					 SimpleDecision('A', 'xyz'), SimpleDecision('B', [4, 5]), Permutation(3, gizmo='order'))
+	assert set(ctx.decisions()) == {'branch', 'A_choice', 'B_choice', 'order_choice'}
+
+	keys = {}
+	for case in ctx.consider('C', 'order'):
+		cert = case.certificate()
+		assert set(cert) == {'branch', 'order_choice'} | ({'A_choice'} if cert['branch'] == 0 else {'B_choice'})
+		key = case.certificate_key()
+		assert isinstance(key, int) and key not in keys
+		assert case.decode_certificate(key) == cert
+		keys[key] = case['C']
+	assert len(keys) == (3 + 2) * 6
+
+	ctx.include(SimpleDecision('D', [1, 2])) # the index is updated when gadgets change
+	assert 'D_choice' in ctx.decisions() and 'D_choice' not in case.decisions() and not case.gives('D')
+	ctx['D_choice'] = 1
+	assert ctx.certificate() == {'D_choice': 1}
+	assert ctx.decode_certificate(ctx.certificate_key()) == {'D_choice': 1}
+
+	# the key is cached until the certificate (or anything else in the cache) changes
+	key = ctx.certificate_key()
+	ctx._choice_digits = None
+	assert ctx.certificate_key() == key
+	del ctx._choice_digits
+	ctx['branch'] = 1
+	assert ctx.decode_certificate(ctx.certificate_key()) == {'D_choice': 1, 'branch': 1}
+	del ctx['D_choice']
+	assert ctx.decode_certificate(ctx.certificate_key()) == {'branch': 1}
+	ctx.data['A_choice'] = 2
+	assert ctx.decode_certificate(ctx.certificate_key()) == {'branch': 1, 'A_choice': 2}
+	ctx.clear_cache()
+	assert ctx.certificate_key() == 0
+
+	class Shifted(SimpleDecision): # the choices depend on the context
+		def choices(self, ctx=None, gizmo=None):
+			offset = ctx.grab('offset')
+			yield from (offset, offset + 1)
+
+	ctx = Controller(Shifted('S', [None, None]))
+	ctx['offset'] = 10
+	case = ctx.create_case({'offset': 11})
+	assert ctx.certificate_key({'S_choice': 11}) == 2
+	assert case.certificate_key({'S_choice': 11}) == 1
+	assert case.decode_certificate(1) == {'S_choice': 11} and ctx.decode_certificate(1) == {'S_choice': 10}
+
+
+
+def test_resume_chain(tmp_path):
+	from .op import Permutation
+
+	@tool('C')
+	def from_a(A):
+		return A
+
+	@tool('C')
+	def from_b(B):
+		return -B
+
+	ctx = Controller(GadgetDecision([from_a, from_b], choice_gizmo='branch'),
+					 SimpleDecision('A', [1, 2, 3]), SimpleDecision('B', [4, 5]), Permutation(4, gizmo='order'))
+	path = str(tmp_path / 'chain.pkl')
+
+	chain = ctx.resume('C', 'order', checkpoint=path, checkpoint_every=4, limit=3) # order uses a random cover
+	done = []
+	for case in chain:
+		if len(done) == 10: # crash while processing the 11th case
+			break
+		done.append(case.certificate())
+	assert chain.load(path)['cases'] == 8
+
+	resumed = ctx.resume('C', 'order', checkpoint=path, checkpoint_every=4, limit=3)
+	rest = [case.certificate() for case in resumed]
+	everything = done[:8] + rest
+	assert len(everything) == (3 + 2) * 3
+	assert done[8] == rest[0] # the random cover of the checkpointed case is replayed
+	assert chain.load(path)['completed']
+	assert list(ctx.resume('C', 'order', checkpoint=path)) == []
+
+	full = [case.certificate() for case in ctx.consider('C', 'A')]
+	chain = ctx.consider('C', 'A')
+	first = [next(chain).certificate() for _ in range(3)]
+	resumed = ctx.consider('C', 'A').load_state(chain.state())
+	assert first + [case.certificate() for case in resumed] == full
@@ -1,4 +1,6 @@
-from typing import Iterable, Mapping, Any, Iterator, TypeVar
+from typing import Iterable, Mapping, Any, Iterator, TypeVar, Optional
+import weakref
+from itertools import count
 
 from .. import AbstractGadget, AbstractGaggle
 from ..core.gaggles import CraftyGaggle, MutableGaggle
@@ -15,7 +17,65 @@ from ..gears.mechanics import MechanizedBase
 
 Self = TypeVar('Self')
 
-GAUGE = dict[str, str]
+GAUGE = Mapping[str, str]
+
+_gauge_stamps = count(1) # orders gauges across gaggles (drawing a stamp is atomic, so this is thread-safe)
+
+
+
+class Gauge(Mapping[str, str]):
+	'''
+	Immutable relabeling (internal gizmo -> external gizmo) with a precomputed inverse, so both directions are
+	O(1) lookups. Applying another gauge produces a new view (see `compose`) instead of modifying this one.
+	'''
+	__slots__ = ('_forward', '_inverse')
+
+	def __init__(self, forward: Mapping[str, str] = None):
+		self._forward = dict(forward or {})
+		self._inverse = None
+
+
+	def __getitem__(self, gizmo: str) -> str:
+		return self._forward[gizmo]
+
+	def __iter__(self) -> Iterator[str]:
+		return iter(self._forward)
+
+	def __len__(self) -> int:
+		return len(self._forward)
+
+	def __repr__(self):
+		return f'{self.__class__.__name__}({self._forward!r})'
+
+
+	def gap(self, internal_gizmo: str) -> str:
+		'''internal gizmo -> external gizmo'''
+		return self._forward.get(internal_gizmo, internal_gizmo)
+
+
+	def invert(self, external_gizmo: str) -> Optional[str]:
+		'''external gizmo -> internal gizmo (only if unambiguous, otherwise None)'''
+		if self._inverse is None:
+			inverse = {}
+			for internal, external in self._forward.items():
+				inverse[external] = internal if external not in inverse else None
+			self._inverse = inverse
+		return self._inverse.get(external_gizmo)
+
+
+	def compose(self, gauge: GAUGE) -> 'Gauge':
+		'''the view resulting from applying `gauge` on top of this one'''
+		if not gauge:
+			return self
+		forward = self._forward.copy()
+		relabeled = set()
+		for gizmo, gap in self._forward.items():
+			if gap in gauge:
+				forward[gizmo] = gauge.get(gap, gap)
+				relabeled.add(gap)
+		forward.update((gizmo, gap) for gizmo, gap in gauge.items() if gizmo not in relabeled)
+		return self.__class__(forward)
+
 
 
 class AbstractGauged(AbstractGadget):
@@ -36,27 +96,120 @@ class AbstractGapped(AbstractGauged):
 
 
 
-class Gauged(AbstractGauged):
+class LazyGauged(AbstractGauged):
+	'''
+	Gauges applied to a gaggle are not pushed through the whole tree of gadgets. Instead every gadget keeps
+	track of the gaggles it was included in and pulls their new gauges the next time it is used.
+
+	When a gaggle is gauged, only the gadgets below it are flagged as stale, so syncing is free for all other
+	gadgets. Owners are only referenced weakly, so including a gadget in a gaggle does not keep the gaggle alive.
+	Every gauge is stamped when it is first applied to a gaggle and keeps that stamp as it is pulled further down,
+	so a gadget included in several gaggles applies their pending gauges in the order they were originally applied
+	(not in the order of its owners).
+
+	Subclasses should override `_gauge_apply` (which only relabels this gadget) rather than `gauge_apply`.
+	'''
+	_gauge_stale = False # whether any owner may have been gauged since the last sync
+	_gauge_owners: Optional[list[list]] = None # [weakref to gaggle, number of its gauges already applied]
+
+	def gauge_apply(self: Self, gauge: GAUGE) -> Self:
+		self._sync_gauges()
+		return self._gauge_apply(gauge)
+
+
+	def _gauge_apply(self: Self, gauge: GAUGE) -> Self:
+		return self
+
+
+	def _sync_gauges(self) -> None:
+		'''apply any gauges that were applied to the gaggles that include this gadget in the meantime'''
+		if not self._gauge_stale:
+			return
+		self._gauge_stale = False
+		if self._gauge_owners:
+			links = []
+			pending = []
+			for link in self._gauge_owners:
+				owner = link[0]()
+				if owner is None: # the gaggle was garbage collected
+					continue
+				links.append(link)
+				owner._sync_gauges()
+				log = owner._gauge_log
+				if log is not None and link[1] < len(log):
+					pending.extend(log[link[1]:])
+					link[1] = len(log)
+			self._gauge_owners = links
+			pending.sort(key=lambda entry: entry[0])
+			for stamp, gauge in pending:
+				self._gauge_pull(stamp, gauge)
+
+
+	def _gauge_pull(self, stamp: int, gauge: Gauge) -> None:
+		'''apply a gauge pulled from an owner (see `GaugedGaggle` which keeps the stamp)'''
+		self._gauge_apply(gauge)
+
+
+	def _follow_gauges(self, owner: 'GaugedGaggle') -> None:
+		'''only gauges applied to `owner` from now on apply to this gadget'''
+		owner._sync_gauges()
+		self._sync_gauges()
+		links = []
+		for link in self._gauge_owners or ():
+			followed = link[0]()
+			if followed is owner:
+				return
+			if followed is not None:
+				links.append(link)
+		self._gauge_owners = links
+		self._gauge_owners.append([weakref.ref(owner), 0 if owner._gauge_log is None else len(owner._gauge_log)])
+
+
+	def _unfollow_gauges(self, owner: 'GaugedGaggle') -> None:
+		self._sync_gauges()
+		if self._gauge_owners:
+			self._gauge_owners = [link for link in self._gauge_owners
+								  if link[0]() is not owner and link[0]() is not None]
+
+
+	def gizmos(self) -> Iterator[str]:
+		self._sync_gauges()
+		return super().gizmos()
+
+
+	def gives(self, gizmo: str) -> bool:
+		self._sync_gauges()
+		return super().gives(gizmo)
+
+
+	def grab_from(self, ctx: Optional['AbstractGame'], gizmo: str) -> Any:
+		self._sync_gauges()
+		return super().grab_from(ctx, gizmo)
+
+
+
+class Gauged(LazyGauged):
 	'''Gauges allow you to relabel output gizmos'''
 	def __init__(self, *args, gap: Mapping[str, str] = None, **kwargs):
 		'''gap: internal gizmo -> external gizmo'''
-		if gap is None: gap = {}
 		super().__init__(*args, **kwargs)
-		self._gauge = gap
+		self._gauge_view = Gauge(gap)
 
 
-	def gauge_apply(self: Self, gauge: GAUGE) -> Self:
+	@property
+	def _gauge(self) -> Gauge:
+		self._sync_gauges()
+		return self._gauge_view
+
+
+	def _gauge_apply(self: Self, gauge: GAUGE) -> Self:
 		'''Applies the gauge to the Gauged.'''
-		new = gauge.copy()
-		for gizmo, gap in self._gauge.items():
-			if gap in gauge:
-				self._gauge[gizmo] = new.pop(gap)
-		self._gauge.update(new)
-		return self
+		self._gauge_view = self._gauge_view.compose(gauge)
+		return super()._gauge_apply(gauge)
 
 
 
-class GappedGadget(AbstractGapped):
+class GappedGadget(AbstractGapped, LazyGauged):
 	def gizmos(self) -> Iterator[str]:
 		for gizmo in super().gizmos():
 			yield self.gap(gizmo)
@@ -67,34 +220,124 @@ class Gapped(Gauged, GappedGadget):
 	'''Gapped gauges allow you to relabel inputs as well'''
 	def gap(self, internal_gizmo: str) -> str:
 		'''Converts an internal gizmo to its external representation. Meant only for inputs to this gadget.'''
-		return self._gauge.get(internal_gizmo, internal_gizmo)
+		return self._gauge.gap(internal_gizmo)
 
 	def gap_invert(self, external_gizmo: str) -> str:
-		inv = {}
-		for k, v in self._gauge.items():
-			inv.setdefault(v, []).append(k)
-		if external_gizmo in inv and len(inv[external_gizmo]) == 1:
-			return inv[external_gizmo][0]
+		return self._gauge.invert(external_gizmo)
 
 
 
 class GaugedGaggle(MutableGaggle, Gauged):
-	def gauge_apply(self: Self, gauge: GAUGE) -> Self:
+	'''
+	Gauges applied to the gaggle relabel its own table right away, and are logged for the included gadgets to
+	pull lazily (see `LazyGauged`).
+	'''
+	_gauge_log: Optional[list[tuple[int, Gauge]]] = None # (stamp, gauge) in the order they were applied
+	_gauge_origin: Optional[int] = None # stamp of the gauge this gaggle is currently pulling (see `_gauge_pull`)
+	_eager_gauged: Optional[list[AbstractGauged]] = None # gauged gadgets which don't pull gauges themselves
+
+	def _gauge_pull(self, stamp: int, gauge: Gauge) -> None:
+		self._gauge_origin = stamp
+		try:
+			self._gauge_apply(gauge)
+		finally:
+			self._gauge_origin = None
+
+
+	def _gauge_apply(self: Self, gauge: GAUGE) -> Self:
 		'''Applies the gauge to the GaugedGaggle.'''
-		super().gauge_apply(gauge)
-		for gadget in self.vendors():
-			if isinstance(gadget, AbstractGauged):
+		stamp = self._gauge_origin
+		super()._gauge_apply(gauge)
+		if not gauge:
+			return self
+		gauge = gauge if isinstance(gauge, Gauge) else Gauge(gauge)
+		if self._gauge_log is None:
+			self._gauge_log = []
+		self._gauge_log.append((next(_gauge_stamps) if stamp is None else stamp, gauge))
+		self._mark_gauges_stale()
+		if self._eager_gauged:
+			for gadget in self._eager_gauged:
 				gadget.gauge_apply(gauge)
-		table = {gauge.get(gizmo, gizmo): gadgets for gizmo, gadgets in self._gadgets_table.items()}
-		self._gadgets_table.clear()
-		self._gadgets_table.update(table)
+		if any(gizmo in self._gadgets_table for gizmo in gauge):
+			# replaced rather than updated in place, since the table may be shared (see `SharedTopologyGaggle`)
+			self._gadgets_table = {gauge.gap(gizmo): gadgets for gizmo, gadgets in self._gadgets_table.items()}
+		return self
+
+
+	def _mark_gauges_stale(self) -> None:
+		'''flag all (lazily gauged) gadgets below this gaggle, so they pull the new gauge when they are used next'''
+		seen = {id(self)}
+		stack = [self]
+		while stack:
+			for gadget in stack.pop()._gadgets_list:
+				if isinstance(gadget, LazyGauged) and id(gadget) not in seen:
+					seen.add(id(gadget))
+					gadget._gauge_stale = True
+					if isinstance(gadget, GaugedGaggle):
+						stack.append(gadget)
+
+
+	def extend(self, gadgets: Iterable[AbstractGadget]) -> Self:
+		self._sync_gauges()
+		gadgets = list(gadgets)
+		super().extend(gadgets)
+		for gadget in gadgets:
+			self._adopt_gauged(gadget)
 		return self
 
 
+	def _process_skill(self, skill: AbstractGadget):
+		super()._process_skill(skill)
+		self._adopt_gauged(skill)
+
+
+	def _adopt_gauged(self, gadget: AbstractGadget) -> None:
+		'''future gauges applied to this gaggle also apply to `gadget`'''
+		if isinstance(gadget, LazyGauged):
+			gadget._follow_gauges(self)
+		elif isinstance(gadget, AbstractGauged):
+			if self._eager_gauged is None:
+				self._eager_gauged = []
+			self._eager_gauged.append(gadget)
+
+
+	def exclude(self, *gadgets: AbstractGadget) -> Self:
+		self._sync_gauges()
+		super().exclude(*gadgets)
+		for gadget in gadgets:
+			if isinstance(gadget, LazyGauged):
+				gadget._unfollow_gauges(self)
+			elif self._eager_gauged and gadget in self._eager_gauged:
+				self._eager_gauged.remove(gadget)
+		return self
+
+
+	def gizmos(self) -> Iterator[str]:
+		self._sync_gauges()
+		return super().gizmos()
+
+
+	def gives(self, gizmo: str) -> bool:
+		self._sync_gauges()
+		return super().gives(gizmo)
+
+
+	def vendors(self, gizmo: Optional[str] = None) -> Iterator[AbstractGadget]:
+		self._sync_gauges()
+		return super().vendors(gizmo)
+
+
+	def grab_from(self, ctx: Optional['AbstractGame'], gizmo: str) -> Any:
+		self._sync_gauges()
+		return super().grab_from(ctx, gizmo)
+
+
 
 class GaugedGame(CacheGame, GaugedGaggle):
-	def gauge_apply(self: Self, gauge: GAUGE) -> Self:
-		super().gauge_apply(gauge)
+	def _gauge_apply(self: Self, gauge: GAUGE) -> Self:
+		super()._gauge_apply(gauge)
+		if gauge:
+			self.forget_failures()
 		cached = {key: value for key, value in self.data.items() if key in gauge}
 		for key, value in cached.items():
 			del self.data[key]
@@ -102,29 +345,44 @@ class GaugedGame(CacheGame, GaugedGaggle):
 		return self
 
 
+	def is_cached(self, gizmo: str) -> bool:
+		self._sync_gauges()
+		return super().is_cached(gizmo)
+
+
 
 class AutoFunctionGapped(GappedGadget, AutoFunctionGadget):
+	_raw_arg_map = None
+	_arg_view = None
+
+	@property
+	def _arg_map(self) -> dict[str, str]:
+		self._sync_gauges()
+		return self._raw_arg_map
+
+	@_arg_map.setter
+	def _arg_map(self, arg_map: dict[str, str]):
+		self._raw_arg_map = arg_map
+		self._arg_view = None
+
+
 	def gap(self, internal_gizmo: str) -> str:
 		'''Converts an internal gizmo to its external representation.'''
 		return self._arg_map.get(internal_gizmo, internal_gizmo)
 
 
 	def gap_invert(self, external_gizmo: str) -> str:
-		inv = {}
-		for k, v in self._arg_map.items():
-			inv.setdefault(v, []).append(k)
-		if external_gizmo in inv and len(inv[external_gizmo]) == 1:
-			return inv[external_gizmo][0]
+		arg_map = self._arg_map
+		if self._arg_view is None:
+			self._arg_view = Gauge(arg_map)
+		return self._arg_view.invert(external_gizmo)
 
 
-	def gauge_apply(self, gauge: GAUGE) -> Self:
+	def _gauge_apply(self, gauge: GAUGE) -> Self:
 		'''Applies the gauge to the Gauged.'''
-		new = gauge.copy()
-		for gizmo, gap in self._arg_map.items():
-			if gap in gauge:
-				self._arg_map[gizmo] = new.pop(gap)
-		self._arg_map.update(new)
-		return self
+		if gauge:
+			self._arg_map = Gauge(self._raw_arg_map).compose(gauge)._forward
+		return super()._gauge_apply(gauge)
 
 
 
@@ -136,15 +394,24 @@ class GearBox(Gapped, _GearBox, GaugedGaggle):
 class GaugedGearedGaggle(GearedGaggle, Gauged):
 	_GearBox = GearBox
 	def gearbox(self) -> 'AbstractGearbox':
-		return super().gearbox().gauge_apply(self._gauge)
+		self._sync_gauges()
+		return super().gearbox()
+
+	def _build_gearbox(self, *args, **kwargs) -> 'AbstractGearbox':
+		return super()._build_gearbox(*args, **kwargs).gauge_apply(self._gauge)
+
+	def _gauge_apply(self: Self, gauge: GAUGE) -> Self:
+		if gauge:
+			self._invalidate_gearbox()
+		return super()._gauge_apply(gauge)
 
 
 
 class GaugedMechanized(MechanizedBase, Gauged):
-	def gauge_apply(self: Self, gauge: GAUGE) -> Self:
-		if self._mechanics is not None:
+	def _gauge_apply(self: Self, gauge: GAUGE) -> Self:
+		if gauge and self._mechanics is not None:
 			self._mechanics.gauge_apply(gauge)
-		return super().gauge_apply(gauge)
+		return super()._gauge_apply(gauge)
 
 
 
@@ -168,6 +435,18 @@ class Mechanism(GaugedMechanized, GaugedGearedGaggle, GaugedGaggle, _Mechanism):
 	class _GearMechanism(Gapped, GaugedGaggle, _Mechanism._GearMechanism):
 		pass
 
+	def _gauge_apply(self: Self, gauge: GAUGE) -> Self:
+		out = super()._gauge_apply(gauge)
+		if gauge:
+			self._relabeled()
+		return out
+
+	def _fallback_route(self, internal: str, gangs: tuple['Mechanism', ...]):
+		for gang in gangs:
+			if isinstance(gang, LazyGauged):
+				gang._sync_gauges()
+		return super()._fallback_route(internal, gangs)
+
 
 class ToolKit(Gapped, GaugedMechanized, GaugedGearedGaggle, GaugedGaggle, _ToolKit):
 	_Mechanics = Mechanics
@@ -227,8 +506,10 @@ class DictGadget(Gauged, _DictGadget): # TODO: unit test this and the GappedCap
 		super().__init__(*args, **kwargs)
 		self.gauge_apply(self._gauge)
 
-	def gauge_apply(self: Self, gauge: GAUGE) -> Self:
-		super().gauge_apply(gauge)
+	def _gauge_apply(self: Self, gauge: GAUGE) -> Self:
+		super()._gauge_apply(gauge)
+		if not gauge:
+			return self
 		for src in [self.data, *self._srcs]:
 			for key in list(src.keys()):
 				fix = gauge.get(key, key)
@@ -247,8 +528,10 @@ class Table(Gapped, _Table): # TODO: unit test this
 			self.gauge_apply(self._gauge)
 		return self
 
-	def gauge_apply(self: Self, gauge: GAUGE) -> Self:
-		super().gauge_apply(gauge)
+	def _gauge_apply(self: Self, gauge: GAUGE) -> Self:
+		super()._gauge_apply(gauge)
+		if not gauge:
+			return self
 		if self._index_gizmo is not None and self._index_gizmo in gauge:
 			self._index_gizmo = gauge[self._index_gizmo]
 		if self.is_loaded:
@@ -0,0 +1,212 @@
+from typing import Iterable, Union, Any
+import random
+import numpy as np
+
+from .gaps import ToolKit, tool
+
+
+
+RNG = Union[random.Random, np.random.Generator, np.random.RandomState, Any]
+
+
+def random_index(N: int, rng: RNG = None) -> int:
+	'''draws a uniformly random integer from [0, N) with either a python or a numpy rng'''
+	if rng is None:
+		rng = random
+	if isinstance(rng, (np.random.Generator, np.random.RandomState)):
+		if N > np.iinfo(np.int64).max: # too large for numpy, so use rejection sampling on random bytes
+			bits = (N - 1).bit_length()
+			size = (bits + 7) // 8
+			while True:
+				value = int.from_bytes(rng.bytes(size), 'little') >> (8 * size - bits)
+				if value < N:
+					return value
+		return int(rng.integers(N)) if isinstance(rng, np.random.Generator) else int(rng.randint(N))
+	return rng.randrange(N)
+
+
+
+def random_indices(N: int, n: int, rng: RNG = None) -> list[int]:
+	'''draws `n` independent uniformly random integers from [0, N) (vectorized for numpy rngs)'''
+	if isinstance(rng, (np.random.Generator, np.random.RandomState)) and N <= np.iinfo(np.int64).max:
+		return (rng.integers(N, size=n) if isinstance(rng, np.random.Generator) else rng.randint(N, size=n)).tolist()
+	return [random_index(N, rng) for _ in range(n)]
+
+
+
+def numpy_rng(rng: RNG = None) -> Union[np.random.Generator, np.random.RandomState]:
+	'''numpy rng for vectorized sampling (derived from the python rng if necessary to stay reproducible)'''
+	if isinstance(rng, (np.random.Generator, np.random.RandomState)):
+		return rng
+	if rng is None:
+		rng = random
+	return np.random.default_rng(rng.getrandbits(64))
+
+
+
+def spawn_key(*parts: Union[int, str]) -> tuple[int, ...]:
+	'''
+	converts a mix of ints and strings into a `SeedSequence` spawn key (strings are encoded as
+	length-prefixed bytes, not hashed)
+	'''
+	key = []
+	for part in parts:
+		if isinstance(part, str):
+			raw = part.encode()
+			key.append(len(raw))
+			key.extend(raw)
+		else:
+			key.append(int(part))
+	return tuple(key)
+
+
+
+def child_stream(seq: np.random.SeedSequence, *parts: Union[int, str]) -> np.random.SeedSequence:
+	'''
+	returns the child of `seq` identified by `parts` - equivalent to the corresponding `SeedSequence.spawn` child,
+	but without having to spawn (or keep track of) all the siblings
+	'''
+	return np.random.SeedSequence(seq.entropy, spawn_key=seq.spawn_key + spawn_key(*parts), pool_size=seq.pool_size)
+
+
+
+class RandomStreams(ToolKit):
+	'''
+	Provides reproducible, statistically independent random streams derived from a single seed using numpy's
+	`SeedSequence`, so no string hashing is needed to derive new seeds.
+
+	The `seed_sequence` gizmo is the root stream for the current context, from which the `np_rng`
+	(numpy `Generator`), `rng` (python `random.Random`), and `seed` (int) gizmos are derived.
+	'''
+	_np_rng_stream = 0
+	_rng_stream = 1
+	_seed_stream = 2
+	_decision_stream = 3
+
+	def __init__(self, seed: int = None, **kwargs):
+		if seed is None:
+			seed = random.randint(1, 2**32-1)
+		super().__init__(**kwargs)
+		self._seed = seed
+		self._root = np.random.SeedSequence(seed)
+
+
+	def stream(self, *key: Union[int, str]) -> np.random.SeedSequence:
+		'''independent stream identified by `key`'''
+		return child_stream(self._root, *key)
+
+
+	@tool('seed_sequence')
+	def get_seed_sequence(self) -> np.random.SeedSequence:
+		return self._root
+
+
+	@tool('np_rng')
+	def get_np_rng(self, seed_sequence: np.random.SeedSequence) -> np.random.Generator:
+		return np.random.default_rng(child_stream(seed_sequence, self._np_rng_stream))
+
+
+	@tool('rng')
+	def get_rng(self, seed_sequence: np.random.SeedSequence) -> random.Random:
+		state = child_stream(seed_sequence, self._rng_stream).generate_state(4)
+		return random.Random(int.from_bytes(state.tobytes(), 'little'))
+
+
+	@tool('seed')
+	def get_seed(self, seed_sequence: np.random.SeedSequence) -> int:
+		return int(child_stream(seed_sequence, self._seed_stream).generate_state(1)[0])
+
+
+	@classmethod
+	def decision_rng(cls, seed_sequence: np.random.SeedSequence, decision: str) -> np.random.Generator:
+		'''independent stream for a single decision (identified by its choice gizmo)'''
+		return np.random.default_rng(child_stream(seed_sequence, cls._decision_stream, decision))
+
+
+
+class AliasTable:
+	'''
+	Walker/Vose alias table for sampling from a fixed discrete distribution in O(1) per draw.
+
+	Building the table is O(N) and only has to be done once per set of weights.
+	'''
+	def __init__(self, weights: Iterable[float]):
+		weights = np.asarray(weights, dtype=float)
+		assert weights.ndim == 1 and len(weights) > 0, f'weights must be a non-empty vector: {weights.shape}'
+		assert np.all(weights >= 0) and np.isfinite(weights).all(), f'weights must be finite and non-negative'
+		total = weights.sum()
+		assert total > 0, f'at least one weight must be positive'
+
+		N = len(weights)
+		scaled = weights * (N / total)
+		prob = np.ones(N)
+		alias = np.arange(N)
+		small = np.flatnonzero(scaled < 1).tolist()
+		large = np.flatnonzero(scaled >= 1).tolist()
+		while len(small) and len(large):
+			less, more = small.pop(), large.pop()
+			prob[less] = scaled[less]
+			alias[less] = more
+			scaled[more] = scaled[more] + scaled[less] - 1
+			(small if scaled[more] < 1 else large).append(more)
+		# any leftovers are only due to numerical error, so they keep prob=1
+
+		self._weights = weights
+		self._prob = prob
+		self._alias = alias
+
+
+	def __len__(self):
+		return len(self._prob)
+
+
+	@property
+	def probabilities(self) -> np.ndarray:
+		'''normalized probability of each outcome'''
+		return self._weights / self._weights.sum()
+
+
+	def draw(self, rng: RNG = None) -> int:
+		'''single draw using a python or numpy rng'''
+		i = random_index(len(self._prob), rng)
+		u = rng.random() if rng is not None else random.random()
+		return i if u < self._prob[i] else int(self._alias[i])
+
+
+	def sample(self, n: int, rng: Union[np.random.Generator, np.random.RandomState] = None) -> np.ndarray:
+		'''vectorized draw of `n` outcomes (with replacement) using a numpy rng'''
+		if rng is None:
+			rng = np.random.default_rng()
+		if isinstance(rng, np.random.Generator):
+			i = rng.integers(len(self._prob), size=n)
+			u = rng.random(n)
+		else:
+			i = rng.randint(len(self._prob), size=n)
+			u = rng.random_sample(n)
+		return np.where(u < self._prob[i], i, self._alias[i])
+
+
+
+def weighted_order(weights: Iterable[float], n: int = None,
+				   rng: Union[np.random.Generator, np.random.RandomState] = None) -> np.ndarray:
+	'''
+	weighted sampling without replacement (Efraimidis-Spirakis), returns the first `n` indices
+	of a random order where items with larger weights tend to come first
+	'''
+	weights = np.asarray(weights, dtype=float)
+	support = int(np.count_nonzero(weights > 0))
+	if n is None:
+		n = support
+	assert 0 <= n <= support, f'cannot draw {n} samples without replacement from {support} nonzero weights'
+	if rng is None:
+		rng = np.random.default_rng()
+	u = rng.random(len(weights)) if isinstance(rng, np.random.Generator) else rng.random_sample(len(weights))
+	with np.errstate(divide='ignore'):
+		keys = np.log(u) / weights
+	keys[weights <= 0] = -np.inf
+	if n < len(keys):
+		top = np.argpartition(-keys, n - 1)[:n] if n > 0 else np.arange(0)
+		return top[np.argsort(-keys[top], kind='stable')]
+	return np.argsort(-keys, kind='stable')
+
+
@@ -1,4 +1,8 @@
 from .datasets import Dataset
 from .batches import Batch
-from .planners import Indexed, BudgetExceeded, Unindexed, InfiniteIndexed
-from .trainers import DynamicTrainerBase, TrainerBase
\ No newline at end of file
+from .planners import (Indexed, BudgetExceeded, Unindexed, InfiniteIndexed, Weighted, InfiniteWeighted,
+					   Stratified, InfiniteStratified, Sharded, InfiniteSharded)
+from .caching import tool, EpochCache
+from .trainers import DynamicTrainerBase, TrainerBase
+from .reducers import Reducer, Moments, Mean, Histogram, TopK, ConfusionMatrix
+from .evaluators import EvaluatorBase, DynamicEvaluatorBase
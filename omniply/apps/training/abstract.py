@@ -78,6 +78,34 @@ class AbstractEvaluator:
 
 
 
+class AbstractReducer:
+	'''online aggregation of gizmos over a stream of batches, with constant memory in the number of batches'''
+	@property
+	def gizmos(self) -> tuple[str, ...]:
+		'''gizmos which are fed into `update` (in order)'''
+		raise NotImplementedError
+
+
+	def fresh(self) -> 'AbstractReducer':
+		'''new reducer with the same configuration but no accumulated state'''
+		raise NotImplementedError
+
+
+	def update(self, *values: Any, index: Any = None) -> Self:
+		'''accumulate the values of a batch (optionally with the indices of the samples)'''
+		raise NotImplementedError
+
+
+	def merge(self, other: 'AbstractReducer') -> Self:
+		'''combine the accumulated state of another reducer (eg. from a different shard) into this one'''
+		raise NotImplementedError
+
+
+	def result(self) -> Any:
+		raise NotImplementedError
+
+
+
 class AbstractTrainer:
 	def gadgetry(self) -> Iterator[AbstractGadget]:
 		raise NotImplementedError
@@ -1,4 +1,5 @@
 from .imports import *
+from ...core.genetics import GeneticGadget, AbstractGenetic
 from .abstract import AbstractDataset, AbstractBatch, AbstractPlanner
 
 
@@ -8,20 +9,112 @@ class NoNewBatches(Exception):
 
 
 
-class Batch(Context, AbstractBatch):
-    def __init__(self, info: dict[str, Any], *, planner: AbstractPlanner, allow_draw: bool = True, **kwargs):
+class BatchInfo(GeneticGadget):
+    '''
+    placeholder for the info of a batch in a template's (shared) gadget topology,
+    which defers to the info of whichever batch is grabbing
+    '''
+    def __init__(self, gizmos: Iterable[str], **kwargs):
+        super().__init__(**kwargs)
+        self._gizmos = tuple(gizmos)
+        self._known = frozenset(self._gizmos)
+
+
+    def gizmos(self) -> Iterator[str]:
+        yield from self._gizmos
+
+
+    def gives(self, gizmo: str) -> bool:
+        return gizmo in self._known
+
+
+    def _genetic_information(self, gizmo: str):
+        return {**super()._genetic_information(gizmo), 'parents': ()}
+
+
+    def grab_from(self, ctx: 'AbstractGame', gizmo: str) -> Any:
+        info = ctx.info if isinstance(ctx, Batch) else None
+        if info is None or info is self or not info.gives(gizmo):
+            raise self._MissingGadgetError(gizmo)
+        return info.grab_from(ctx, gizmo)
+
+
+
+class Batch(SharedTopologyGaggle, Context, AbstractBatch):
+    _template = None
+    _parent = None # batch which this micro-batch was split from (see `split`)
+    _independence = None # (topology version, gizmo -> whether it is batch independent)
+
+    def __init__(self, info: dict[str, Any], *, planner: AbstractPlanner, allow_draw: bool = True,
+                 template: 'Batch' = None, **kwargs):
+        '''
+        :param template: if provided, this batch shares the gadget topology of the template (see `as_template`)
+        instead of building its own, so only the info and cache are specific to this batch
+        '''
         if isinstance(info, dict):
             info = DictGadget(info)
         super().__init__(**kwargs)
         self._info = info
         self._planner = planner
         self._allow_draw = allow_draw
-        self.include(info)
-        
+        self._template = template
+        if template is None:
+            self.include(info)
+        else:
+            template._sync_gauges()
+            self.share_topology(template)
+            if not all(template.info.gives(gizmo) for gizmo in info.gizmos()):
+                self._fill_info_slot(template.info, info)
+
+
+    @property
+    def info(self) -> AbstractGadget:
+        return self._info
+
+
+    def _fill_info_slot(self, placeholder: AbstractGadget, info: AbstractGadget) -> None:
+        '''
+        adds `info` with the precedence of the template's placeholder (lowest, like the info of a batch without a
+        template) for the gizmos the placeholder does not know about
+        '''
+        self._detach_topology()
+        self._topology_version += 1
+        position = next((i for i, gadget in enumerate(self._gadgets_list) if gadget is placeholder), 0)
+        self._gadgets_list.insert(position, info)
+        for gizmo in info.gizmos():
+            if not placeholder.gives(gizmo):
+                self._gadgets_table.setdefault(gizmo, []).insert(0, info)
+        self._adopt_gauged(info)
+
+
+    def _gauge_apply(self, gauge: Dict[str, str]) -> Self:
+        if self._shared_topology:
+            self._detach_topology()
+            for gadget in self._gadgets_list:
+                if isinstance(gadget, LazyGauged):
+                    gadget._follow_gauges(self)
+        return super()._gauge_apply(gauge)
+
+
+    _BatchInfo = BatchInfo
+    def as_template(self) -> 'Batch':
+        '''
+        Creates a template with the same gadget topology as this batch, except the info is replaced by a
+        placeholder. New batches can then be created cheaply from the template using `spawn`.
+        '''
+        template = self.__class__(self._BatchInfo(self._info.gizmos()), planner=self._planner,
+                                  allow_draw=self._allow_draw)
+        return template.extend(tuple(self.gadgetry())).share_vendor_stats(self)
+
+
+    def spawn(self, info: dict[str, Any]) -> 'Batch':
+        '''creates a new batch with the given info which shares the topology of this (template) batch'''
+        return self.__class__(info, planner=self._planner, allow_draw=self._allow_draw, template=self)
+
 
     def gadgetry(self) -> Iterator[AbstractGadget]:
         for gadget in self.vendors():
-            if gadget is not self._info:
+            if gadget is not self._info and not isinstance(gadget, BatchInfo):
                 yield gadget
 
 
@@ -37,17 +130,153 @@ class Batch(Context, AbstractBatch):
             allow_draw = self._allow_draw
         if size is None:
             size = self.size
+        if self._shared_topology and not len(kwargs):
+            return self._template.spawn(self._planner.draw(size))
         new = self.__class__(self._planner.draw(size), planner=self._planner, allow_draw=self._allow_draw, **kwargs)
         new.extend(tuple(self.gadgetry()))
+        if 'vendor_stats' not in kwargs:
+            new.share_vendor_stats(self)
         return new
 
 
+    def batch_dependent(self) -> set[str]:
+        '''gizmos which (transitively) depend on the batch info according to the recorded grabs'''
+        todo = list(self._info.gizmos())
+        dependent = set(todo)
+        while len(todo):
+            for user in self._products.get(todo.pop(), ()):
+                if user not in dependent:
+                    dependent.add(user)
+                    todo.append(user)
+        return dependent
+
+
+    def is_batch_independent(self, gizmo: str) -> bool:
+        '''
+        whether the gizmo does not depend on the batch info according to the genes of the gadgets (gizmos produced by
+        gadgets without genes are assumed to be dependent)
+        '''
+        if self._independence is None or self._independence[0] != self._topology_version:
+            self._independence = self._topology_version, {}
+        known = self._independence[1]
+        if gizmo not in known:
+            known[gizmo] = False # also breaks loops
+            known[gizmo] = self._check_batch_independent(gizmo)
+        return known[gizmo]
+
+
+    def _check_batch_independent(self, gizmo: str) -> bool:
+        if self._info.gives(gizmo):
+            return False
+        try:
+            vendor = next(iter(self._gadgets(gizmo)), None)
+        except self._GadgetFailure:
+            return False
+        if not isinstance(vendor, AbstractGenetic):
+            return False
+        for gene in vendor.genes(gizmo):
+            return gene.parents is not None and all(self.is_batch_independent(parent) for parent in gene.parents)
+        return False
+
+
+    def _cache_miss(self, ctx: Optional[AbstractGame], gizmo: str) -> Any:
+        # micro-batches share batch-independent gizmos through the cache of the batch they were split from
+        if self._parent is not None and self._parent.is_batch_independent(gizmo):
+            return self._parent.grab(gizmo)
+        return super()._cache_miss(ctx, gizmo)
+
+
+    @staticmethod
+    def _is_row_aligned(value: Any, size: int) -> bool:
+        if isinstance(value, (str, bytes, dict)):
+            return False
+        try:
+            return len(value) == size
+        except TypeError:
+            return False
+
+
+    def split(self, parts: int, *, rows: Iterable[str] = ()) -> list['Batch']:
+        '''
+        Splits this batch into (up to) `parts` micro-batches which share the gadget topology of this batch.
+
+        Info with one row per sample is sliced for each micro-batch. Cached gizmos that depend on the batch info
+        and have one row per sample (as well as any gizmos in `rows`)
+        are sliced into (zero-copy for arrays) views, other cached gizmos that depend on the batch info are
+        dropped (to be recomputed per micro-batch), and all remaining cached gizmos are shared. Batch-independent
+        gizmos which are not cached yet are computed (once) in this batch when a micro-batch needs them.
+        '''
+        size = self.size
+        parts = max(1, min(parts, size))
+        bounds = [size * i // parts for i in range(parts + 1)]
+
+        info = {gizmo: self.grab(gizmo) for gizmo in self._info.gizmos()}
+        dependent = self.batch_dependent()
+        rows = set(rows)
+        sliced, shared = [], {}
+        for gizmo, value in self.data.items():
+            if gizmo in info:
+                continue
+            if gizmo in rows or (gizmo in dependent and self._is_row_aligned(value, size)):
+                sliced.append(gizmo)
+            elif gizmo not in dependent:
+                shared[gizmo] = value
+
+        template = self._template if self._shared_topology else self.as_template()
+        micros = []
+        for start, stop in zip(bounds[:-1], bounds[1:]):
+            # per-sample info (eg. `index` and `sample_epochs`) is sliced along with the samples
+            micro_info = {gizmo: value[start:stop] if self._is_row_aligned(value, size) else value
+                          for gizmo, value in info.items()}
+            micro_info['size'] = stop - start
+            micro = template.spawn(micro_info)
+            micro._parent = self
+            micro.data.update(shared)
+            micro.data.update({gizmo: self.data[gizmo][start:stop] for gizmo in sliced})
+            micros.append(micro)
+        return micros
+
+
+    @staticmethod
+    def _concatenate(values: list[Any]) -> Any:
+        first = values[0]
+        if isinstance(first, list):
+            return [item for value in values for item in value]
+        if isinstance(first, tuple):
+            return tuple(item for value in values for item in value)
+        if type(first).__module__.startswith('torch'):
+            import torch
+            return torch.cat(values)
+        import numpy as np
+        return np.concatenate(values)
+
+
+    def merge(self, micros: Iterable['Batch']) -> Self:
+        '''
+        Merges the results of micro-batches (see `split`) back into this batch: gizmos with one row per sample are
+        concatenated, numbers are averaged (weighted by micro-batch size), and shared objects are kept.
+        '''
+        import numpy as np
+        micros = list(micros)
+        sizes = [micro.size for micro in micros]
+        info = set(self._info.gizmos())
+        for gizmo in micros[0].data:
+            if gizmo in info or self.is_cached(gizmo) or not all(gizmo in micro.data for micro in micros):
+                continue
+            values = [micro.data[gizmo] for micro in micros]
+            if all(value is values[0] for value in values):
+                self.data[gizmo] = values[0]
+            elif all(self._is_row_aligned(value, n) for value, n in zip(values, sizes)):
+                self.data[gizmo] = self._concatenate(values)
+            elif all(isinstance(value, (int, float, np.number)) or getattr(value, 'ndim', None) == 0
+                     for value in values):
+                self.data[gizmo] = sum(value * n for value, n in zip(values, sizes)) / sum(sizes)
+        return self
+
+
     def new(self, size: int = None) -> 'Batch':
         if self._allow_draw:
             return self._new(size)
         raise NoNewBatches(f'creating new batches using the current batch is currently not allowed')
 
 
-
-
-
@@ -0,0 +1,170 @@
+from .imports import *
+from ..gaps import GappedAutoTool, tool as _tool
+from .abstract import AbstractDataset
+from .batches import Batch, BatchInfo
+
+
+
+class EpochCache:
+	'''
+	Index-keyed storage for per-sample values of a dataset which don't change between epochs.
+
+	The values are kept in a single preallocated array (or a memmap, if a path is provided) with one row per
+	sample, together with a bitmap of which rows have been filled, so a batch can be served with a single
+	vectorized lookup.
+	'''
+	def __init__(self, owner: AbstractDataset, *, path: str = None):
+		self._owner = owner
+		self._path = path
+		self._data = None
+		self._filled = None
+
+
+	@property
+	def size(self) -> int:
+		return self._owner.size
+
+
+	@property
+	def filled(self):
+		'''bitmap of which indices are cached'''
+		if self._filled is None:
+			import numpy as np
+			self._filled = np.zeros(self.size, dtype=bool)
+		return self._filled
+
+
+	def __len__(self):
+		'''number of cached samples'''
+		return int(self.filled.sum()) if self._filled is not None else 0
+
+
+	def clear(self) -> Self:
+		self._data = None
+		self._filled = None
+		return self
+
+
+	def missing(self, index):
+		'''unique indices in `index` that are not cached yet'''
+		import numpy as np
+		index = np.asarray(index)
+		return np.unique(index[~self.filled[index]])
+
+
+	def _allocate(self, values):
+		import numpy as np
+		shape = (self.size, *values.shape[1:])
+		if self._path is None:
+			return np.empty(shape, dtype=values.dtype)
+		assert values.dtype != object, f'cannot store objects in a memmap'
+		return np.lib.format.open_memmap(self._path, mode='w+', dtype=values.dtype, shape=shape)
+
+
+	def store(self, index, values) -> Self:
+		import numpy as np
+		index = np.asarray(index)
+		values = np.asarray(values)
+		assert len(values) == len(index), f'expected one value per index, got {len(values)} for {len(index)} indices'
+		if self._data is None:
+			self._data = self._allocate(values)
+		self._data[index] = values
+		self.filled[index] = True
+		return self
+
+
+	def lookup(self, index):
+		'''cached values for the given indices (which must all be filled)'''
+		import numpy as np
+		return self._data[np.asarray(index)]
+
+
+
+class EpochCachedTool(GappedAutoTool):
+	'''tool whose per-sample outputs are cached in an `EpochCache` of the dataset that owns it'''
+	class _ToolSkill(GappedAutoTool._ToolSkill):
+		_index_gizmo = 'index'
+		_epoch_cache: EpochCache = None
+
+		@property
+		def epoch_cache(self) -> EpochCache:
+			return self._epoch_cache
+
+
+		def _sub_context(self, ctx: AbstractGame, index, missing) -> AbstractGame:
+			'''context identical to `ctx` except that it only contains the samples in `missing`'''
+			if not isinstance(ctx, Batch):
+				sub = Context(*ctx.vendors())
+				return sub.include(DictGadget({self.gap(self._index_gizmo): missing, 'size': len(missing)}))
+			import numpy as np
+			unique, first = np.unique(np.asarray(index), return_index=True)
+			rows = first[np.searchsorted(unique, missing)] # where each missing sample is in the batch
+			size = len(index)
+			info = {gizmo: ctx.grab(gizmo) for gizmo in ctx.info.gizmos()}
+			info = {gizmo: np.asarray(value)[rows] if Batch._is_row_aligned(value, size) else value
+					for gizmo, value in info.items()}
+			info.update({self.gap(self._index_gizmo): missing, 'size': len(missing)})
+			# the info takes the slot of the batch info (or its placeholder), so the precedence is unchanged
+			sub_info = DictGadget(info)
+			vendors = []
+			for vendor in ctx.vendors():
+				if vendor is ctx.info or isinstance(vendor, BatchInfo):
+					vendor = sub_info
+				if vendor is not sub_info or sub_info not in vendors:
+					vendors.append(vendor)
+			return Context(*vendors)
+
+
+		def grab_from(self, ctx: AbstractGame, gizmo: str) -> Any:
+			cache = self._epoch_cache
+			index = ctx.grab(self.gap(self._index_gizmo))
+			if not cache.filled[index].any():
+				out = super().grab_from(ctx, gizmo)
+				cache.store(index, out)
+				return out
+			missing = cache.missing(index)
+			if len(missing):
+				if not isinstance(ctx, AbstractGaggle):
+					out = super().grab_from(ctx, gizmo)
+					cache.store(index, out)
+					return out
+				self._sub_context(ctx, index, missing).grab(gizmo) # fills in the missing samples
+			return cache.lookup(index)
+
+
+	_EpochCache = EpochCache
+	def __init__(self, *args, cache_path: str = None, **kwargs):
+		super().__init__(*args, **kwargs)
+		self._cache_path = cache_path
+
+
+	def as_skill(self, owner: AbstractDataset):
+		skill = super().as_skill(owner)
+		skill._epoch_cache = self._EpochCache(owner, path=self._cache_path)
+		return skill
+
+
+
+class tool(_tool):
+	'''
+	Same as the standard `tool`, except that tools of a dataset can opt into caching their per-sample outputs
+	across epochs with `cache='epoch'` (optionally backed by a memmap at `cache_path`).
+
+	Cached tools must produce a single gizmo with one row per sample in the batch's `index`.
+	'''
+	_EpochCachedTool = EpochCachedTool
+
+	def __init__(self, *gizmos: str, cache: str = None, cache_path: str = None, **kwargs):
+		assert cache in (None, 'epoch'), f'unknown cache policy: {cache!r}'
+		super().__init__(*gizmos, **kwargs)
+		self._cache = cache
+		self._cache_path = cache_path
+
+
+	def _actualize_tool(self, fn: Callable, **kwargs):
+		if self._cache is None:
+			return super()._actualize_tool(fn, **kwargs)
+		assert self._gizmos is None, f'epoch caching is only supported for tools with a single output'
+		return self._EpochCachedTool(gizmo=self._gizmo, fn=fn, cache_path=self._cache_path, **kwargs)
+
+
@@ -2,6 +2,7 @@ from .imports import *
 from .abstract import AbstractDataset
 from .batches import Batch
 from .planners import Indexed
+from .caching import EpochCachedTool
 
 
 
@@ -18,3 +19,11 @@ class Dataset(ToolKit, AbstractDataset):
             batch = self._Batch(info, planner=planner, allow_draw=False)
             yield batch.include(self)
 
+
+    def clear_epoch_caches(self) -> Self:
+        '''clears the cached outputs of all tools using `cache='epoch'`'''
+        for gadget in self._gadgets():
+            if isinstance(gadget, EpochCachedTool._ToolSkill):
+                gadget.epoch_cache.clear()
+        return self
+
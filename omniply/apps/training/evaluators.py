@@ -0,0 +1,161 @@
+from .imports import *
+
+from .abstract import AbstractEvaluator, AbstractDataset, AbstractReducer
+from .planners import Sharded
+from .batches import Batch
+from .datasets import Dataset
+
+
+
+class EvaluatorBase(AbstractEvaluator):
+	'''
+	Streams the samples of a dataset through batches exactly once and feeds the requested gizmos of every batch
+	into online reducers, so the memory does not grow with the size of the dataset.
+
+	The dataset can be split into shards which are evaluated independently (eg. with a process pool) and whose
+	reducer states are merged exactly afterwards.
+	'''
+	def __init__(self, reducers: Mapping[str, AbstractReducer] = None, *, batch_size: int = None, **kwargs):
+		'''
+		:param reducers: prototypes of the reducers by name, which are copied (without state) for every evaluation
+		'''
+		super().__init__(**kwargs)
+		self._reducers = dict(reducers or {})
+		self._batch_size = batch_size
+		self._states = None
+
+
+	def gadgetry(self) -> Iterator[AbstractGadget]:
+		'''gadgets to include in the batch'''
+		yield from ()
+
+
+	def add_reducer(self, name: str, reducer: AbstractReducer) -> Self:
+		self._reducers[name] = reducer
+		return self
+
+
+	def reducers(self) -> Dict[str, AbstractReducer]:
+		'''new reducers without any accumulated state'''
+		return {name: reducer.fresh() for name, reducer in self._reducers.items()}
+
+
+	@property
+	def states(self) -> Optional[Dict[str, AbstractReducer]]:
+		'''reducers of the current (or most recent) evaluation'''
+		return self._states
+
+
+	_Planner = Sharded
+	_Batch = None
+	def evaluate_loop(self, src: Dataset, *, shard: int = 0, num_shards: int = 1,
+					  states: Dict[str, AbstractReducer] = None, **settings: Any) -> Iterator[Batch]:
+		'''
+		score every sample of the dataset (or of a single shard) exactly once
+
+		:param states: reducers to update (defaults to new reducers, see `states`)
+		'''
+		planner = self._Planner(shuffle=False, multi_epoch=False, max_epochs=1, hard_budget=True, drop_last=False,
+								shard=shard, num_shards=num_shards).setup(src, **settings)
+		batch_size = 32 if self._batch_size is None else self._batch_size
+		if states is None:
+			states = self._states = self.reducers()
+
+		batch_cls = self._Batch or getattr(src, '_Batch', None) or Batch
+		template = None
+		for info in planner.generate(batch_size):
+			if template is None:
+				template = batch_cls(info, planner=planner, allow_draw=False).extend((*self.gadgetry(), src))
+				template = template.as_template()
+			yield self.score(template.spawn(info), states)
+
+
+	def score(self, batch: Batch, states: Dict[str, AbstractReducer] = None) -> Batch:
+		'''feed the batch into all reducers'''
+		if states is None:
+			states = self._states
+		index = batch.grab('index', None)
+		for reducer in states.values():
+			reducer.update(*[batch.grab(gizmo) for gizmo in reducer.gizmos], index=index)
+		return batch
+
+
+	def evaluate_shard(self, src: Dataset, shard: int = 0, num_shards: int = 1,
+					   **settings: Any) -> Dict[str, AbstractReducer]:
+		'''evaluate a single shard and return the reducers (eg. to be merged with those of the other shards)'''
+		states = self.reducers()
+		for _ in self.evaluate_loop(src, shard=shard, num_shards=num_shards, states=states, **settings): pass
+		return states
+
+
+	@staticmethod
+	def merge_states(shards: Iterable[Dict[str, AbstractReducer]]) -> Dict[str, AbstractReducer]:
+		'''merge the reducers of several shards (in order)'''
+		merged = None
+		for states in shards:
+			if merged is None:
+				merged = dict(states)
+			else:
+				for name, reducer in states.items():
+					merged[name].merge(reducer)
+		return merged
+
+
+	def evaluate(self, src: Dataset, *, num_shards: int = None, executor: Any = None,
+				 **settings: Any) -> Dict[str, Any]:
+		'''
+		:param num_shards: if provided, the dataset is split into this many shards which are evaluated separately
+		:param executor: used to evaluate the shards in parallel (eg. a `concurrent.futures.ProcessPoolExecutor`,
+		in which case the evaluator and dataset must be picklable), otherwise the shards are evaluated sequentially
+		:return: the results of all reducers by name
+		'''
+		if num_shards is None:
+			states = self.evaluate_shard(src, **settings)
+		else:
+			jobs = [(src, shard, num_shards) for shard in range(num_shards)]
+			if executor is None:
+				shards = [self.evaluate_shard(*job, **settings) for job in jobs]
+			else:
+				shards = executor.map(self._evaluate_job, [(self, job, settings) for job in jobs])
+			states = self.merge_states(shards)
+		self._states = states
+		return {name: reducer.result() for name, reducer in states.items()}
+
+
+	@staticmethod
+	def _evaluate_job(job):
+		evaluator, args, settings = job
+		return evaluator.evaluate_shard(*args, **settings)
+
+
+
+class DynamicEvaluatorBase(EvaluatorBase):
+	def __init__(self, reducers: Mapping[str, AbstractReducer] = None, **kwargs):
+		super().__init__(reducers, **kwargs)
+		self._gadgetry = []
+
+
+	def include(self, *gadgets: AbstractGadget) -> Self:
+		'''include gadgets in the batch'''
+		self._gadgetry.extend(gadgets)
+		return self
+
+
+	def extend(self, gadgets: Iterable[AbstractGadget]) -> Self:
+		'''extend the batch with gadgets'''
+		self._gadgetry.extend(gadgets)
+		return self
+
+
+	def exclude(self, *gadgets: AbstractGadget) -> Self:
+		'''exclude gadgets from the batch'''
+		for gadget in gadgets:
+			self._gadgetry.remove(gadget)
+		return self
+
+
+	def gadgetry(self) -> Iterator[AbstractGadget]:
+		'''gadgets to include in the batch'''
+		yield from self._gadgetry
+
+
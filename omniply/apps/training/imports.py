@@ -1,11 +1,12 @@
-from typing import Any, Iterable, Iterator, Type, Optional, Union, Self, Dict, List
-from ...core.gaggles import AbstractGaggle, AbstractGame, AbstractGadget, LoopyGaggle, MutableGaggle
+from typing import Any, Iterable, Iterator, Type, Optional, Union, Self, Dict, List, Mapping, Callable
+from ...core.gaggles import AbstractGaggle, AbstractGame, AbstractGadget, LoopyGaggle, MutableGaggle, SharedTopologyGaggle
 # from ...core import Scope
-from ..gaps import Context, ToolKit, tool
+from ..gaps import Context, ToolKit, tool, LazyGauged
 from ..simple import DictGadget
 
 import random
 import hashlib
 import heapq
 import math
+import copy
 from collections import Counter
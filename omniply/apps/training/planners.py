@@ -72,6 +72,19 @@ class InfiniteIndexed(InfiniteUnindexed):
 		return random.Random(seed).randint(1, 2**32-1)
 
 
+	@property
+	def epoch_size(self) -> Optional[int]:
+		'''number of samples drawn in each epoch'''
+		return self._dataset_size
+
+
+	def _epoch_order(self, seed: int):
+		'''order of the indices drawn in the next epoch'''
+		import numpy as np
+		return np.random.RandomState(seed).permutation(self._dataset_size) if self._shuffle \
+			else np.arange(self._dataset_size)
+
+
 	def reset(self):
 		self._order = None
 		self._offset = 0
@@ -81,47 +94,265 @@ class InfiniteIndexed(InfiniteUnindexed):
 
 
 	def _draw_indices(self, n: int):
+		'''indices of the next `n` samples and the epoch each of them was drawn in'''
 		import numpy as np
 
 		if self._dataset_size is None:
-			return None
+			return None, None
 
 		if self._order is None:
 			if self._drawn_samples > 0:
 				self._seed = self._increment_seed(self._seed)
-			self._order = np.random.RandomState(self._seed).permutation(self._dataset_size) if self._shuffle else np.arange(self._dataset_size)
+			self._order = self._epoch_order(self._seed)
 			self._offset = 0
 			self._drawn_epochs += 1
+			assert len(self._order), 'cannot draw from an empty epoch'
 
-		assert self._multi_epoch or n < len(self._order), f'batch size is too large: max is {len(self._order)}'
+		assert self._multi_epoch or n <= len(self._order), f'batch size is too large: max is {len(self._order)}'
 
 		if self._offset + n > len(self._order): # need to wrap around
 			indices = self._order[self._offset:]
+			epochs = np.full(len(indices), self._drawn_epochs)
 			self._order = None
 			if self._multi_epoch:
-				indices = np.concatenate((indices, self._draw_indices(n - len(indices))))
+				rest, rest_epochs = self._draw_indices(n - len(indices))
+				indices = np.concatenate((indices, rest))
+				epochs = np.concatenate((epochs, rest_epochs))
 		else:
 			indices = self._order[self._offset:self._offset + n]
+			epochs = np.full(len(indices), self._drawn_epochs)
 			self._offset += n
 		
 		if self._sort_indices:
-			indices.sort()
-		return indices
+			order = np.argsort(indices, kind='stable')
+			indices, epochs = indices[order], epochs[order]
+		return indices, epochs
 
 	
 	def draw(self, n: int) -> Dict[str, Any]:
 		assert n > 0, 'cannot draw zero samples' # otherwise some batches can have degenerate seeds
 		seed = self._seed
 		offset = self._offset
-		idx = self._draw_indices(n)
+		idx, sample_epochs = self._draw_indices(n)
 		info = super().draw(n)
 		if idx is not None:
-			info.update({'index': idx, 'epochs': self._drawn_epochs, 
+			info.update({'index': idx, 'epochs': self._drawn_epochs, 'sample_epochs': sample_epochs,
 				'initial_seed': self._initial_seed, 'epoch_seed': seed, 'epoch_offset': offset})
 		return info
 	
 
 
+class InfiniteWeighted(InfiniteIndexed):
+	'''
+	Draws indices proportional to per-sample weights, either with replacement (using an alias table, so each draw
+	is O(1)) or without replacement (each epoch is a weighted random order of the samples).
+	'''
+	def __init__(self, weights: Iterable[float] = None, *, replacement: bool = True, epoch_size: int = None,
+				 **kwargs):
+		'''
+		:param weights: relative (unnormalized) weight of each sample in the dataset
+		:param replacement: if True, samples can be drawn multiple times in an epoch
+		:param epoch_size: number of samples per epoch (defaults to the dataset size, or the number of samples with
+		nonzero weight if `replacement` is False)
+		'''
+		super().__init__(**kwargs)
+		assert epoch_size is None or epoch_size > 0, 'epoch_size must be positive'
+		self._replacement = replacement
+		self._epoch_samples = epoch_size
+		self._weights = None
+		self._alias_table = None
+		if weights is not None:
+			self.set_weights(weights)
+
+
+	def set_weights(self, weights: Iterable[float]) -> Self:
+		import numpy as np
+		weights = np.asarray(weights, dtype=float)
+		assert self._dataset_size is None or len(weights) == self._dataset_size, \
+			f'expected {self._dataset_size} weights, got {len(weights)}'
+		self._weights = weights
+		self._alias_table = None
+		if self._dataset_size is None:
+			self._dataset_size = len(weights)
+		return self
+
+
+	def setup(self, src: AbstractDataset, *, weights: Iterable[float] = None, **kwargs) -> Self:
+		out = super().setup(src, **kwargs)
+		if weights is not None or self._weights is not None:
+			self.set_weights(self._weights if weights is None else weights)
+		return out
+
+
+	@property
+	def epoch_size(self) -> Optional[int]:
+		if self._epoch_samples is not None:
+			return self._epoch_samples
+		if not self._replacement and self._weights is not None:
+			return int((self._weights > 0).sum())
+		return super().epoch_size
+
+
+	def _epoch_order(self, seed: int):
+		import numpy as np
+		from ..sampling import AliasTable, weighted_order
+		assert self._weights is not None, 'weights must be provided before drawing samples'
+		rng = np.random.RandomState(seed)
+		if self._replacement:
+			if self._alias_table is None:
+				self._alias_table = AliasTable(self._weights)
+			return self._alias_table.sample(self.epoch_size, rng)
+		return weighted_order(self._weights, self.epoch_size, rng)
+
+
+
+class InfiniteStratified(InfiniteIndexed):
+	'''
+	Draws indices such that each stratum (eg. class) makes up a fixed fraction (quota) of every epoch. The strata
+	are interleaved so that any contiguous batch also approximately respects the quotas. Strata that are too small
+	for their quota are oversampled, while larger ones are subsampled.
+	'''
+	def __init__(self, strata: Iterable[Any] = None, *, quotas: Mapping[Any, float] = None, epoch_size: int = None,
+				 **kwargs):
+		'''
+		:param strata: stratum label of each sample in the dataset
+		:param quotas: relative (unnormalized) fraction of each epoch for each stratum (defaults to balanced strata)
+		:param epoch_size: number of samples per epoch (defaults to the dataset size)
+		'''
+		super().__init__(**kwargs)
+		assert epoch_size is None or epoch_size > 0, 'epoch_size must be positive'
+		self._epoch_samples = epoch_size
+		self._quotas = quotas
+		self._strata = None
+		self._strata_members = None
+		if strata is not None:
+			self.set_strata(strata)
+
+
+	def set_strata(self, strata: Iterable[Any], quotas: Mapping[Any, float] = None) -> Self:
+		import numpy as np
+		strata = np.asarray(strata)
+		assert self._dataset_size is None or len(strata) == self._dataset_size, \
+			f'expected {self._dataset_size} strata labels, got {len(strata)}'
+		if quotas is not None:
+			self._quotas = quotas
+		self._strata = strata
+		self._strata_members = None
+		if self._dataset_size is None:
+			self._dataset_size = len(strata)
+		return self
+
+
+	def setup(self, src: AbstractDataset, *, strata: Iterable[Any] = None, quotas: Mapping[Any, float] = None,
+			  **kwargs) -> Self:
+		out = super().setup(src, **kwargs)
+		if strata is not None or self._strata is not None:
+			self.set_strata(self._strata if strata is None else strata, quotas=quotas)
+		return out
+
+
+	@property
+	def epoch_size(self) -> Optional[int]:
+		if self._epoch_samples is not None:
+			return self._epoch_samples
+		return super().epoch_size
+
+
+	def stratum_counts(self) -> Dict[Any, int]:
+		'''number of samples drawn from each stratum per epoch (quotas apportioned by largest remainder)'''
+		import numpy as np
+		members = self._find_members()
+		labels = list(members.keys())
+		quotas = np.asarray([1. if self._quotas is None else self._quotas.get(label, 0.) for label in labels])
+		assert quotas.sum() > 0, f'at least one quota must be positive'
+		ideal = quotas * (self.epoch_size / quotas.sum())
+		counts = np.floor(ideal).astype(int)
+		remainder = self.epoch_size - counts.sum()
+		if remainder > 0:
+			counts[np.argsort(counts - ideal, kind='stable')[:remainder]] += 1
+		return dict(zip(labels, counts.tolist()))
+
+
+	def _find_members(self) -> Dict[Any, Any]:
+		import numpy as np
+		if self._strata_members is None:
+			assert self._strata is not None, 'strata must be provided before drawing samples'
+			labels, inverse = np.unique(self._strata, return_inverse=True)
+			if self._quotas is not None:
+				unknown = [label for label in self._quotas if label not in set(labels.tolist())]
+				assert not len(unknown), f'quotas for unknown strata: {unknown}'
+			order = np.argsort(inverse, kind='stable')
+			splits = np.cumsum(np.bincount(inverse, minlength=len(labels)))[:-1]
+			self._strata_members = dict(zip(labels.tolist(), np.split(order, splits)))
+		return self._strata_members
+
+
+	def _epoch_order(self, seed: int):
+		import numpy as np
+		rng = np.random.RandomState(seed)
+		members = self._find_members()
+		picks, keys = [], []
+		for label, count in self.stratum_counts().items():
+			if count == 0:
+				continue
+			group = members[label]
+			reps = -(-count // len(group))
+			picks.append(np.concatenate([rng.permutation(group) for _ in range(reps)])[:count])
+			# spread each stratum evenly over the epoch (jittered so the strata interleave randomly)
+			keys.append((np.arange(count) + rng.random_sample(count)) / count)
+		picks, keys = np.concatenate(picks), np.concatenate(keys)
+		return picks[np.argsort(keys, kind='stable')]
+
+
+
+class InfiniteSharded(InfiniteIndexed):
+	'''
+	Only draws the indices of one contiguous shard of the dataset, so that disjoint shards can be processed
+	independently (eg. in different processes) and together cover every sample exactly once per epoch.
+	'''
+	def __init__(self, dataset_size: int = None, *, shard: int = 0, num_shards: int = 1, **kwargs):
+		super().__init__(dataset_size=dataset_size, **kwargs)
+		self._shard = None
+		self._num_shards = None
+		self.set_shard(shard, num_shards)
+
+
+	def set_shard(self, shard: int, num_shards: int) -> Self:
+		assert num_shards > 0 and 0 <= shard < num_shards, f'invalid shard {shard} of {num_shards}'
+		self._shard = shard
+		self._num_shards = num_shards
+		return self
+
+
+	def setup(self, src: AbstractDataset, *, shard: int = None, num_shards: int = None, **kwargs) -> Self:
+		if shard is not None or num_shards is not None:
+			self.set_shard(self._shard if shard is None else shard,
+						   self._num_shards if num_shards is None else num_shards)
+		return super().setup(src, **kwargs)
+
+
+	def shard_bounds(self) -> tuple[int, int]:
+		'''first and last (exclusive) index of the current shard'''
+		N = self._dataset_size
+		return N * self._shard // self._num_shards, N * (self._shard + 1) // self._num_shards
+
+
+	@property
+	def epoch_size(self) -> Optional[int]:
+		if self._dataset_size is None:
+			return None
+		start, stop = self.shard_bounds()
+		return stop - start
+
+
+	def _epoch_order(self, seed: int):
+		import numpy as np
+		start, stop = self.shard_bounds()
+		return start + (np.random.RandomState(seed).permutation(stop - start) if self._shuffle
+						else np.arange(stop - start))
+
+
+
 class BudgetExceeded(Exception):
 	pass
 
@@ -227,17 +458,22 @@ class Indexed(Unindexed, InfiniteIndexed):
 
 
 	def draw(self, n: int):
-		if self._max_epochs is not None and self._drawn_epochs >= self._max_epochs:
-			assert self._dataset_size is not None, 'dataset size must be provided to draw the last batch'
-			if self._drawn_epochs > self._max_epochs or self._offset == self._dataset_size:
+		# the epoch (and offset) this draw starts in, since a new epoch only begins when its first sample is drawn
+		epoch, offset = self._drawn_epochs, self._offset
+		if self._order is None or offset >= len(self._order):
+			epoch, offset = epoch + 1, 0
+		if self._max_epochs is not None and epoch >= self._max_epochs:
+			epoch_size = self.epoch_size
+			assert epoch_size is not None, 'dataset size must be provided to draw the last batch'
+			if epoch > self._max_epochs or offset == epoch_size:
 				raise self._BudgetExceeded(f'max epochs exceeded: {self._max_epochs}')
-			elif self._offset + n > self._dataset_size:
+			elif offset + n > epoch_size:
 				if self._hard_budget and self._drop_last:
 					raise self._BudgetExceeded(f'max epochs exceeded: {self._max_samples}')
 				elif not self._hard_budget:
 					pass # allow the draw to happen and raise in the next draw
 				elif not self._drop_last:
-					n = self._dataset_size - self._offset
+					n = epoch_size - offset
 		idx = super().draw(n)
 		return idx
 	
@@ -245,8 +481,25 @@ class Indexed(Unindexed, InfiniteIndexed):
 	def expected_iterations(self, step_size: int) -> Optional[int]:
 		num = super().expected_iterations(step_size)
 		if num is None and self._max_epochs is not None:
-			remaining = self._max_epochs * self._dataset_size - self._drawn_samples
+			remaining = self._max_epochs * self.epoch_size - self._drawn_samples
 			return (remaining // step_size) + (1 if (remaining % step_size > 0 and not (self._hard_budget and self._drop_last)) else 0)
 		return num
 		
 
+
+
+
+class Weighted(Indexed, InfiniteWeighted):
+	pass
+
+
+
+class Stratified(Indexed, InfiniteStratified):
+	pass
+
+
+
+class Sharded(Indexed, InfiniteSharded):
+	pass
+
+
@@ -0,0 +1,208 @@
+from .imports import *
+from .abstract import AbstractReducer
+
+
+
+class Reducer(AbstractReducer):
+	def __init__(self, *gizmos: str, **kwargs):
+		super().__init__(**kwargs)
+		self._gizmos = gizmos
+		self.reset()
+
+
+	@property
+	def gizmos(self) -> tuple[str, ...]:
+		return self._gizmos
+
+
+	def reset(self) -> Self:
+		'''clear the accumulated state'''
+		raise NotImplementedError
+
+
+	def fresh(self) -> 'Reducer':
+		new = copy.copy(self)
+		return new.reset()
+
+
+	def __repr__(self):
+		return f'{self.__class__.__name__}({", ".join(self._gizmos)})'
+
+
+
+class Moments(Reducer):
+	'''
+	Running mean and variance of a gizmo (one value or vector per sample) using Welford's algorithm, where batches
+	(and shards) are combined exactly with the pairwise update of Chan et al.
+	'''
+	def __init__(self, gizmo: str, *, ddof: int = 0, **kwargs):
+		super().__init__(gizmo, **kwargs)
+		self._ddof = ddof
+
+
+	def reset(self) -> Self:
+		self.count = 0
+		self.mean = 0.
+		self.m2 = 0.
+		return self
+
+
+	def _combine(self, count: int, mean, m2) -> Self:
+		if count == 0:
+			return self
+		total = self.count + count
+		delta = mean - self.mean
+		self.mean = self.mean + delta * (count / total)
+		self.m2 = self.m2 + m2 + delta ** 2 * (self.count * count / total)
+		self.count = total
+		return self
+
+
+	def update(self, values: Any, *, index: Any = None) -> Self:
+		import numpy as np
+		values = np.asarray(values, dtype=float)
+		if values.ndim == 0:
+			values = values[None]
+		if len(values) == 0:
+			return self
+		mean = values.mean(0)
+		return self._combine(len(values), mean, ((values - mean) ** 2).sum(0))
+
+
+	def merge(self, other: 'Moments') -> Self:
+		return self._combine(other.count, other.mean, other.m2)
+
+
+	@property
+	def var(self):
+		return self.m2 / (self.count - self._ddof) if self.count > self._ddof else float('nan')
+
+
+	def result(self) -> Dict[str, Any]:
+		var = self.var
+		return {'count': self.count, 'mean': self.mean, 'var': var, 'std': var ** 0.5}
+
+
+
+class Mean(Moments):
+	def result(self) -> Any:
+		return self.mean
+
+
+
+class Histogram(Reducer):
+	'''counts of a gizmo in fixed bins (values outside the bins are counted separately)'''
+	def __init__(self, gizmo: str, bins: Union[int, Iterable[float]] = 10, *, range: tuple[float, float] = None,
+				 **kwargs):
+		import numpy as np
+		if isinstance(bins, int):
+			assert range is not None, f'the range is required when only the number of bins is given'
+			bins = np.linspace(*range, bins + 1)
+		self._edges = np.asarray(bins, dtype=float)
+		super().__init__(gizmo, **kwargs)
+
+
+	def reset(self) -> Self:
+		import numpy as np
+		self.counts = np.zeros(len(self._edges) - 1, dtype=np.int64)
+		self.underflow = 0
+		self.overflow = 0
+		return self
+
+
+	def update(self, values: Any, *, index: Any = None) -> Self:
+		import numpy as np
+		values = np.asarray(values, dtype=float).ravel()
+		self.counts += np.histogram(values, self._edges)[0]
+		self.underflow += int((values < self._edges[0]).sum())
+		self.overflow += int((values > self._edges[-1]).sum())
+		return self
+
+
+	def merge(self, other: 'Histogram') -> Self:
+		self.counts += other.counts
+		self.underflow += other.underflow
+		self.overflow += other.overflow
+		return self
+
+
+	def result(self) -> Dict[str, Any]:
+		return {'counts': self.counts, 'edges': self._edges, 'underflow': self.underflow, 'overflow': self.overflow}
+
+
+
+class TopK(Reducer):
+	'''the `k` largest (or smallest) values of a per-sample gizmo together with the indices of the samples'''
+	def __init__(self, gizmo: str, k: int = 10, *, largest: bool = True, **kwargs):
+		assert k > 0, f'k must be positive'
+		self._k = k
+		self._largest = largest
+		super().__init__(gizmo, **kwargs)
+
+
+	def reset(self) -> Self:
+		import numpy as np
+		self.values = np.zeros(0)
+		self.index = np.zeros(0, dtype=np.int64)
+		self._seen = 0
+		return self
+
+
+	def _keep(self, values, index) -> Self:
+		import numpy as np
+		values = np.concatenate([self.values, values])
+		index = np.concatenate([self.index, index])
+		order = np.argsort(-values if self._largest else values, kind='stable')[:self._k]
+		self.values, self.index = values[order], index[order]
+		return self
+
+
+	def update(self, values: Any, *, index: Any = None) -> Self:
+		import numpy as np
+		values = np.asarray(values, dtype=float).ravel()
+		if index is None:
+			index = np.arange(self._seen, self._seen + len(values))
+		self._seen += len(values)
+		return self._keep(values, np.asarray(index, dtype=np.int64))
+
+
+	def merge(self, other: 'TopK') -> Self:
+		self._seen += other._seen
+		return self._keep(other.values, other.index)
+
+
+	def result(self) -> Dict[str, Any]:
+		return {'values': self.values, 'index': self.index}
+
+
+
+class ConfusionMatrix(Reducer):
+	'''counts of (target, prediction) pairs of class labels, rows are targets and columns are predictions'''
+	def __init__(self, prediction: str, target: str, num_classes: int, **kwargs):
+		self._num_classes = num_classes
+		super().__init__(prediction, target, **kwargs)
+
+
+	def reset(self) -> Self:
+		import numpy as np
+		self.matrix = np.zeros((self._num_classes, self._num_classes), dtype=np.int64)
+		return self
+
+
+	def update(self, prediction: Any, target: Any, *, index: Any = None) -> Self:
+		import numpy as np
+		C = self._num_classes
+		pairs = np.asarray(target, dtype=np.int64).ravel() * C + np.asarray(prediction, dtype=np.int64).ravel()
+		self.matrix += np.bincount(pairs, minlength=C * C).reshape(C, C)
+		return self
+
+
+	def merge(self, other: 'ConfusionMatrix') -> Self:
+		self.matrix += other.matrix
+		return self
+
+
+	def result(self) -> Any:
+		return self.matrix
+
+
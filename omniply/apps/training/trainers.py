@@ -8,12 +8,18 @@ from .datasets import Dataset
 
 
 class TrainerBase(AbstractTrainer):
-	def __init__(self, *, planner: AbstractPlanner = None, batch_size: int = None, **kwargs):
+	def __init__(self, *, planner: AbstractPlanner = None, batch_size: int = None, micro_batches: int = None,
+				 **kwargs):
+		'''
+		:param micro_batches: if provided, each batch is split into this many micro-batches which are learned
+		separately (eg. for gradient accumulation) and then merged
+		'''
 		if planner is None:
 			planner = self._Planner()
 		super().__init__(**kwargs)
 		self._planner = planner
 		self._batch_size = batch_size
+		self._micro_batches = micro_batches
 
 
 	def gadgetry(self) -> Iterator[AbstractGadget]:
@@ -26,6 +32,16 @@ class TrainerBase(AbstractTrainer):
 		return False
 	
 
+	@staticmethod
+	def _topology_versions(gadgets: Iterable[AbstractGadget]) -> tuple:
+		'''
+		versions of the included (mutable) gaggles, so the batch template is rebuilt when gadgets are added to or
+		removed from any of them (eg. `src.include(...)`). Note that changes to gaggles nested inside those are not
+		tracked.
+		'''
+		return tuple(getattr(gadget, '_topology_version', None) for gadget in gadgets)
+
+
 	_Planner = Indexed
 	_Batch = None #Batch
 	def fit_loop(self, src: Dataset, **settings: Any) -> Iterator[Batch]:
@@ -37,11 +53,18 @@ class TrainerBase(AbstractTrainer):
 		num_itr = planner.expected_iterations(batch_size) # to get the total number of iterations
 
 		batch_cls = self._Batch or getattr(src, '_Batch', None) or Batch
+		template, gadgetry, versions = None, None, None
 		for info in planner.generate(batch_size):
-			batch = batch_cls(info, planner=planner).include(src).extend(tuple(self.gadgetry()))
+			current = (*self.gadgetry(), src)
+			current_versions = self._topology_versions(current)
+			if template is None or current != gadgetry or current_versions != versions:
+				# build the gadget topology once and only swap the info and cache for each batch
+				template = batch_cls(info, planner=planner).extend(current).as_template()
+				gadgetry, versions = current, current_versions
+			batch = template.spawn(info)
 
 			# Note: this runs the optimization step before yielding the batch
-			yield self.learn(batch)
+			yield self.learn(batch) if self._micro_batches is None else self.accumulate(batch, self._micro_batches)
 
 			if self._terminate_fit(batch):
 				break
@@ -58,6 +81,11 @@ class TrainerBase(AbstractTrainer):
 		raise NotImplementedError
 
 
+	def accumulate(self, batch: Batch, parts: int) -> Batch:
+		'''runs `learn` on each micro-batch of `batch` and merges the results back into `batch`'''
+		return batch.merge(self.learn(micro) for micro in batch.split(parts))
+
+
 
 class DynamicTrainerBase(TrainerBase):
 	def __init__(self, **kwargs):
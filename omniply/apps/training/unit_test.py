@@ -2,6 +2,9 @@ from .imports import *
 
 from .datasets import Dataset
 from .trainers import DynamicTrainerBase
+from .planners import Indexed, Weighted, Stratified
+from .util import BatchRNG
+from .caching import tool as cached_tool
 
 
 
@@ -95,10 +98,350 @@ def test_trainer():
 
 
 
+def test_weighted_planner():
+    import numpy as np
 
+    weights = np.array([1., 0., 2., 1.])
+    planner = Weighted(weights=weights, seed=11, max_epochs=50, hard_budget=True, drop_last=False)
 
-    
+    assert planner.expected_iterations(3) == 67
+    infos = list(planner.generate(3))
+    assert len(infos) == 67
+
+    drawn = np.concatenate([info['index'] for info in infos])
+    assert len(drawn) == 200
+    counts = np.bincount(drawn, minlength=4)
+    assert counts[1] == 0
+    assert counts[2] > counts[0] and counts[2] > counts[3]
+
+    again = Weighted(weights=weights, seed=11, max_epochs=50, hard_budget=True, drop_last=False)
+    assert all(np.array_equal(a['index'], b['index']) for a, b in zip(infos, again.generate(3)))
+
+    planner = Weighted(weights=weights, seed=5, replacement=False, max_epochs=2, sort_indices=False)
+    assert planner.epoch_size == 3
+    infos = list(planner.generate(3))
+    assert len(infos) == 2
+    assert all(sorted(info['index'].tolist()) == [0, 2, 3] for info in infos)
+
+
+
+def test_stratified_planner():
+    import numpy as np
+
+    strata = ['a'] * 8 + ['b'] * 2
+    planner = Stratified(strata=strata, seed=3, max_epochs=1)
+    assert planner.stratum_counts() == {'a': 5, 'b': 5}
+    assert planner.expected_iterations(2) == 5
+
+    drawn = [info['index'] for info in planner.generate(2)]
+    assert len(drawn) == 5
+    labels = np.asarray(strata)[np.concatenate(drawn)]
+    assert (labels == 'b').sum() == 5
+
+    planner = Stratified(strata=strata, quotas={'a': 3, 'b': 1}, epoch_size=8, seed=3, max_epochs=1)
+    assert planner.stratum_counts() == {'a': 6, 'b': 2}
+    drawn = np.concatenate([info['index'] for info in planner.generate(4)])
+    assert len(drawn) == 8 and len(set(drawn[np.asarray(strata)[drawn] == 'a'].tolist())) == 6
+
+
+
+def test_batch_rng():
+    import numpy as np
+
+    class _Toy(Dataset):
+        @property
+        def size(self) -> int:
+            return 6
+
+    def draws(batch_size):
+        rng = BatchRNG(seed=7)
+        out = []
+        for batch in _Toy().iterate(batch_size):
+            batch.include(rng)
+            out.append((batch['np_rng'].random(), batch['rng'].random(), batch['seed'],
+                        [r.random() for r in batch['sample_rngs']]))
+        return out
+
+    first, second = draws(2), draws(2)
+    assert first == second
+    assert len({seed for _, _, seed, _ in first}) == len(first)
+    assert len({x for x, _, _, _ in first}) == len(first)
+
+    # per-sample streams do not depend on the batching
+    assert sum((samples for *_, samples in draws(3)), []) == sum((samples for *_, samples in first), [])
+
+    # also when batches wrap around an epoch boundary (4 does not divide 6)
+    def sample_draws(batch_size):
+        rng = BatchRNG(seed=7)
+        planner = Indexed(dataset_size=6, max_epochs=2, seed=11)
+        out = {}
+        for info in planner.generate(batch_size):
+            batch = _Toy._Batch(info, planner=planner, allow_draw=False).include(rng)
+            for e, i, r in zip(batch['sample_epochs'], batch['index'], batch['sample_rngs']):
+                out[int(e), int(i)] = r.random()
+        return out
+
+    wrapped = sample_draws(4)
+    assert len(wrapped) == 12 and len(set(wrapped.values())) == 12
+    assert wrapped == sample_draws(2) == sample_draws(1)
+
+
+
+def test_epoch_cache():
+    import numpy as np
 
+    class _Toy(Dataset):
+        calls = 0
+
+        @cached_tool('square', cache='epoch')
+        def square(self, index):
+            self.calls += len(index)
+            return np.asarray(index) ** 2
+
+        @property
+        def size(self) -> int:
+            return 10
+
+    toy = _Toy()
+    trainer = DynamicTrainerBase(batch_size=4)
+    trainer.learn = lambda batch: batch
+
+    for batch in trainer.fit_loop(toy, max_epochs=3):
+        assert np.array_equal(batch['square'], np.asarray(batch['index']) ** 2)
+    assert toy.calls == 10
+
+    toy.clear_epoch_caches()
+    for batch in toy.iterate(3):
+        assert np.array_equal(batch['square'], np.asarray(batch['index']) ** 2)
+    assert toy.calls == 20
+
+    class _Tagged(_Toy):
+        @cached_tool('tagged', cache='epoch')
+        def tagged(self, index, sample_epochs): # any other info is also available when filling in missing samples
+            assert len(sample_epochs) == len(index)
+            self.calls += len(index)
+            return np.asarray(index) * 10
+
+    tagged = _Tagged()
+    for batch in trainer.fit_loop(tagged, max_epochs=3): # the third batch is only partially cached
+        assert np.array_equal(batch['tagged'], np.asarray(batch['index']) * 10)
+    assert tagged.calls == 10
+
+
+
+def test_batch_template():
+    import numpy as np
+    from itertools import islice
+
+    class _Toy(Dataset):
+        @tool('double')
+        def double(self, index):
+            return index * 2
+
+        @property
+        def size(self) -> int:
+            return 8
+
+    @tool('double')
+    def override(index):
+        return -index
+
+    class _Trainer(DynamicTrainerBase):
+        def learn(self, batch):
+            return batch
+
+    trainer = _Trainer(batch_size=4)
+    trainer.include(override)
+
+    batches = list(islice(trainer.fit_loop(_Toy(), max_epochs=3), 4))
+    for batch in batches:
+        assert np.array_equal(batch['double'], -batch['index'])
+        assert list(batch.gadgetry())[0] is override
+
+    first, second = batches[:2]
+    assert first._gadgets_table is second._gadgets_table
+    assert first['drawn_batches'] == 1 and second['drawn_batches'] == 2
+
+    @tool('triple')
+    def triple(index):
+        return index * 3
+
+    first.include(triple)
+    assert first._gadgets_table is not second._gadgets_table
+    assert np.array_equal(first['triple'], first['index'] * 3)
+    assert second.grab('triple', None) is None
+
+    newer = second.new()
+    assert newer['drawn_batches'] == 5 and np.array_equal(newer['double'], -newer['index'])
+
+    template = second._template
+    info = {gizmo: newer[gizmo] for gizmo in newer.info.gizmos()}
+    assert template.spawn({**info, 'bonus': 'info'})['bonus'] == 'info' # info the template doesn't know about
+    template.include(tool('bonus')(lambda: 'gadget'))
+    extra = template.spawn({**info, 'bonus': 'info'})
+    assert extra['bonus'] == 'gadget' # the info keeps the lowest precedence (as without a template)
+    assert np.array_equal(extra['double'], -extra['index']) and extra.gives('bonus')
+    assert newer._vendor_stats is second._vendor_stats is template._vendor_stats # learned across batches
+    assert second.as_template()._vendor_stats is template._vendor_stats
+    template.include(triple) # changes to the template do not leak into the batches spawned from it
+    assert newer._shared_topology and not newer.gives('triple') and template.gives('triple')
+
+    # changes to the included gaggles after the template was built are picked up
+    toy = _Toy()
+    loop = trainer.fit_loop(toy, max_epochs=3)
+    assert next(loop).grab('triple', None) is None
+    toy.include(triple)
+    batch = next(loop)
+    assert np.array_equal(batch['triple'], batch['index'] * 3)
+
+
+
+def test_micro_batches():
+    import numpy as np
+
+    calls = []
+
+    class _Toy(Dataset):
+        @tool('features')
+        def features(self, index):
+            calls.append(len(index))
+            return np.stack([index, index * 10], axis=1)
+
+        @tool('scale')
+        def scale(self):
+            calls.append('scale')
+            return 2.
+
+        @property
+        def size(self) -> int:
+            return 10
+
+    @tool('prediction')
+    def prediction(features, scale):
+        return features[:, 0] * scale
+
+    @tool('loss')
+    def loss(prediction):
+        return float(prediction.mean())
+
+    seen = []
+    class _Trainer(DynamicTrainerBase):
+        def learn(self, batch):
+            seen.append(batch.size)
+            batch['loss']
+            return batch
+
+    trainer = _Trainer(batch_size=10, micro_batches=3)
+    trainer.include(prediction, loss)
+
+    batch = next(iter(trainer.fit_loop(_Toy(), max_epochs=2)))
+    assert seen == [3, 3, 4]
+    assert calls == [3, 'scale', 3, 4] # the batch-independent `scale` is computed once for all micro-batches
+    assert np.array_equal(batch['prediction'], batch['index'] * 2)
+    assert np.isclose(batch['loss'], (batch['index'] * 2).mean())
+
+    calls.clear()
+    batch = batch.new()
+    batch['features'], batch['scale'], batch['loss']
+    micros = batch.split(2)
+    assert [m.size for m in micros] == [5, 5]
+    assert all(m._gadgets_table is micros[0]._gadgets_table for m in micros)
+    first = micros[0]
+    assert np.shares_memory(first['features'], batch['features'])
+    assert np.array_equal(first['features'][:, 0], first['index'])
+    assert first.is_cached('scale') and not first.is_cached('loss')
+    assert np.isclose(first['loss'], (first['index'] * 2).mean())
+    assert calls == [10, 'scale']
+
+    # per-sample info is sliced too, so per-sample streams match the full batch (also across an epoch boundary)
+    planner = Indexed(dataset_size=10, max_epochs=2, seed=3)
+    infos = planner.generate(6)
+    next(infos)
+    wrapped = _Toy._Batch(next(infos), planner=planner, allow_draw=False).include(BatchRNG(seed=5))
+    assert len(set(wrapped['sample_epochs'])) == 2
+    micros = wrapped.split(2)
+    for micro in micros:
+        assert len(micro['sample_epochs']) == len(micro['index']) == micro.size
+    full = [rng.random() for rng in wrapped['sample_rngs']]
+    assert [rng.random() for micro in micros for rng in micro['sample_rngs']] == full
+
+
+def test_evaluator():
+    import numpy as np
+    from concurrent.futures import ThreadPoolExecutor
+    from .evaluators import DynamicEvaluatorBase
+    from .reducers import Moments, Mean, Histogram, TopK, ConfusionMatrix
+
+    values = np.random.RandomState(0).randn(103)
+
+    class _Toy(Dataset):
+        @tool('value')
+        def value(self, index):
+            return values[index]
+
+        @tool('label')
+        def label(self, index):
+            return index % 3
+
+        @property
+        def size(self) -> int:
+            return len(values)
+
+    @tool('prediction')
+    def prediction(value):
+        return (value > 0).astype(int)
+
+    evaluator = DynamicEvaluatorBase({
+        'moments': Moments('value'), 'mean': Mean('value'),
+        'hist': Histogram('value', 4, range=(-1, 1)), 'top': TopK('value', 3),
+        'confusion': ConfusionMatrix('prediction', 'label', num_classes=3),
+    }, batch_size=10).include(prediction)
+
+    full = evaluator.evaluate(_Toy())
+    assert full['moments']['count'] == len(values)
+    assert np.isclose(full['mean'], values.mean()) and np.isclose(full['moments']['var'], values.var())
+    counts, _ = np.histogram(values, np.linspace(-1, 1, 5))
+    assert np.array_equal(full['hist']['counts'], counts)
+    assert full['hist']['underflow'] + full['hist']['overflow'] + counts.sum() == len(values)
+    assert np.array_equal(full['top']['index'], np.argsort(-values)[:3])
+    assert full['confusion'].sum() == len(values)
+    assert np.array_equal(full['confusion'][:, 1], np.bincount(np.arange(len(values))[values > 0] % 3, minlength=3))
+
+    seen = [batch['index'] for batch in evaluator.evaluate_loop(_Toy(), shard=1, num_shards=3)]
+    assert np.array_equal(np.concatenate(seen), np.arange(34, 68))
+
+    with ThreadPoolExecutor(2) as executor:
+        sharded = evaluator.evaluate(_Toy(), num_shards=4, executor=executor)
+    assert np.isclose(sharded['mean'], full['mean']) and np.isclose(sharded['moments']['var'], full['moments']['var'])
+    assert np.array_equal(sharded['hist']['counts'], full['hist']['counts'])
+    assert np.array_equal(sharded['top']['index'], full['top']['index'])
+    assert np.array_equal(sharded['confusion'], full['confusion'])
+
+
+def test_evaluator_small_shards():
+    import numpy as np
+    from .evaluators import DynamicEvaluatorBase
+    from .reducers import Moments, Mean, TopK
+
+    class _Ones(Dataset):
+        @tool('value')
+        def value(self, index):
+            return np.ones(len(index))
+
+        @property
+        def size(self) -> int:
+            return 3
 
+    evaluator = DynamicEvaluatorBase({'mean': Mean('value'), 'moments': Moments('value'),
+                                      'top': TopK('value', 2)}, batch_size=2)
 
+    # shards smaller than the batch size are not filled up with samples of another epoch
+    seen = [batch['index'] for batch in evaluator.evaluate_loop(_Ones(), shard=0, num_shards=2)]
+    assert [list(index) for index in seen] == [[0]]
+    sharded = evaluator.evaluate(_Ones(), num_shards=2)
+    assert sharded['mean'] == 1. and sharded['moments']['count'] == 3
 
+    # more shards than samples leaves some shards empty
+    assert list(evaluator.evaluate_loop(_Ones(), shard=0, num_shards=5)) == []
+    sharded = evaluator.evaluate(_Ones(), num_shards=5)
+    assert sharded['mean'] == 1. and sharded['moments']['count'] == 3 and len(sharded['top']['index']) == 2
@@ -1,18 +1,45 @@
 from .imports import *
+from ..sampling import RandomStreams, child_stream
 
 
 
-class BatchRNG(ToolKit):
-	def __init__(self, seed: int = None, **kwargs):
-		super().__init__(**kwargs)
-		self._seed = seed
+class BatchRNG(RandomStreams):
+	'''
+	Random streams for batches: every batch gets its own `seed_sequence` (keyed by `drawn_batches`), and every
+	sample gets its own stream keyed by the epoch it was drawn in and its `index`, so per-sample randomness does
+	not depend on how the samples are batched (even if a batch wraps around an epoch boundary).
+	'''
+	_batch_stream = 0
+	_sample_stream = 1
 
-	# @tool('seed')
-	# def get_seed(self, epoch_seed: int = None, epoch_offset: int = None) -> int:
-	# 	return int(hashlib.md5(f'{epoch_seed},{epoch_offset}'.encode()).hexdigest(), 16) % (2**32)
+	@tool('seed_sequence')
+	def get_seed_sequence(self, drawn_batches: int):
+		return self.stream(self._batch_stream, drawn_batches)
 
-	@tool('seed')
-	def get_seed(self, drawn_batches: int) -> int:
-		return int(hashlib.md5(f'{self._seed},{drawn_batches}'.encode()).hexdigest(), 16) % (2**32)
+
+	@tool('sample_seed_sequences')
+	def get_sample_seed_sequences(self, index: Iterable[int], sample_epochs: Iterable[int] = None,
+								  epochs: int = 0) -> list:
+		'''
+		:param sample_epochs: epoch of each sample (from the planner), otherwise all samples are assumed to be
+		from `epochs`
+		'''
+		index = [int(i) for i in index]
+		if sample_epochs is None:
+			sample_epochs = [epochs] * len(index)
+		bases = {}
+		streams = []
+		for e, i in zip(sample_epochs, index):
+			e = int(e)
+			if e not in bases:
+				bases[e] = self.stream(self._sample_stream, e)
+			streams.append(child_stream(bases[e], i))
+		return streams
+
+
+	@tool('sample_rngs')
+	def get_sample_rngs(self, sample_seed_sequences: Iterable) -> list:
+		import numpy as np
+		return [np.random.default_rng(seq) for seq in sample_seed_sequences]
 
 
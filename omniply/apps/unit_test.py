@@ -121,6 +121,92 @@ def test_gapped_apps():
 
 
 
+def test_lazy_gauge():
+
+	@tool('b')
+	def g(x):
+		return x + 1
+
+	inner = ToolKit().include(g)
+	outer = Context(inner)
+
+	outer.gauge_apply({'x': 'y'})
+	outer.gauge_apply({'y': 'z', 'b': 'c'})
+
+	assert list(g.gizmos()) == ['c']
+	assert list(inner.gizmos()) == ['c']
+	assert g.gap('x') == 'z' and g.gap_invert('z') == 'x'
+
+	outer['z'] = 1
+	assert outer['c'] == 2
+
+	outer.exclude(inner)
+	outer.gauge_apply({'c': 'd'})
+
+	assert list(inner.gizmos()) == ['c']
+	assert list(g.gizmos()) == ['c']
+
+
+def test_gauge_compose():
+	from .gaps import Gauge
+
+	assert dict(Gauge({'a': 'x', 'b': 'x'}).compose({'x': 'y'})) == {'a': 'y', 'b': 'y'}
+	assert dict(Gauge({'a': 'x'}).compose({'x': 'y', 'c': 'd'})) == {'a': 'y', 'c': 'd'}
+
+
+def test_gauge_order():
+
+	@tool('b')
+	def h(x):
+		return x
+
+	first = ToolKit().include(h)
+	second = ToolKit().include(h)
+
+	second.gauge_apply({'b': 'c'})
+	first.gauge_apply({'c': 'd'}) # applied after the one on `second`, even though `first` was included first
+
+	assert list(h.gizmos()) == ['d']
+
+	ToolKit().gauge_apply({'d': 'e'}) # unrelated gaggles don't make `h` sync again
+	assert not h._gauge_stale
+	second.gauge_apply({'d': 'e'})
+	assert h._gauge_stale and list(h.gizmos()) == ['e'] and not h._gauge_stale
+
+
+def test_gauge_owners_collected():
+	import gc, weakref
+
+	@tool('b')
+	def h(x):
+		return x + 1
+
+	refs = [weakref.ref(Context(h)) for _ in range(1000)]
+	gc.collect()
+	assert all(ref() is None for ref in refs)
+
+	ctx = Context(h) # following a new owner prunes the dead ones
+	ctx.gauge_apply({'b': 'c'})
+	assert len(h._gauge_owners) == 1 and list(h.gizmos()) == ['c']
+
+
+def test_gauged_gate_cache():
+	from .gaps import Mechanism
+
+	@tool('a')
+	def f(x):
+		return x + 1
+
+	gate = Mechanism(f, external={'a': 'a1'}, internal={'x': 'x1'})
+	ctx = Context(gate)
+	ctx['x1'] = 1
+	assert ctx['a1'] == 2 and ctx.gate_cache(gate) == {'a': 2}
+
+	gate.gauge_apply({'a': 'c'}) # the internal names of the gate change, so its gate cache is invalidated
+	assert ctx.gate_cache(gate) == {} and 'a1' not in ctx._gate_index
+
+
+
 def test_gapped_gear():
 	class Tester(Structured):
 		@gear('a')
@@ -167,11 +167,9 @@ class Mechanism(_Mechanism, RecordingGaggle):
 			ext = self.gizmo_to(gizmo)
 			for parent in reversed(self._gang_stack):
 				if isinstance(parent, GatedCache):
-					try:
-						out = parent.check_gate_cache(self, gizmo)
-					except self._GateCacheMiss:
-						pass
-					else:
+					cache = parent.gate_cache(self)
+					if gizmo in cache:
+						out = cache[gizmo]
 						if self._active_recording:
 							self._active_recording.cached(gizmo, out)
 						return out
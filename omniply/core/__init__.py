@@ -1,3 +1,3 @@
 from .abstract import AbstractGadget, AbstractGaggle, AbstractGame
 from .errors import GadgetFailed, MissingGadget, GrabError
-from .op import tool, ToolKit, Context, Mechanism, Gate
\ No newline at end of file
+from .op import tool, ToolKit, AdaptiveToolKit, Context, Mechanism, Gate
\ No newline at end of file
@@ -1,8 +1,10 @@
 from typing import Optional, Any, Iterator, TypeVar, Generic, Union, Callable, Iterable, Mapping, Sequence
 from itertools import chain
+import time
+import threading
 from collections import OrderedDict
 from omnibelt import filter_duplicates
-from omnibelt.crafts import InheritableCrafty, AbstractSkill
+from omnibelt.crafts import InheritableCrafty, AbstractSkill, AbstractCraft
 
 from .abstract import AbstractGadget, AbstractGaggle, AbstractGame, AbstractMutable
 from .errors import logger, GadgetFailed, MissingGadget, AssemblyError
@@ -196,28 +198,274 @@ class LoopyGaggle(GaggleBase):
 		"""
 		failures = OrderedDict()
 		itr = self._grabber_stack.setdefault(gizmo, self._gadgets(gizmo))
-		for gadget in itr:
-			try:
-				out = gadget.grab_from(ctx, gizmo)
-			except self._GadgetFailure as e:
-				failures[e] = gadget
-			except:
-				logger.debug(f'{gadget!r} failed while trying to produce {gizmo!r}')
-				raise
-			else:
-				if gizmo in self._grabber_stack:
-					self._grabber_stack.pop(gizmo)
-				return out
-		if gizmo in self._grabber_stack:
-			self._grabber_stack.pop(gizmo)
+		try:
+			for gadget in itr:
+				try:
+					return self._grab_vendor(gadget, ctx, gizmo)
+				except self._GadgetFailure as e:
+					failures[e] = gadget
+				except:
+					logger.debug(f'{gadget!r} failed while trying to produce {gizmo!r}')
+					raise
+		finally:
+			# also when `_gadgets` itself raises (eg. no gadget for the gizmo)
+			self._grabber_stack.pop(gizmo, None)
 		if failures:
 			raise self._AssemblyFailedError(failures)
 		raise self._MissingGadgetError(gizmo)
 
+	def _grab_vendor(self, gadget: AbstractGadget, ctx: 'AbstractGame', gizmo: str) -> Any:
+		"""
+		Grabs the gizmo from a single vendor (eg. to monitor the vendors).
+
+		Args:
+			gadget (AbstractGadget): The vendor to use.
+			ctx (AbstractGame): The context with which to grab the gizmo.
+			gizmo (str): The name of the gizmo to grab.
+
+		Returns:
+			Any: The grabbed gizmo.
+		"""
+		return gadget.grab_from(ctx, gizmo)
+
+
+
+class VendorStats:
+	"""
+	Observed performance of a vendor for a gizmo (see `AdaptiveGaggle`).
+
+	Attributes:
+		vendor (AbstractGadget): The vendor.
+		attempts (int): How often the vendor was tried.
+		successes (int): How often the vendor produced the gizmo.
+		total_time (float): Total time (in seconds) spent in the vendor itself, excluding the time spent by other
+		vendors producing its dependencies in the meantime.
+	"""
+	__slots__ = ('vendor', 'attempts', 'successes', 'total_time')
+
+	def __init__(self, vendor: AbstractGadget):
+		self.vendor = vendor
+		self.attempts = 0
+		self.successes = 0
+		self.total_time = 0.
+
+	def __repr__(self):
+		return (f'{self.__class__.__name__}({self.vendor!r}, {self.successes}/{self.attempts}, '
+				f'{self.mean_latency * 1e6:.1f}us)')
+
+	@property
+	def success_rate(self) -> float:
+		"""Estimated probability of success (with a uniform prior, so untried vendors are at 0.5)."""
+		return (self.successes + 1) / (self.attempts + 2)
+
+	@property
+	def mean_latency(self) -> float:
+		"""Average time (in seconds) per attempt (0 if the vendor was never tried)."""
+		return self.total_time / self.attempts if self.attempts else 0.
+
+	@property
+	def expected_cost(self) -> float:
+		"""Expected time spent in this vendor per success (lower is better)."""
+		return self.mean_latency / self.success_rate
+
+
+
+class VendorStatsTable:
+	"""
+	The observed statistics of all vendors of all gizmos, which may be shared by any number of adaptive gaggles
+	(eg. a template and all the contexts spawned from it, see `AdaptiveGaggle.share_vendor_stats`).
+	"""
+	_VendorStats = VendorStats
+
+	def __init__(self):
+		self._stats: dict[str, dict[int, VendorStats]] = {}
+
+	def __repr__(self):
+		return f'{self.__class__.__name__}({", ".join(map(str, self._stats))})'
+
+	def ranked(self, gizmo: str) -> list[VendorStats]:
+		"""
+		Lists the statistics of all vendors of a gizmo that were tried so far, best first.
+
+		Args:
+			gizmo (str): The name of the gizmo.
+
+		Returns:
+			list[VendorStats]: The statistics of the vendors.
+		"""
+		return sorted(self._stats.get(gizmo, {}).values(), key=lambda stats: stats.expected_cost)
+
+	def sort(self, gizmo: str, vendors: list[AbstractGadget]) -> None:
+		"""
+		Sorts the vendors of a gizmo in place by their expected cost (stable, so untried vendors keep their order).
+
+		Args:
+			gizmo (str): The name of the gizmo.
+			vendors (list[AbstractGadget]): The vendors to sort.
+		"""
+		known = self._stats.get(gizmo)
+		if known and len(vendors) > 1:
+			prior = self._VendorStats(None)
+			vendors.sort(key=lambda vendor: known.get(id(vendor), prior).expected_cost)
+
+	def record(self, gizmo: str, vendor: AbstractGadget) -> VendorStats:
+		"""
+		Returns the statistics of a vendor for a gizmo (created if necessary).
+
+		Args:
+			gizmo (str): The name of the gizmo.
+			vendor (AbstractGadget): The vendor.
+
+		Returns:
+			VendorStats: The statistics to update.
+		"""
+		known = self._stats.setdefault(gizmo, {})
+		stats = known.get(id(vendor))
+		if stats is None or stats.vendor is not vendor: # ids may be reused after a vendor is excluded
+			stats = known[id(vendor)] = self._VendorStats(vendor)
+		return stats
+
+	def clear(self) -> None:
+		"""
+		Forgets all statistics.
+		"""
+		self._stats.clear()
+
+
+
+class AdaptiveGaggle(LoopyGaggle):
+	"""
+	The AdaptiveGaggle class is an opt-in mix-in for gaggles where the vendors of some gizmos are interchangeable
+	(ie. the order in which they are tried does not change the result). For those gizmos the vendors are tried in order
+	of their expected cost per success (based on the observed success rate and latency), instead of by precedence, so
+	vendors which usually fail are tried last. Ties (eg. untried vendors) keep the usual precedence.
+
+	The statistics are kept in a `VendorStatsTable`, which can be passed in (`vendor_stats`) or shared with another
+	adaptive gaggle (`share_vendor_stats`). That happens automatically for gaggles sharing their topology, and when a
+	gaggle without its own adaptive setting includes an adaptive gaggle (eg. an `AdaptiveToolKit`), so short-lived
+	contexts (eg. batches) learn from all the previous ones. The latency of a vendor excludes the time
+	spent by other vendors producing its dependencies (as long as those are grabbed through adaptive gaggles, like
+	any `Context`), so vendors are not penalized for being the first to need an expensive input.
+
+	Attributes:
+		_adaptive (Union[bool, set[str]]): Either all gizmos (True), none (False) or a set of order-insensitive gizmos.
+		_vendor_stats (VendorStatsTable): The observed statistics for each gizmo and vendor.
+	"""
+	_adaptive: Union[bool, set[str]] = False
+	_VendorStatsTable = VendorStatsTable
+	_vendor_clock = threading.local() # per thread: time spent in nested vendors of each vendor currently timed
+
+	def __init__(self, *args, adaptive: Union[bool, Iterable[str]] = None,
+				 vendor_stats: Optional[VendorStatsTable] = None, **kwargs):
+		"""
+		Initializes a new instance of the AdaptiveGaggle class.
+
+		Args:
+			adaptive (Union[bool, Iterable[str]]): True to treat all gizmos as order-insensitive, or the gizmos which
+			are (defaults to the class setting, which is off).
+			vendor_stats (Optional[VendorStatsTable]): The statistics to use and update (defaults to a new table).
+		"""
+		super().__init__(*args, **kwargs)
+		if adaptive is not None:
+			self._adaptive = adaptive if isinstance(adaptive, bool) else set(adaptive)
+		self._vendor_stats = self._VendorStatsTable() if vendor_stats is None else vendor_stats
+
+	def share_vendor_stats(self: Self, source: 'AdaptiveGaggle') -> Self:
+		"""
+		Uses (and updates) the statistics of `source`, and its adaptive gizmos unless they were set for this gaggle.
+
+		Args:
+			source (AdaptiveGaggle): The gaggle whose statistics to use.
+
+		Returns:
+			Self: this gaggle.
+		"""
+		self._vendor_stats = source._vendor_stats
+		if '_adaptive' not in self.__dict__ and '_adaptive' in source.__dict__:
+			self._adaptive = source._adaptive
+		return self
+
+	def is_adaptive(self, gizmo: str) -> bool:
+		"""
+		Checks whether the vendors of a gizmo are reordered based on their statistics.
+
+		Args:
+			gizmo (str): The name of the gizmo.
+
+		Returns:
+			bool: True if the vendors of the gizmo are reordered.
+		"""
+		return self._adaptive is True or (bool(self._adaptive) and gizmo in self._adaptive)
+
+	def vendor_stats(self, gizmo: str) -> list[VendorStats]:
+		"""
+		Lists the observed statistics of all vendors of a gizmo that were tried so far, best first.
+
+		Args:
+			gizmo (str): The name of the gizmo.
+
+		Returns:
+			list[VendorStats]: The statistics of the vendors.
+		"""
+		return self._vendor_stats.ranked(gizmo)
+
+	def reset_vendor_stats(self: Self) -> Self:
+		"""
+		Forgets all observed statistics (including those of any gaggle sharing them).
+		"""
+		self._vendor_stats.clear()
+		return self
+
+	def extend(self: Self, gadgets: Iterable[AbstractGadget]) -> Self:
+		gadgets = tuple(gadgets)
+		out = super().extend(gadgets)
+		for gadget in gadgets:
+			if '_adaptive' in self.__dict__:
+				break
+			if isinstance(gadget, AdaptiveGaggle) and '_adaptive' in gadget.__dict__:
+				self.share_vendor_stats(gadget) # the first adaptive gaggle included sets the statistics
+		return out
+
+	def _gadgets(self, gizmo: Optional[str] = None) -> Iterator[AbstractGadget]:
+		if gizmo is None or not self.is_adaptive(gizmo):
+			yield from super()._gadgets(gizmo)
+			return
+		vendors = list(super()._gadgets(gizmo))
+		self._vendor_stats.sort(gizmo, vendors)
+		yield from vendors
+
+	def _grab_vendor(self, gadget: AbstractGadget, ctx: 'AbstractGame', gizmo: str) -> Any:
+		adaptive = self.is_adaptive(gizmo)
+		timers = getattr(self._vendor_clock, 'nested', None)
+		if not adaptive and not timers: # nothing is being timed
+			return super()._grab_vendor(gadget, ctx, gizmo)
+		if timers is None:
+			timers = self._vendor_clock.nested = []
+		timers.append(0.)
+		stats = self._vendor_stats.record(gizmo, gadget) if adaptive else None
+		start = time.perf_counter()
+		try:
+			out = super()._grab_vendor(gadget, ctx, gizmo)
+		finally:
+			elapsed = time.perf_counter() - start
+			nested = timers.pop()
+			if timers:
+				timers[-1] += elapsed
+			if stats is not None:
+				stats.attempts += 1
+				stats.total_time += elapsed - nested
+		if stats is not None:
+			stats.successes += 1
+		return out
+
 class MutableGaggle(GaggleBase, AbstractMutable):
 	"""
 	The MutableGaggle class is a mix-in for custom gaggles to dynamically add and remove subgadgets.
+
+	Attributes:
+		_topology_version (int): Incremented whenever gadgets are added or removed (eg. to detect changes).
 	"""
+	_topology_version = 0
 
 	def extend(self: Self, gadgets: Iterable[AbstractGadget]) -> Self:
 		"""
@@ -237,6 +485,7 @@ class MutableGaggle(GaggleBase, AbstractMutable):
 			_eager = True
 		if _eager:
 			gadgets = tuple(gadgets)
+		self._topology_version += 1
 		self._gadgets_list.extend(reversed(gadgets))
 		new = {}
 		for gadget in gadgets:
@@ -260,6 +509,7 @@ class MutableGaggle(GaggleBase, AbstractMutable):
 		Returns:
 			Self: this gaggle.
 		"""
+		self._topology_version += 1
 		for gadget in gadgets:
 			for gizmo in gadget.gizmos():
 				if gizmo in self._gadgets_table and gadget in self._gadgets_table[gizmo]:
@@ -268,6 +518,55 @@ class MutableGaggle(GaggleBase, AbstractMutable):
 				self._gadgets_list.remove(gadget)
 		return self
 
+class SharedTopologyGaggle(MutableGaggle):
+	"""
+	The SharedTopologyGaggle class is a mix-in for mutable gaggles which can use the gadget topology of another gaggle
+	without copying it (eg. the batches spawned from a template). Whichever gaggle is modified first copies the
+	topology (copy-on-write), so changes to either never show up in the other.
+
+	Attributes:
+		_shared_topology (bool): Whether this gaggle uses the topology of another gaggle.
+		_lent_topology (bool): Whether the topology of this gaggle may be used by other gaggles.
+	"""
+	_shared_topology = False
+	_lent_topology = False
+
+	def share_topology(self: Self, source: 'SharedTopologyGaggle') -> Self:
+		"""
+		Uses the gadgets of `source` (replacing any gadgets of this gaggle) until either gaggle is modified.
+
+		Args:
+			source (SharedTopologyGaggle): The gaggle whose topology to use.
+
+		Returns:
+			Self: this gaggle.
+		"""
+		self._gadgets_table = source._gadgets_table
+		self._gadgets_list = source._gadgets_list
+		self._shared_topology = True
+		source._lent_topology = True
+		if isinstance(self, AdaptiveGaggle) and isinstance(source, AdaptiveGaggle):
+			self.share_vendor_stats(source) # same vendors, so the same statistics apply
+		return self
+
+	def _detach_topology(self) -> None:
+		"""
+		Copies the topology if it may be used by any other gaggle (before modifying it).
+		"""
+		if self._shared_topology or self._lent_topology:
+			self._gadgets_table = {gizmo: list(gadgets) for gizmo, gadgets in self._gadgets_table.items()}
+			self._gadgets_list = list(self._gadgets_list)
+			self._shared_topology = False
+			self._lent_topology = False
+
+	def extend(self: Self, gadgets: Iterable[AbstractGadget]) -> Self:
+		self._detach_topology()
+		return super().extend(gadgets)
+
+	def exclude(self: Self, *gadgets: AbstractGadget) -> Self:
+		self._detach_topology()
+		return super().exclude(*gadgets)
+
 class CraftyGaggle(GaggleBase, InheritableCrafty):
 	"""
 	The CraftyGaggle class is a mix-in for custom gaggles to handle crafts such as `tool`.
@@ -276,6 +575,29 @@ class CraftyGaggle(GaggleBase, InheritableCrafty):
 	done here.
 	"""
 
+	_compiled_crafts: Optional[list[AbstractCraft]] = None # per class (see `_craft_table`)
+
+	def __init_subclass__(cls, **kwargs):
+		super().__init_subclass__(**kwargs)
+		cls._compiled_crafts = None
+
+	@classmethod
+	def _craft_table(cls) -> list[AbstractCraft]:
+		"""
+		Lists all crafts contained in the class (including super classes) in the order in which they are processed.
+		Since that only depends on the class, the MRO is only walked once per class.
+
+		Note that crafts added to the class after it was first instantiated are ignored.
+		"""
+		if cls._compiled_crafts is None:
+			# gate by where the craft is defined
+			history = OrderedDict() # src<N-O> : craft<N-O>
+			for src, key, craft in cls._emit_all_craft_items(): # craft<N-O>
+				history.setdefault(src, []).append(craft)
+			# O-N by source, N-O (in order of precedence) within each source
+			cls._compiled_crafts = [craft for crafts in reversed(history.values()) for craft in reversed(crafts)]
+		return cls._compiled_crafts
+
 	def _process_crafts(self):
 		"""
 		Identifies all crafts contained in the class (including super classes) that are gadgets and adds those as
@@ -284,18 +606,10 @@ class CraftyGaggle(GaggleBase, InheritableCrafty):
 		Note that, in order to be processed correctly, the crafts should produce skills which are instances of
 		`AbstractGadget`.
 		"""
-		# gate by where the craft is defined
-		history = OrderedDict() # src<N-O> : craft<N-O>
-		for src, key, craft in self._emit_all_craft_items(): # craft<N-O>
-			history.setdefault(src, []).append(craft)
-
-		# convert crafts to skills and add in O-N (N-O) order to table
-		for crafts in reversed(history.values()): # O-N
-			for craft in reversed(crafts): # N-O (in order of precedence)
-				# TODO: convert as_skill to a generator to enable multiple skills per craft
-				# (not super important since crafts can emit any number of sub-crafts, so resolve this upstream)
-				skill = craft.as_skill(self)
-				self._process_skill(skill)
+		for craft in self._craft_table():
+			# TODO: convert as_skill to a generator to enable multiple skills per craft
+			# (not super important since crafts can emit any number of sub-crafts, so resolve this upstream)
+			self._process_skill(craft.as_skill(self))
 
 
 	def _process_skill(self, skill: AbstractSkill):
@@ -1,5 +1,6 @@
-from typing import Any, Optional, Iterator, Iterable, TypeVar
+from typing import Any, Optional, Iterator, Iterable, Mapping, TypeVar, Union
 from collections import UserDict
+from contextlib import contextmanager
 from omnibelt import filter_duplicates
 
 from .abstract import (AbstractGadget, AbstractGaggle, AbstractGame, AbstractGang, AbstractGadgetError,
@@ -7,6 +8,7 @@ from .abstract import (AbstractGadget, AbstractGaggle, AbstractGame, AbstractGan
 from .errors import GadgetFailed, MissingGadget, AssemblyError, GrabError
 from .gadgets import GadgetBase
 from .gaggles import GaggleBase, MutableGaggle, MultiGadgetBase
+from .genetics import AbstractGenetic
 
 Self = TypeVar('Self')
 
@@ -90,11 +92,32 @@ class CacheGame(GameBase, UserDict):
 	"""
 	The CacheGame class is a subclass of GameBase and UserDict. It provides methods to handle gizmo caching.
 
+	Gizmos without any gadget to produce them (eg. absent optional inputs) are remembered as missing, so repeatedly
+	asking for them is constant time. Other failures may depend on external state (a gadget failing until some
+	resource is available), so they are only cached when `_cache_failures` is enabled. The failures are forgotten
+	whenever the cache is changed from the outside or gadgets are added or removed.
+
 	Attributes:
 		_gizmo_type (Optional[type]): The type of the gizmo. Defaults to None.
+		_cache_failures (bool): Whether to cache all failed grabs, not just missing gadgets. Defaults to False.
 	"""
 
 	_gizmo_type = None
+	_cache_failures = False
+	_failures: Optional[dict[str, AbstractGadgetError]] = None # gizmo -> error of the failed grab
+	_grabbing: Optional[set[str]] = None # gizmos which are currently being produced
+	_reentries = 0 # number of times a gizmo was requested while it was being produced (ie. loops)
+
+	def __init__(self, *args, cache_failures: bool = None, **kwargs):
+		"""
+		Initializes a new instance of the CacheGame class.
+
+		Args:
+			cache_failures (Optional[bool]): Whether to cache all failed grabs (defaults to the class setting).
+		"""
+		super().__init__(*args, **kwargs)
+		if cache_failures is not None:
+			self._cache_failures = cache_failures
 
 	def __setitem__(self, key, value):
 		"""
@@ -106,6 +129,8 @@ class CacheGame(GameBase, UserDict):
 		"""
 		if self._gizmo_type is not None:
 			key = self._gizmo_type(key)
+		if self._failures and (self._grabbing is None or key not in self._grabbing):
+			self._failures.clear()
 		self.set_cache(key, value)
 
 	def set_cache(self, gizmo: str, val: Any):
@@ -162,11 +187,28 @@ class CacheGame(GameBase, UserDict):
 
 	def clear_cache(self: Self) -> Self:
 		"""
-		Clears the cache.
+		Clears the cache (including failures).
 		"""
 		self.data.clear()
+		self.forget_failures()
+		return self
+
+	def forget_failures(self: Self) -> Self:
+		"""
+		Clears the cached failures, so the next grab of those gizmos is attempted again.
+		"""
+		if self._failures:
+			self._failures.clear()
 		return self
 
+	def extend(self: Self, gadgets: Iterable[AbstractGadget]) -> Self:
+		self.forget_failures()
+		return super().extend(gadgets)
+
+	def exclude(self: Self, *gadgets: AbstractGadget) -> Self:
+		self.forget_failures()
+		return super().exclude(*gadgets)
+
 	def _cache_miss(self, ctx: Optional[AbstractGame], gizmo: str) -> Any:
 		"""
 		Handles a cache miss.
@@ -192,10 +234,64 @@ class CacheGame(GameBase, UserDict):
 		"""
 		if gizmo in self.data:
 			return self.data[gizmo]
-		val = self._cache_miss(ctx, gizmo)
-		self[gizmo] = val  # cache packaged val
+		if self._failures and gizmo in self._failures:
+			raise self._fresh_failure(self._failures[gizmo])
+
+		if self._grabbing is None:
+			self._grabbing = set()
+		reentrant = gizmo in self._grabbing
+		if reentrant:
+			self._reentries += 1
+		else:
+			self._grabbing.add(gizmo)
+		reentries = self._reentries
+		try:
+			val = self._cache_miss(ctx, gizmo)
+			self[gizmo] = val  # cache packaged val
+		except AbstractGadgetError as error:
+			# failures are only stable if they don't depend on partial results (loops) or an outside context
+			if ((self._cache_failures or self._missing_gadget(error, gizmo))
+					and not reentrant and reentries == self._reentries and (ctx is None or ctx is self)):
+				if self._failures is None:
+					self._failures = {}
+				self._failures[gizmo] = self._fresh_failure(error)
+			raise
+		finally:
+			if not reentrant:
+				self._grabbing.discard(gizmo)
 		return val
 
+	@staticmethod
+	def _missing_gadget(error: AbstractGadgetError, gizmo: str) -> bool:
+		"""
+		Checks if a failure only means that there is no gadget for the gizmo (which can't change until gadgets do).
+
+		Args:
+			error (AbstractGadgetError): The failure of the grab.
+			gizmo (str): The name of the gizmo that was grabbed.
+
+		Returns:
+			bool: True if the failure is a missing gadget for the gizmo itself, False otherwise.
+		"""
+		while isinstance(error, GrabError) and error.gizmo == gizmo:
+			error = error.error
+		return isinstance(error, MissingGadget) and error.gizmo == gizmo
+
+	@staticmethod
+	def _fresh_failure(error: AbstractGadgetError) -> AbstractGadgetError:
+		"""
+		Copies a failure without its traceback, so cached failures are never raised (and modified) themselves.
+
+		Args:
+			error (AbstractGadgetError): The failure to copy.
+
+		Returns:
+			AbstractGadgetError: A new instance of the same type with the same arguments and attributes.
+		"""
+		fresh = error.__class__.__new__(error.__class__, *error.args)
+		fresh.__dict__.update(error.__dict__)
+		return fresh
+
 
 
 class GatedCache(CacheGame): # TODO: rename to GangCache
@@ -204,6 +300,8 @@ class GatedCache(CacheGame): # TODO: rename to GangCache
 
 	Attributes:
 		_gate_cache (dict): A dictionary to store gate caches.
+		_gate_index (dict): A reverse index from external gizmo names to the (gate, internal gizmo) entries of the
+		gate caches, which is maintained by `update_gate_cache` so lookups are constant time.
 	"""
 
 	def __init__(self, *args, gate_cache=None, **kwargs):
@@ -219,6 +317,33 @@ class GatedCache(CacheGame): # TODO: rename to GangCache
 			gate_cache = {}
 		super().__init__(*args, **kwargs)
 		self._gate_cache = gate_cache
+		self._gate_index = {}
+		self._gate_externals = {} # gate -> internal gizmo -> external gizmo (as indexed)
+		self._reindex_gate_caches()
+
+	def _index_gate_entry(self, gate: AbstractGang, internal: str):
+		external = gate.gizmo_to(internal)
+		self._gate_externals.setdefault(gate, {})[internal] = external
+		if external is not None:
+			self._gate_index.setdefault(external, []).append((gate, internal))
+
+	def _unindex_gate(self, gate: AbstractGang):
+		for internal, external in self._gate_externals.pop(gate, {}).items():
+			entries = self._gate_index.get(external)
+			if entries is not None:
+				entries[:] = [entry for entry in entries if entry[0] is not gate]
+				if not entries:
+					del self._gate_index[external]
+
+	def _reindex_gate_caches(self):
+		"""
+		Rebuilds the index of the gate caches (eg. after the external names of the gates changed).
+		"""
+		self._gate_index.clear()
+		self._gate_externals.clear()
+		for gate, cache in self._gate_cache.items():
+			for internal in cache:
+				self._index_gate_entry(gate, internal)
 
 	def is_cached(self, gizmo: str) -> bool:
 		"""
@@ -230,13 +355,7 @@ class GatedCache(CacheGame): # TODO: rename to GangCache
 		Returns:
 			bool: True if the gizmo is cached, False otherwise.
 		"""
-		if super().is_cached(gizmo):
-			return True
-		for gate, cache in self._gate_cache.items():
-			for key in cache:
-				if gate.gizmo_to(key) == gizmo:
-					return True
-		return False
+		return super().is_cached(gizmo) or gizmo in self._gate_index
 
 	def cached(self) -> Iterator[str]:
 		"""
@@ -245,13 +364,19 @@ class GatedCache(CacheGame): # TODO: rename to GangCache
 		Returns:
 			Iterator[str]: An iterator over the cached gizmos.
 		"""
-		def _gate_cached():
-			for gate, cache in self._gate_cache.items():
-				for internal in cache:
-					external = gate.gizmo_to(internal)
-					if external is not None:
-						yield external
-		yield from filter_duplicates(super().cached(), _gate_cached())
+		yield from filter_duplicates(super().cached(), self._gate_index.keys())
+
+	def gate_cache(self, gate: AbstractGang) -> Mapping[str, Any]:
+		"""
+		Returns the cache of a gate (using internal gizmo names), which is empty if nothing has been cached yet.
+
+		Args:
+			gate (AbstractGang): The gate whose cache to return.
+
+		Returns:
+			Mapping[str, Any]: The cached values of the gate.
+		"""
+		return self._gate_cache.get(gate, {})
 
 	def check_gate_cache(self, gate: AbstractGang, gizmo: str):
 		"""
@@ -277,7 +402,25 @@ class GatedCache(CacheGame): # TODO: rename to GangCache
 		"""
 		if self._gizmo_type is not None:
 			gizmo = self._gizmo_type(gizmo)
-		self._gate_cache.setdefault(gate, {})[gizmo] = val
+		cache = self._gate_cache.get(gate)
+		if cache is None:
+			cache = self._gate_cache[gate] = {}
+			register = getattr(gate, '_add_gate_holder', None)
+			if register is not None:
+				register(self) # so the cache is invalidated when the gate is relabeled
+		if gizmo not in cache:
+			self._index_gate_entry(gate, gizmo)
+		cache[gizmo] = val
+
+	def clear_gate_cache(self, gate: AbstractGang) -> None:
+		"""
+		Clears the cache of a single gate.
+
+		Args:
+			gate (AbstractGang): The gate whose cache to clear.
+		"""
+		self._gate_cache.pop(gate, None)
+		self._unindex_gate(gate)
 
 	def clear_cache(self, *, clear_gate_caches=True, **kwargs) -> None:
 		"""
@@ -289,6 +432,8 @@ class GatedCache(CacheGame): # TODO: rename to GangCache
 		super().clear_cache(**kwargs)
 		if clear_gate_caches:
 			self._gate_cache.clear()
+			self._gate_index.clear()
+			self._gate_externals.clear()
 
 
 
@@ -318,6 +463,26 @@ class TraceGame(CacheGame):
 			self.purge(dep)
 		return self
 
+	def _resolution_parents(self, gizmo: str) -> Iterable[str]:
+		"""
+		Lists the parents of a gizmo using the gadget that would be tried first (if it exposes its genes).
+
+		Args:
+			gizmo (str): The name of the gizmo.
+
+		Returns:
+			Iterable[str]: The parents of the gizmo (empty if unknown).
+		"""
+		try:
+			for vendor in self._gadgets(gizmo):
+				if isinstance(vendor, AbstractGenetic):
+					for gene in vendor.genes(gizmo):
+						return gene.parents or ()
+				return ()
+		except AbstractGadgetError:
+			pass
+		return ()
+
 	def _cache_miss(self, ctx: Optional[AbstractGame], gizmo: str) -> Any:
 		self._partial_grabs.append(gizmo)
 		try:
@@ -337,6 +502,247 @@ class TraceGame(CacheGame):
 
 
 
+class IterativeGame(TraceGame):
+	"""
+	The IterativeGame class is a subclass of TraceGame. It can optionally resolve the missing ancestors of a gizmo
+	with an explicit stack over the gene graph before grabbing it, so arbitrarily deep chains of gadgets don't
+	recurse (and don't run into the recursion limit).
+
+	The ancestors are grabbed in the same order (and while tracing the same partial grabs) as the recursive grab
+	would, so results and caching are identical. Any ancestor that fails (eg. a missing optional input) is left to
+	the usual recursive grab of its consumer to keep its error semantics, while the rest of the ancestry is still
+	resolved iteratively.
+
+	Attributes:
+		_iterative_resolution (bool): Whether to resolve ancestors iteratively. Defaults to False.
+	"""
+	_iterative_resolution = False
+	_resolving = False
+
+	def __init__(self, *args, iterative: bool = None, **kwargs):
+		"""
+		Initializes a new instance of the IterativeGame class.
+
+		Args:
+			iterative (Optional[bool]): Whether to resolve ancestors iteratively (defaults to the class setting).
+		"""
+		super().__init__(*args, **kwargs)
+		if iterative is not None:
+			self._iterative_resolution = iterative
+
+	def _resolve_ancestors(self, gizmo: str) -> None:
+		"""
+		Grabs all missing ancestors of the given gizmo bottom-up (depth-first, parents in order).
+
+		Args:
+			gizmo (str): The name of the gizmo whose ancestors to grab.
+		"""
+		self._resolving = True
+		depth = len(self._partial_grabs)
+		visiting = {gizmo}
+		stack = [(gizmo, iter(self._resolution_parents(gizmo)))]
+		try:
+			while stack:
+				current, parents = stack[-1]
+				for parent in parents:
+					if parent not in visiting and not self.is_cached(parent):
+						visiting.add(parent)
+						self._partial_grabs.append(current) # the parent is grabbed while producing `current`
+						stack.append((parent, iter(self._resolution_parents(parent))))
+						break
+				else:
+					stack.pop()
+					if stack:
+						try:
+							self.grab_from(None, current)
+						except AbstractGadgetError:
+							pass # the consumer's grab will fail the same way (or recover, eg. using a default value)
+						finally:
+							self._partial_grabs.pop()
+		finally:
+			del self._partial_grabs[depth:]
+			self._resolving = False
+
+	def grab_from(self, ctx: Optional[AbstractGame], gizmo: str) -> Any:
+		"""
+		Tries to grab a gizmo from the context, resolving its ancestors iteratively first (if enabled).
+
+		Args:
+			ctx (Optional[AbstractGame]): The context from which to grab the gizmo.
+			gizmo (str): The name of the gizmo to grab.
+
+		Returns:
+			Any: The grabbed gizmo.
+		"""
+		if self._iterative_resolution and not self._resolving and not self.is_cached(gizmo):
+			self._resolve_ancestors(gizmo)
+		return super().grab_from(ctx, gizmo)
+
+
+
+class TransientGame(TraceGame):
+	"""
+	The TransientGame class is a subclass of TraceGame. Gizmos (or all gizmos of some gadgets) can be marked as
+	transient, in which case they are only cached as long as they are still needed for the gizmo that is currently
+	being grabbed (eg. large intermediate results in a pipeline).
+
+	When a gizmo is grabbed from the outside, the gene graph is used to count the remaining consumers of each missing
+	ancestor, and a transient intermediate is dropped as soon as its last consumer was produced. Any transient
+	intermediates that are left over (eg. if a consumer failed or used a different gadget) are dropped when the grab
+	is done. The requested gizmo itself, as well as values that were already cached before the grab, are never
+	dropped. If a dropped gizmo is needed again, it is just recomputed.
+
+	Since each grab is planned on its own, a transient parent shared by several requested gizmos would be computed
+	once per request. To avoid that, request them together with `grab_many` (or grab them inside a `targets` block),
+	so the consumers are counted across all of them.
+
+	Attributes:
+		_transient (set[str]): The transient gizmos. Defaults to none.
+	"""
+	_transient: set[str] = frozenset()
+	_pending_consumers: Optional[dict[str, int]] = None # transient gizmo -> number of consumers that have yet to run
+	_planned_parents: Optional[dict[str, tuple[str, ...]]] = None # gizmo -> parents (for the current grab)
+	_transient_products: Optional[set[str]] = None # transient gizmos produced during the current grab
+
+	def __init__(self, *args, transient: Iterable[Union[str, AbstractGadget]] = None, **kwargs):
+		"""
+		Initializes a new instance of the TransientGame class.
+
+		Args:
+			transient (Optional[Iterable[Union[str, AbstractGadget]]]): Gizmos (or gadgets) to mark as transient.
+		"""
+		super().__init__(*args, **kwargs)
+		if transient is not None:
+			self.mark_transient(*transient)
+
+	def mark_transient(self: Self, *items: Union[str, AbstractGadget]) -> Self:
+		"""
+		Marks gizmos as transient. For gadgets, all gizmos they produce are marked.
+
+		Args:
+			*items (Union[str, AbstractGadget]): The gizmos or gadgets to mark.
+		"""
+		self._transient = set(self._transient)
+		for item in items:
+			if isinstance(item, AbstractGadget):
+				self._transient.update(item.gizmos())
+			else:
+				self._transient.add(item)
+		return self
+
+	def is_transient(self, gizmo: str) -> bool:
+		"""
+		Checks if a gizmo is transient.
+
+		Args:
+			gizmo (str): The name of the gizmo to check.
+
+		Returns:
+			bool: True if the gizmo is transient, False otherwise.
+		"""
+		return gizmo in self._transient
+
+	def _plan_consumers(self, *gizmos: str) -> None:
+		"""
+		Counts the consumers of all transient ancestors that are missing to produce the given gizmos.
+
+		Args:
+			*gizmos (str): The names of the requested gizmos.
+		"""
+		planned, pending = {}, {}
+		stack = list(gizmos)
+		while stack:
+			current = stack.pop()
+			if current in planned or current in self.data:
+				continue
+			planned[current] = parents = tuple(filter_duplicates(self._resolution_parents(current)))
+			for parent in parents:
+				if parent in self._transient and parent not in gizmos:
+					pending[parent] = pending.get(parent, 0) + 1
+				stack.append(parent)
+		self._planned_parents, self._pending_consumers = planned, pending
+		self._transient_products = set()
+
+	def _drop_transients(self, *gizmos: str) -> None:
+		"""
+		Drops the transient intermediates left over from the current plan (except the requested gizmos).
+
+		Args:
+			*gizmos (str): The names of the requested gizmos.
+		"""
+		for leftover in self._transient_products:
+			if leftover not in gizmos:
+				self.data.pop(leftover, None)
+		self._planned_parents = self._pending_consumers = self._transient_products = None
+
+	@contextmanager
+	def targets(self, *gizmos: str) -> Iterator[Self]:
+		"""
+		Plans the transient intermediates for all the given gizmos at once, so any grabs within the block share them
+		(and they are only dropped when the block ends, if not before).
+
+		Args:
+			*gizmos (str): The names of the gizmos that will be grabbed.
+
+		Returns:
+			Iterator[Self]: this game (for use in a `with` statement).
+		"""
+		if not self._transient or self._pending_consumers is not None or len(self._partial_grabs):
+			yield self
+			return
+		self._plan_consumers(*gizmos)
+		try:
+			yield self
+		finally:
+			self._drop_transients(*gizmos)
+
+	def grab_many(self, *gizmos: str) -> list[Any]:
+		"""
+		Grabs several gizmos, where transient intermediates needed by more than one of them are only computed once.
+
+		Args:
+			*gizmos (str): The names of the gizmos to grab.
+
+		Returns:
+			list[Any]: The grabbed gizmos (in the same order).
+		"""
+		with self.targets(*gizmos):
+			return [self.grab(gizmo) for gizmo in gizmos]
+
+	def _cache_miss(self, ctx: Optional[AbstractGame], gizmo: str) -> Any:
+		val = super()._cache_miss(ctx, gizmo)
+		if self._pending_consumers is not None:
+			if gizmo in self._pending_consumers:
+				self._transient_products.add(gizmo)
+			for parent in self._planned_parents.get(gizmo, ()):
+				if parent in self._pending_consumers:
+					self._pending_consumers[parent] -= 1
+					if self._pending_consumers[parent] <= 0 and parent in self._transient_products:
+						self.data.pop(parent, None)
+		return val
+
+	def grab_from(self, ctx: Optional[AbstractGame], gizmo: str) -> Any:
+		"""
+		Tries to grab a gizmo from the context, dropping transient intermediates as soon as they are not needed.
+
+		Args:
+			ctx (Optional[AbstractGame]): The context from which to grab the gizmo.
+			gizmo (str): The name of the gizmo to grab.
+
+		Returns:
+			Any: The grabbed gizmo.
+		"""
+		if (not self._transient or self._pending_consumers is not None or len(self._partial_grabs)
+				or gizmo in self.data):
+			return super().grab_from(ctx, gizmo)
+		self._plan_consumers(gizmo)
+		try:
+			return super().grab_from(ctx, gizmo)
+		finally:
+			self._drop_transients(gizmo)
+
+
+
 class RollingGame(TraceGame, MutableGaggle):
 	def __init__(self, *args, **kwargs):
 		super().__init__(*args, **kwargs)
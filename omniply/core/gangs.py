@@ -1,4 +1,5 @@
 from typing import Any, Optional, Iterator, Iterable, Mapping, Type, Union
+import weakref
 
 from .abstract import AbstractGang, AbstractGame, AbstractGadget
 from .gadgets import GadgetBase
@@ -87,6 +88,8 @@ class MechanismBase(GangBase):
 		self._gang_stack = [] # of external contexts
 		self._exclusive = exclusive
 		self._insulated = insulated
+		self._relabel_routes = {} # internal gizmo -> compiled route through the parent gangs (see `_fallback_route`)
+		self._relabel_version = 0 # incremented whenever the gadgets change to invalidate compiled routes
 
 	def gizmo_to(self, internal: str) -> Optional[str]:
 		"""
@@ -118,6 +121,94 @@ class MechanismBase(GangBase):
 				yield req
 
 
+	def _relabeled(self) -> None:
+		"""
+		Called whenever the internal or external gizmo names of this gang change (eg. when a gauge is applied).
+		"""
+		self._relabel_version += 1
+
+
+	def extend(self, gadgets: Iterable[AbstractGadget]):
+		self._relabel_version += 1
+		return super().extend(gadgets)
+
+
+	def exclude(self, *gadgets: AbstractGadget):
+		self._relabel_version += 1
+		return super().exclude(*gadgets)
+
+
+	def _parent_gangs(self) -> Optional[tuple[tuple['MechanismBase', ...], AbstractGame]]:
+		"""
+		The chain of (currently active) parent gangs and the outermost context, or None if any gang was entered
+		more than once (in which case the parents are tried one by one).
+		"""
+		if len(self._gang_stack) != 1:
+			return None
+		gangs = []
+		parent = self._gang_stack[0]
+		while isinstance(parent, MechanismBase):
+			if len(parent._gang_stack) != 1:
+				return None
+			gangs.append(parent)
+			parent = parent._gang_stack[0]
+		return tuple(gangs), parent
+
+
+	def _fallback_route(self, internal: str, gangs: tuple['MechanismBase', ...]):
+		"""
+		Composes the relabeling of all parent gangs for a gizmo that can't be produced internally. For every parent
+		gang the route contains the relabeled gizmo, whether that gang can produce it, the name under which the
+		gang's parent may have it cached, and whether the gang is insulated, followed by the name in the outermost
+		context (or None if it is not accessible). Routes are compiled once per chain of gangs and gizmo.
+		"""
+		versions = tuple(gang._relabel_version for gang in gangs)
+		known = self._relabel_routes.get(internal)
+		if known is not None and known[1] == versions and all(a is b for a, b in zip(known[0], gangs)) \
+				and len(known[0]) == len(gangs):
+			return known[2]
+
+		steps = []
+		name = internal
+		final = None
+		for gang in gangs:
+			requested = name
+			name = gang._internal_map.get(requested, requested)
+			stop = gang._insulated and requested not in gang._internal_map
+			steps.append((name, name in gang._gizmos(), gang.gizmo_to(name), stop))
+			if stop:
+				break
+		else:
+			final = name
+		route = steps, final
+		self._relabel_routes[internal] = gangs, versions, route
+		return route
+
+
+	def _grab_from_parents(self, internal: str, gangs: tuple['MechanismBase', ...], top: AbstractGame) -> Any:
+		"""
+		Grabs a gizmo that can't be produced internally from the parent gangs or the outermost context following the
+		compiled route, so no intermediate gang has to be entered just to fail.
+		"""
+		steps, final = self._fallback_route(internal, gangs)
+		for i, (name, gives, ext, stop) in enumerate(steps):
+			gang = gangs[i]
+			if gives:
+				try:
+					return gang._grab(name)
+				except (self._GadgetFailure, self._MissingGadgetError):
+					if stop:
+						raise
+			else:
+				parent = gangs[i + 1] if i + 1 < len(gangs) else top
+				if (ext is not None and isinstance(gang, CachableMechanism) and isinstance(parent, CacheGame)
+						and parent.is_cached(ext)):
+					return parent.grab(ext)
+				if stop:
+					raise self._MissingGadgetError(name)
+		return top.grab(final)
+
+
 	def _grab(self, internal: str) -> Any:
 		"""
 		Internal grab the gizmo
@@ -144,19 +235,26 @@ class MechanismBase(GangBase):
 			internal = self._internal_map.get(gizmo, gizmo)
 			try:
 				out = self._grab(internal)
-			except (self._GadgetFailure, self._MissingGadgetError):
+			except (self._GadgetFailure, self._MissingGadgetError) as error:
 				# default to parent/s
 				if self._insulated and gizmo not in self._internal_map:
 					raise
-				for parent in reversed(self._gang_stack):
-					try:
-						out = parent.grab(internal)
-					except self._GadgetFailure:
-						pass
+				chain = self._parent_gangs() if len(self._gang_stack) else None
+				if chain is None:
+					for parent in reversed(self._gang_stack):
+						try:
+							out = parent.grab(internal)
+						except self._GadgetFailure:
+							pass
+						else:
+							break
 					else:
-						break
+						raise
 				else:
-					raise
+					try:
+						out = self._grab_from_parents(internal, *chain)
+					except self._GadgetFailure:
+						raise error
 
 		else: # was called from an external context
 			self._gang_stack.append(ctx)
@@ -195,7 +293,47 @@ class GateBase(MechanismBase):
 
 
 class CachableMechanism(MechanismBase):
+	"""
+	Caches the internal gizmos of the mechanism in the innermost external `GatedCache` (its owner), which is tracked
+	for every external grab, so neither lookups nor updates need to search the external contexts.
+
+	When the mechanism is relabeled, its gate caches are cleared in all gated caches (since both the internal names
+	used as keys and the external names they are indexed by may have changed).
+	"""
 	_GateCacheMiss = KeyError # TODO: create a dedicated subclass for this exception
+	def __init__(self, *args, **kwargs):
+		super().__init__(*args, **kwargs)
+		self._gate_owners = [] # innermost gated cache of each external context in the gang stack
+		self._gate_holders = weakref.WeakValueDictionary() # id -> gated cache that has a gate cache of this mechanism
+
+
+	def _add_gate_holder(self, holder: GatedCache) -> None:
+		"""Registers a gated cache which stores a gate cache of this mechanism (see `GatedCache.update_gate_cache`)."""
+		self._gate_holders[id(holder)] = holder
+
+
+	def _relabeled(self) -> None:
+		super()._relabeled()
+		for holder in list(self._gate_holders.values()):
+			holder.clear_gate_cache(self)
+		self._gate_holders.clear()
+
+
+	def _gate_owner(self) -> Optional[GatedCache]:
+		"""The gated cache which stores the gate cache of this mechanism for the current grab (if any)."""
+		return self._gate_owners[-1] if len(self._gate_owners) else None
+
+
+	def grab_from(self, ctx: AbstractGame, gizmo: str) -> Any:
+		if ctx is None or ctx is self:
+			return super().grab_from(ctx, gizmo)
+		self._gate_owners.append(ctx if isinstance(ctx, GatedCache) else self._gate_owner())
+		try:
+			return super().grab_from(ctx, gizmo)
+		finally:
+			self._gate_owners.pop()
+
+
 	def _grab(self, gizmo: str) -> Any:
 		"""
 		Tries to grab a gizmo from the gang using the caches
@@ -209,28 +347,28 @@ class CachableMechanism(MechanismBase):
 		Returns:
 			Any: The grabbed gizmo.
 		"""
+		owner = self._gate_owner()
 		if len(self._gang_stack):
-			# check cache (if one exists)
+			# check my cache in the owner (if one exists)
+			if owner is not None:
+				cache = owner.gate_cache(self)
+				if gizmo in cache:
+					return cache[gizmo]
+			# if it can't be found in my cache, check the innermost caches using the external gizmo name
 			ext = self.gizmo_to(gizmo)
-			for parent in reversed(self._gang_stack):
-				if isinstance(parent, GatedCache):
-					try:
-						return parent.check_gate_cache(self, gizmo)
-					except self._GateCacheMiss:
-						pass
-				# if it can't be found in my cache, check the cache using the external gizmo name
-				if ext is not None and isinstance(parent, CacheGame) and parent.is_cached(ext):
+			if ext is not None:
+				parent = self._gang_stack[-1]
+				if parent is not owner and isinstance(parent, CacheGame) and parent.is_cached(ext):
 					return parent.grab(ext)
+				if owner is not None and owner.is_cached(ext):
+					return owner.grab(ext)
 
 		# if it can't be found in any cache, grab it from my gadgets
 		out = super()._grab(gizmo)
 
 		# update my cache
-		if len(self._gang_stack):
-			for parent in reversed(self._gang_stack):
-				if isinstance(parent, GatedCache):
-					parent.update_gate_cache(self, gizmo, out)
-					break
+		if owner is not None:
+			owner.update_gate_cache(self, gizmo, out)
 
 		return out
 
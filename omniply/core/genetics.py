@@ -116,11 +116,11 @@ class GeneticBase(AbstractGenetic):
 
 
 	def _genetic_information(self, gizmo: str):
-		return {'name': gizmo, 'gadget': self}
+		return {'name': gizmo, 'source': self}
 
 
-	def genes(self, gizmo: str) -> AbstractGene:
-		return self._Gene(**self._genetic_information(gizmo))
+	def genes(self, gizmo: str) -> Iterator[AbstractGene]:
+		yield self._Gene(**self._genetic_information(gizmo))
 
 
 
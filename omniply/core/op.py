@@ -3,8 +3,8 @@ from .abstract import AbstractGadget, AbstractGaggle, AbstractGame, AbstractGang
 from .errors import GadgetFailed, MissingGadget
 from .tools import ToolCraftBase, AutoToolCraft, MIMOToolDecorator, AutoToolDecorator
 from .gizmos import DashGizmo
-from .gaggles import MutableGaggle, LoopyGaggle, CraftyGaggle, MutableCrafty
-from .games import CacheGame, GatedCache, TraceGame, RollingGame, ConsistentGame
+from .gaggles import MutableGaggle, LoopyGaggle, AdaptiveGaggle, CraftyGaggle, MutableCrafty
+from .games import CacheGame, GatedCache, TraceGame, RollingGame, ConsistentGame, IterativeGame, TransientGame
 from .gangs import CachableMechanism, GateBase
 from .genetics import GeneticGaggle
 
@@ -64,7 +64,16 @@ class ToolKit(LoopyGaggle, MutableGaggle, CraftyGaggle, GeneticGaggle):
 		self._process_crafts()
 
 
-class Context(GatedCache, ConsistentGame, RollingGame, LoopyGaggle, MutableGaggle, GeneticGaggle, AbstractGame):
+
+class AdaptiveToolKit(AdaptiveGaggle, ToolKit):
+	"""
+	A ToolKit which reorders the vendors of its interchangeable gizmos based on their observed performance
+	(see `AdaptiveGaggle`), eg. to share the statistics between many short-lived instances.
+	"""
+
+
+class Context(GatedCache, ConsistentGame, RollingGame, TransientGame, IterativeGame, AdaptiveGaggle, MutableGaggle,
+			  GeneticGaggle, AbstractGame):
 	"""
 	The Context class is a subclass of GateCache, LoopyGaggle, MutableGaggle, and AbstractGame. It provides methods to handle
 	gadgets in a context.
@@ -91,9 +100,11 @@ class Context(GatedCache, ConsistentGame, RollingGame, LoopyGaggle, MutableGaggl
 
 
 	def gabel(self, *args, **kwargs):
-		'''effectively a shallow copy, excluding the cache'''
+		'''effectively a shallow copy, excluding the cache (but sharing the vendor statistics)'''
 		new = self.__class__(*args, **kwargs)
 		new.extend(self.vendors())
+		if 'vendor_stats' not in kwargs:
+			new.share_vendor_stats(self)
 		return new
 
 
@@ -1,3 +1,4 @@
+from .errors import GrabError
 from .op import tool, ToolKit, Context, Mechanism, Gate
 
 
@@ -373,6 +374,53 @@ def test_crafty_kit_inheritance():
 	assert ctx['w'] == 1002
 
 
+def test_craft_table():
+	table = _Kit2._craft_table()
+	assert _Kit2._craft_table() is table # compiled once per class
+
+	class _Kit4(_Kit2):
+		@tool('v')
+		def extra(self):
+			return -1
+
+	assert _Kit4._craft_table() is not table
+	assert len(_Kit4._craft_table()) == len(table) + 1
+	assert _Kit2._craft_table() is table
+
+	kit, other = _Kit2(), _Kit2()
+	assert list(kit.gizmos()) == list(other.gizmos())
+	assert all(a is not b for a, b in zip(kit.vendors(), other.vendors())) # skills are bound per instance
+
+	ctx = Context(_Kit4())
+	assert ctx['v'] == -1
+	ctx['x'] = 100
+	assert ctx['y'] == 111
+
+
+def _wide_kit(num_tools: int = 50):
+	"""A ToolKit subclass with `num_tools` independent tools (`g0`, `g1`, ...)."""
+	def make(i):
+		def f(self):
+			return i
+		return f
+	return type(f'_Kit{num_tools}', (ToolKit,), {f'f{i}': tool(f'g{i}')(make(i)) for i in range(num_tools)})
+
+
+def benchmark_toolkit_instantiation(num_tools: int = 50, number: int = 1000) -> float:
+	"""Seconds per instantiation of a ToolKit with `num_tools` tools (run this module directly to print it)."""
+	import timeit
+	kit = _wide_kit(num_tools)
+	kit() # the craft table is compiled on first use
+	return min(timeit.repeat(kit, number=number, repeat=5)) / number
+
+
+def test_toolkit_instantiation_benchmark():
+	kit = _wide_kit(50)()
+	assert len(list(kit.gizmos())) == 50
+	assert Context(kit)['g49'] == 49
+	assert benchmark_toolkit_instantiation(number=10) > 0
+
+
 class _Kit3(ToolKit):
 	"""
 	The _Kit3 class is a subclass of ToolKit. It provides methods to handle gizmos 'a', 'b', 'c', and 'd'.
@@ -630,6 +678,74 @@ def test_gate_cache():
 	assert counter == 7  # Asserts that the counter is not incremented.
 
 
+def test_gate_cache_index():
+	calls = []
+
+	@tool('a')
+	def f(x):
+		calls.append('a')
+		return x + 1
+
+	gates = [Gate(f, gate={'a': f'a{i}', 'x': f'x{i}'}) for i in range(100)]
+	ctx = Context(*gates)
+	for i in range(100):
+		ctx[f'x{i}'] = i
+
+	assert not ctx.is_cached('a50')
+	assert ctx['a50'] == 51 and len(calls) == 1
+	assert ctx.is_cached('a50') and not ctx.is_cached('a')
+	assert ctx.gate_cache(gates[50]) == {'a': 51} and ctx.gate_cache(gates[0]) == {}
+	assert ctx['a50'] == 51 and len(calls) == 1 # cached in the gate cache of the context
+	assert [gizmo for gizmo in ctx.cached() if gizmo.startswith('a')] == ['a50']
+
+	gates[50]._relabeled() # eg. a gauge was applied to the gate
+	assert ctx.gate_cache(gates[50]) == {} and 'a50' not in ctx._gate_index
+	del ctx['a50']
+	assert not ctx.is_cached('a50') and ctx['a50'] == 51 and len(calls) == 2
+	calls.pop()
+
+	outer = Context(Gate(Gate(f, gate={'x': 'y'}), gate={'a': 'b'}))
+	outer['y'] = 10
+	assert outer['b'] == 11 and outer['b'] == 11 and len(calls) == 2
+	assert outer.is_cached('b')
+
+	ctx.clear_cache()
+	assert not ctx.is_cached('a50')
+
+
+def test_nested_gate_routes():
+	inner = tool('y')(lambda x: x + 1)
+	chain, gates = inner, []
+	for i in range(1, 6):
+		chain = Gate(chain, gate={('x' if i == 1 else f'x{i-1}'): f'x{i}'})
+		gates.append(chain)
+
+	ctx = Context(chain)
+	ctx['x5'] = 3
+	assert ctx['y'] == 4
+	steps, final = gates[0]._relabel_routes['x1'][2] # composed relabeling through all parent gates
+	assert [step[0] for step in steps] == ['x2', 'x3', 'x4', 'x5'] and final == 'x5'
+
+	gates[2].include(tool('x3')(lambda: 10)) # the compiled route is invalidated
+	ctx = Context(chain)
+	ctx['x5'] = 3
+	assert ctx['y'] == 11
+
+	w = tool('w')(lambda z: z)
+	ctx = Context(Gate(Gate(w, gate={'x': 'x1'}, insulated=False), insulated=False))
+	ctx['z'] = 2
+	assert ctx['w'] == 2
+
+	ctx = Context(Gate(Gate(w, gate={'x': 'x1'}, insulated=False), gate={'a': 'b'}), # insulated
+				  tool('z')(lambda: 2))
+	try:
+		ctx['w']
+	except GrabError:
+		pass
+	else:
+		raise AssertionError('insulated gate should not access z')
+
+
 def test_simple_gate():
 	class Tester(ToolKit):
 		@tool('out')
@@ -902,3 +1018,244 @@ def test_parents():
 
 
 
+
+
+
+def test_iterative_resolution():
+	gadgets = [tool('x0')(lambda: 0)]
+	for i in range(1, 3000):
+		gadgets.append(tool(f'x{i}')(eval(f'lambda x{i-1}: x{i-1} + 1')))
+
+	ctx = Context(*gadgets, iterative=True)
+	assert ctx['x2999'] == 2999
+	assert ctx.is_cached('x1500')
+
+	optional = [tool('x0')(lambda: 0)] # every step has a missing optional input
+	for i in range(1, 3000):
+		optional.append(tool(f'x{i}')(eval(f'lambda x{i-1}, opt=0: x{i-1} + 1 + opt')))
+
+	ctx = Context(*optional, iterative=True)
+	assert ctx['x2999'] == 2999
+	assert ctx.is_cached('x1500') and not ctx.is_cached('opt')
+
+	@tool('c')
+	def f(a, b, d=10):
+		return a + b + d
+
+	small = [tool('a')(lambda: 1), tool('b')(lambda a: a + 1), f]
+	rec, it = Context(*small), Context(*small, iterative=True)
+	assert rec['c'] == it['c'] == 13
+	assert list(rec.cached()) == list(it.cached())
+	assert rec._history == it._history and rec._products == it._products
+
+	it['a'] = 5 # purges the dependents just like the recursive version
+	assert it['c'] == 21
+
+	try:
+		Context(tool('y')(lambda missing: missing), iterative=True).grab('y')
+		assert False
+	except GrabError:
+		pass
+
+
+
+def test_failure_cache():
+	from .errors import GadgetFailed
+	calls = []
+
+	@tool('a')
+	def f():
+		calls.append('a')
+		raise GadgetFailed('not available')
+
+	@tool('b')
+	def g(a=1):
+		return a + 1
+
+	@tool('c')
+	def h(a=2):
+		return a + 2
+
+	ctx = Context(f, g, h)
+	assert ctx['b'] == 2 and ctx['c'] == 4
+	assert calls == ['a', 'a'] # failing gadgets are tried again by default
+
+	ctx = Context(f, g, h, cache_failures=True)
+	assert ctx['b'] == 2 and ctx['c'] == 4
+	assert calls == ['a', 'a', 'a'] # the second miss is cached
+
+	ctx['x'] = 10 # changing the cache forgets the failures
+	assert ctx.grab('a', None) is None
+	assert calls == ['a', 'a', 'a', 'a']
+
+	ctx = Context(g)
+	assert ctx['b'] == 2
+	assert 'a' in ctx._failures # missing gadgets are always cached
+	errors = []
+	for _ in range(2):
+		try:
+			ctx.grab('a')
+		except GrabError as error:
+			errors.append(error)
+	assert len(errors) == 2 and errors[0] is not errors[1] and errors[0].gizmo == 'a'
+	assert all(error is not ctx._failures['a'] for error in errors) and ctx._failures['a'].__traceback__ is None
+
+	ctx.include(tool('a')(lambda: 5)) # so does adding gadgets
+	ctx.clear_cache()
+	assert ctx['b'] == 6
+
+	state = {'ok': False}
+
+	@tool('y')
+	def recovering():
+		if not state['ok']:
+			raise GadgetFailed('not yet')
+		return 1
+
+	ctx = Context(recovering)
+	assert ctx.grab('y', None) is None
+	state['ok'] = True
+	assert ctx['y'] == 1
+
+
+
+def test_adaptive_vendors():
+	import time
+	from .errors import GadgetFailed
+	from .op import AdaptiveToolKit
+	calls = []
+
+	@tool('x')
+	def slow():
+		calls.append('slow')
+		return 1
+
+	@tool('x')
+	def flaky():
+		calls.append('flaky')
+		raise GadgetFailed('not available')
+
+	ctx = Context(flaky, slow)
+	for _ in range(5):
+		assert ctx['x'] == 1
+		ctx.clear_cache()
+	assert calls == ['flaky', 'slow'] * 5 # by default the precedence is fixed
+
+	calls.clear()
+	ctx = Context(flaky, slow, adaptive={'x'})
+	for _ in range(10):
+		assert ctx['x'] == 1
+		ctx.clear_cache()
+	assert calls[:2] == ['flaky', 'slow'] and calls[-2:] == ['slow', 'slow'] # the flaky vendor is deprioritized
+
+	best, worst = ctx.vendor_stats('x')
+	assert best.vendor is slow and best.successes == best.attempts
+	assert worst.vendor is flaky and worst.successes == 0 and worst.success_rate < best.success_rate
+	assert ctx.vendor_stats('y') == []
+
+	calls.clear()
+	fresh = ctx.gabel() # spawned contexts share the statistics (and adaptive gizmos)
+	other = Context(flaky, slow, adaptive={'x'}, vendor_stats=ctx._vendor_stats)
+	assert fresh['x'] == 1 and other['x'] == 1
+	assert calls == ['slow', 'slow']
+	assert fresh._vendor_stats is other._vendor_stats is ctx._vendor_stats
+
+	calls.clear()
+	kit = AdaptiveToolKit(flaky, slow, adaptive={'x'})
+	for _ in range(10):
+		assert Context(kit)['x'] == 1 # the statistics are kept by the kit, not the short-lived contexts
+	assert calls[:2] == ['flaky', 'slow'] and calls[-2:] == ['slow', 'slow']
+	assert [stats.vendor for stats in kit.vendor_stats('x')] == [slow, flaky]
+
+	@tool('dep')
+	def expensive():
+		time.sleep(0.02)
+		return 1
+
+	@tool('y')
+	def cheap(dep):
+		return dep + 1
+
+	ctx = Context(expensive, cheap, adaptive={'y'})
+	assert ctx['y'] == 2
+	stats, = ctx.vendor_stats('y')
+	assert stats.total_time < 0.01 # producing the dependency is not attributed to the vendor
+
+
+
+def test_transient_gizmos():
+	seen = []
+
+	@tool('a')
+	def f(x):
+		return x + 1
+
+	@tool('b')
+	def g(a):
+		seen.append(sorted(ctx.cached()))
+		return a * 2
+
+	@tool('c')
+	def h(a, b):
+		return a + b
+
+	@tool('d')
+	def k(c):
+		seen.append(sorted(ctx.cached()))
+		return -c
+
+	ctx = Context(f, g, h, k, transient=['a', 'b'])
+	ctx['x'] = 1
+	assert ctx['d'] == -6
+	assert seen == [['a', 'x'], ['c', 'x']] # both are dropped as soon as `c` was produced
+	assert list(ctx.cached()) == ['x', 'c', 'd']
+
+	assert ctx['b'] == 4 # recomputed on demand, and kept since it was requested
+	assert ctx.is_cached('b') and not ctx.is_cached('a')
+
+	ctx = Context(f, g, h, transient=[g])
+	ctx['x'] = 1
+	assert ctx.is_transient('b') and not ctx.is_transient('a')
+	assert ctx['c'] == 6 and list(ctx.cached()) == ['x', 'a', 'c']
+
+	ctx = Context(f, g, h)
+	ctx['x'] = 1
+	assert ctx['c'] == 6 and list(ctx.cached()) == ['x', 'a', 'b', 'c'] # by default everything is kept
+
+	calls = []
+
+	@tool('a')
+	def shared(x):
+		calls.append('a')
+		return x + 1
+
+	@tool('b')
+	def first(a):
+		return a * 2
+
+	@tool('c')
+	def second(a):
+		return a * 3
+
+	ctx = Context(shared, first, second, transient=['a'])
+	ctx['x'] = 1
+	assert ctx['b'] == 4 and ctx['c'] == 6
+	assert calls == ['a', 'a'] # planned separately, so the transient parent is recomputed
+
+	calls.clear()
+	ctx = Context(shared, first, second, transient=['a'])
+	ctx['x'] = 1
+	assert ctx.grab_many('b', 'c') == [4, 6]
+	assert calls == ['a'] and list(ctx.cached()) == ['x', 'b', 'c']
+
+	calls.clear()
+	ctx = Context(shared, first, second, transient=['a'])
+	ctx['x'] = 1
+	with ctx.targets('b', 'c'):
+		assert ctx['b'] == 4 and ctx.is_cached('a') # still needed for `c`
+		assert ctx['c'] == 6 and not ctx.is_cached('a')
+	assert calls == ['a'] and list(ctx.cached()) == ['x', 'b', 'c']
+
+
+if __name__ == '__main__':
+	print(f'ToolKit with 50 tools: {benchmark_toolkit_instantiation() * 1e6:.1f}us per instance')
@@ -22,6 +22,11 @@ class AbstractGeared(AbstractGadget):
 		raise NotImplementedError
 
 
+	def gear_context(self) -> Optional[AbstractGame]:
+		'''context to grab gears from when there are no mechanics (None to use a new context every time)'''
+		return None
+
+
 
 class AbstractMechanical(AbstractGadget):
 	'''gadget with synchronized gears'''
@@ -1,12 +1,11 @@
+import weakref
 from .imports import *
 from ..core.gaggles import MutableGaggle, CraftyGaggle
 from ..core.gangs import GangBase, MechanismBase
 from ..core import Context, ToolKit, Mechanism, Gate
 from .abstract import (AbstractMechanized, AbstractMechanics, AbstractMechanical,
 					   AbstractGearbox, AbstractGeared, AbstractGear)
-from .gears import GearCraft, GearFailed
-
-# TODO: include a back reference of Gearboxes to their owners (for exclude)
+from .gears import GearCraft, GearFailed, GearContext
 
 
 
@@ -18,22 +17,77 @@ class GearBox(ToolKit, AbstractGearbox):
 
 
 class MutableMechanics(MutableGaggle, AbstractMechanics):
-	'''A mutable gaggle that includes gearboxes from included gadgets that are geared'''
+	'''
+	A mutable gaggle that includes gearboxes from included gadgets that are geared. The gearbox added for each
+	owner is remembered, so the owner can be excluded later (even if its gearbox has been rebuilt since).
+	'''
+	_owned_gearboxes: dict[int, tuple[AbstractGeared, AbstractGearbox]] = None # id(owner) -> (owner, gearbox)
+
 	def extend(self, gadgets: Iterable[AbstractGadget]) -> Self:
-		return super().extend(gadget.gearbox() for gadget in gadgets if isinstance(gadget, AbstractGeared))
+		if self._owned_gearboxes is None:
+			self._owned_gearboxes = {}
+		gearboxes = []
+		for gadget in gadgets:
+			if isinstance(gadget, AbstractGeared) and id(gadget) not in self._owned_gearboxes:
+				gearbox = gadget.gearbox()
+				self._owned_gearboxes[id(gadget)] = gadget, gearbox
+				gearboxes.append(gearbox)
+		return super().extend(gearboxes)
 
 
 	def exclude(self, *gadgets: AbstractGadget) -> Self:
-		raise NotImplemented('not supported yet') # TODO
+		gearboxes = []
+		for gadget in gadgets:
+			owned = None if self._owned_gearboxes is None else self._owned_gearboxes.pop(id(gadget), None)
+			if owned is not None:
+				gearboxes.append(owned[1])
+		if gearboxes:
+			super().exclude(*gearboxes)
+			self._forget_gearboxes(gearboxes)
+		return self
+
+
+	def gearbox_owner(self, gearbox: AbstractGearbox) -> Optional[AbstractGeared]:
+		'''the gadget whose gears were added as `gearbox` (if any)'''
+		for owner, known in (self._owned_gearboxes or {}).values():
+			if known is gearbox:
+				return owner
+
+
+	def _forget_gearboxes(self, gearboxes: Iterable[AbstractGearbox]) -> None:
+		'''called after gearboxes were removed, eg. to invalidate cached values'''
+		pass
 
 
 
 class GearedGaggle(AbstractGeared, AbstractGaggle):
+	"""
+	Gaggle whose gearbox is built once and cached until its structure changes (including the structure of any
+	geared gaggles it contains). Without mechanics, gears are grabbed from a default context which is kept
+	alongside the cached gearbox, so gear values are memoized per instance.
+	"""
 	_GearFailed = GearFailed
 	_GearBox = GearBox
-	def gearbox(self, *args, **kwargs) -> AbstractGearbox:
-		return self._GearBox(*args, base=self, **kwargs).extend(
-			gadget.gearbox() for gadget in self.vendors() if isinstance(gadget, AbstractGeared))
+	_GearContext = GearContext
+	_gearbox_cache: Optional[AbstractGearbox] = None
+	_gear_context_cache: Optional[AbstractGame] = None
+	_gearbox_dependents: Optional[weakref.WeakValueDictionary] = None # gaggles whose cached gearbox contains this one's
+
+
+	def gearbox(self) -> AbstractGearbox:
+		if self._gearbox_cache is None:
+			self._gearbox_cache = self._build_gearbox()
+		return self._gearbox_cache
+
+
+	def _build_gearbox(self, *args, **kwargs) -> AbstractGearbox:
+		gearboxes = []
+		for gadget in self.vendors():
+			if isinstance(gadget, AbstractGeared):
+				gearboxes.append(gadget.gearbox())
+				if isinstance(gadget, GearedGaggle):
+					gadget._add_gearbox_dependent(self)
+		return self._GearBox(*args, base=self, **kwargs).extend(gearboxes)
 
 		# gearbox = self._GearBox(*self._gears_list, base=self)
 		# for gadget in self.vendors():
@@ -42,8 +96,44 @@ class GearedGaggle(AbstractGeared, AbstractGaggle):
 		# return gearbox
 
 
+	def gear_context(self) -> AbstractGame:
+		if self._gear_context_cache is None:
+			self._gear_context_cache = self._GearContext(self.gearbox())
+		return self._gear_context_cache
+
+
+	def _add_gearbox_dependent(self, dependent: 'GearedGaggle') -> None:
+		# keyed by identity (gaggles may compare by content) and held weakly, so dependents can be collected
+		if self._gearbox_dependents is None:
+			self._gearbox_dependents = weakref.WeakValueDictionary()
+		self._gearbox_dependents[id(dependent)] = dependent
+
 
-class CraftyGearedGaggle(CraftyGaggle, GearedGaggle):
+	def _invalidate_gearbox(self) -> None:
+		"""drops the cached gearbox (and default context) of this gaggle and of all gaggles containing it"""
+		self._gearbox_cache = None
+		self._gear_context_cache = None
+		dependents, self._gearbox_dependents = self._gearbox_dependents, None
+		for dependent in list(dependents.values()) if dependents else ():
+			dependent._invalidate_gearbox()
+
+
+
+
+class MutableGearedGaggle(GearedGaggle):
+	'''invalidates the cached gearbox whenever gadgets are added or removed (must precede the mutable gaggle)'''
+	def extend(self, gadgets: Iterable[AbstractGadget]) -> Self:
+		self._invalidate_gearbox()
+		return super().extend(gadgets)
+
+
+	def exclude(self, *gadgets: AbstractGadget) -> Self:
+		self._invalidate_gearbox()
+		return super().exclude(*gadgets)
+
+
+
+class CraftyGearedGaggle(MutableGearedGaggle, CraftyGaggle):
 	'''gaggle which can contain gears and produces a gearbox'''
 	_gears_list: list[AbstractGear] = None
 
@@ -61,15 +151,15 @@ class CraftyGearedGaggle(CraftyGaggle, GearedGaggle):
 			super()._process_skill(skill)
 
 
-	def gearbox(self) -> AbstractGearbox:
-		return super().gearbox(*reversed(self._gears_list))
+	def _build_gearbox(self, *args, **kwargs) -> AbstractGearbox:
+		return super()._build_gearbox(*reversed(self._gears_list), *args, **kwargs)
 
 
 
-class GearedMechanism(MechanismBase, GearedGaggle):
+class GearedMechanism(MutableGearedGaggle, MechanismBase):
 	_GearMechanism = None
-	def gearbox(self) -> AbstractGearbox:
-		return self._GearMechanism(super().gearbox(), external=self._external_map, internal=self._internal_map,
+	def _build_gearbox(self) -> AbstractGearbox:
+		return self._GearMechanism(super()._build_gearbox(), external=self._external_map, internal=self._internal_map,
 							  exclusive=self._exclusive, insulated=self._insulated)
 
 
@@ -45,7 +45,9 @@ class GearCraftBase(CraftBase):
 		if isinstance(geared, AbstractMechanical):
 			mech = geared.mechanics()
 		if mech is None:
-			return GearContext(geared.gearbox()) # effectively no caching, and all dependencies must be local
+			mech = geared.gear_context() # all dependencies must be local
+		if mech is None:
+			return GearContext(geared.gearbox()) # effectively no caching
 		return mech
 
 
@@ -1,7 +1,9 @@
 from .imports import *
 from .abstract import AbstractMechanized, AbstractMechanics
 from ..core import Context
+from ..core.abstract import AbstractGang
 from ..core.gaggles import AbstractGaggle, MutableGaggle
+from ..core.genetics import AbstractGenetic
 from .errors import GearGrabError
 from .gears import GearContext
 from .gearbox import MutableMechanics
@@ -10,7 +12,51 @@ from .gearbox import MutableMechanics
 
 class Mechanics(GearContext, MutableMechanics, AbstractMechanics):
 	'''context of gears'''
-	pass
+	def _forget_gearboxes(self, gearboxes: Iterable[AbstractGaggle]) -> None:
+		'''drops the cached values which may have been produced (directly or indirectly) by the removed gears'''
+		removed = {gizmo for gearbox in gearboxes for gizmo in gearbox.gizmos()}
+		for gizmo in self._dependent_gizmos(removed):
+			self.data.pop(gizmo, None)
+		for gearbox in gearboxes:
+			for gang in self._iterate_gangs(gearbox):
+				self.clear_gate_cache(gang)
+
+
+	def _dependent_gizmos(self, gizmos: Iterable[str]) -> set[str]:
+		'''all cached gizmos that may have been computed from any of the given gizmos (including those)'''
+		stale = set(gizmos)
+		remaining = [gizmo for gizmo in self.data if gizmo not in stale]
+		changed = True
+		while changed and remaining:
+			changed = False
+			for gizmo in remaining:
+				if self._may_depend_on(gizmo, stale):
+					stale.add(gizmo)
+					changed = True
+			remaining = [gizmo for gizmo in remaining if gizmo not in stale]
+		return stale
+
+
+	def _may_depend_on(self, gizmo: str, gizmos: set[str]) -> bool:
+		if not self.gives(gizmo):
+			return False # set manually
+		for vendor in self._gadgets(gizmo):
+			if not isinstance(vendor, AbstractGenetic):
+				return True
+		for gene in self.genes(gizmo):
+			if gene.parents is None or any(parent in gizmos for parent in gene.parents):
+				return True
+		return False
+
+
+	@classmethod
+	def _iterate_gangs(cls, gadget: AbstractGadget) -> Iterator[AbstractGang]:
+		if isinstance(gadget, AbstractGang):
+			yield gadget
+		if isinstance(gadget, AbstractGaggle):
+			for vendor in gadget.vendors():
+				yield from cls._iterate_gangs(vendor)
+
 
 
 class MechanizedBase(AbstractMechanized):
@@ -26,6 +72,13 @@ class MechanizedBase(AbstractMechanized):
 		return self
 
 
+	def _unmechanize(self, mechanics: AbstractMechanics) -> Self:
+		'''detaches the mechanics if (and only if) they are `mechanics`'''
+		if self._mechanics is mechanics:
+			self._mechanics = None
+		return self
+
+
 
 class AutoMechanized(MechanizedBase):
 	_Mechanics = Mechanics
@@ -48,9 +101,27 @@ class MechanizedGaggle(MechanizedBase, AbstractGaggle):
 		return super().mechanize(mechanics)
 
 
+	def _unmechanize(self, mechanics: AbstractMechanics) -> Self:
+		if self._mechanics is mechanics:
+			for gadget in self.vendors():
+				if isinstance(gadget, MechanizedBase):
+					gadget._unmechanize(mechanics)
+		return super()._unmechanize(mechanics)
+
+
 
 class MutableMechanized(MechanizedGaggle, MutableGaggle):
+	'''
+	Keeps the mechanics in sync with the gadgets, so only newly added (or removed) subtrees have to be walked.
+	'''
+	def mechanize(self, mechanics: Mechanics):
+		if mechanics is not None and mechanics is self._mechanics:
+			return self # already up to date (see `extend`)
+		return super().mechanize(mechanics)
+
+
 	def extend(self, gadgets: Iterable[AbstractGadget]):
+		gadgets = list(gadgets)
 		out = super().extend(gadgets)
 		if self._mechanics is not None:
 			self._mechanics.extend(gadgets)
@@ -60,6 +131,16 @@ class MutableMechanized(MechanizedGaggle, MutableGaggle):
 		return out
 
 
+	def exclude(self, *gadgets: AbstractGadget):
+		out = super().exclude(*gadgets)
+		if self._mechanics is not None:
+			self._mechanics.exclude(*gadgets)
+			for gadget in gadgets:
+				if isinstance(gadget, MechanizedBase):
+					gadget._unmechanize(self._mechanics)
+		return out
+
+
 
 class MechanizedGame(AutoMechanized, MutableMechanized):
 	'''for games'''
@@ -299,3 +299,109 @@ def test_gang_gears():
 	assert obj2.f == 200
 
 
+
+
+
+def test_cached_gearbox():
+	class Tester(ToolKit):
+		calls = 0
+
+		@gear('a')
+		def something(self):
+			self.calls += 1
+			return 10
+
+	class Outer(ToolKit):
+		@gear('b')
+		def other(self):
+			return 5
+
+	src = Tester()
+	outer = Outer().include(src)
+
+	box = outer.gearbox()
+	assert outer.gearbox() is box
+	assert set(box.gizmos()) == {'a', 'b'}
+
+	assert src.something == 10 and src.something == 10
+	assert src.calls == 1 # memoized without mechanics
+
+	class Extra(ToolKit):
+		@gear('c')
+		def more(self):
+			return 1
+
+	src.include(Extra())
+
+	assert outer.gearbox() is not box # changes to nested gaggles invalidate the gearbox
+	assert set(outer.gearbox().gizmos()) == {'a', 'b', 'c'}
+	assert src.something == 10
+	assert src.calls == 2
+
+	mech = Mechanism(src, internal={'c': 'd'})
+	box = mech.gearbox()
+	assert mech.gearbox() is box
+	mech.include(Outer())
+	assert mech.gearbox() is not box
+
+	import gc, weakref
+	shared = Tester()
+	refs = []
+	for _ in range(100):
+		temporary = Outer().include(shared)
+		temporary.gearbox()
+		refs.append(weakref.ref(temporary))
+	del temporary
+	gc.collect()
+	assert all(ref() is None for ref in refs) # dependents don't keep the gaggles containing them alive
+	assert len(shared._gearbox_dependents) == 0
+
+
+
+def test_mechanics_exclude():
+	class Tester(Structured):
+		@gear('a')
+		def something(self):
+			return 10
+
+		@gear('c')
+		def combined(self, a, outside):
+			return a + outside
+
+		@gear('d')
+		def independent(self):
+			return 1
+
+	class Tester2(Structured):
+		@gear('outside')
+		def other(self):
+			return 100
+
+	src = Tester()
+	src2 = Tester2()
+
+	ctx = Context(src, src2).mechanize()
+	mech = ctx.mechanics()
+
+	assert src.combined == 110
+	assert src.independent == 1
+	assert mech.is_cached('outside') and mech.is_cached('c')
+	assert mech.gearbox_owner(src2.gearbox()) is src2
+
+	ctx.exclude(src2)
+
+	assert src2.mechanics() is None
+	assert not mech.is_cached('outside') and not mech.is_cached('c') # dependents are invalidated
+	assert mech.is_cached('a') and mech.is_cached('d')
+	assert src2.other == 100 # falls back to its own gears
+
+	try:
+		src.combined
+		assert False
+	except GrabError:
+		pass
+
+	src3 = Tester2()
+	ctx.include(src3)
+	assert src3.mechanics() is mech
+	assert src.combined == 110